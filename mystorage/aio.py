@@ -0,0 +1,175 @@
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import AsyncIterator, List
+
+from mystorage.types import Provider, ResourceTypes
+
+"""
+# asyncio counterpart of ProviderBase / Reader / Writer / Provider.
+async with config.get_async_provider() as provider:
+    await provider.exists("dir1")
+
+# Any blocking Provider can be used from asyncio through a thread pool.
+provider = ThreadedAsyncProvider(LocalConfig(root=".").get_provider())
+"""
+
+
+class AsyncProviderBase:
+    async def exists(self, path) -> bool:
+        raise NotImplementedError()
+
+    async def info(self, path):
+        raise NotImplementedError()
+
+    async def type(self, path) -> ResourceTypes:
+        raise NotImplementedError()
+
+    async def isdir(self, path) -> bool:
+        return await self.type(path) == ResourceTypes.DIR
+
+    async def ls(self, path) -> List[str]:
+        raise NotImplementedError()
+
+    async def ll(self, path):
+        raise NotImplementedError()
+
+    async def close(self):
+        ...
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args, **kwargs):
+        await self.close()
+
+
+class AsyncReader(AsyncProviderBase):
+    async def read(self, path, buf):
+        async for chunk in self.iter_chunks(path):
+            buf.write(chunk)
+        return buf
+
+    def iter_chunks(self, path, chunk_size=None) -> AsyncIterator[bytes]:
+        raise NotImplementedError()
+
+    async def read_bytes(self, path):
+        return b"".join([x async for x in self.iter_chunks(path)])
+
+    async def read_text(self, path, encoding=None):
+        import locale
+
+        data = await self.read_bytes(path)
+        return data.decode(encoding or locale.getpreferredencoding(False))
+
+
+class AsyncWriter(AsyncReader):
+    async def delete(self, path):
+        raise NotImplementedError()
+
+    async def mkdir(self, path):
+        raise NotImplementedError()
+
+    async def create(self, path, buf):
+        raise NotImplementedError()
+
+    async def put(self, path, buf):
+        raise NotImplementedError()
+
+    async def move(self, src, dest):
+        raise NotImplementedError()
+
+    async def copy(self, src, dest):
+        raise NotImplementedError()
+
+    async def rename(self, src, name):
+        raise NotImplementedError()
+
+    async def write_stream(self, path, aiterable):
+        raise NotImplementedError()
+
+    async def touch(self, path):
+        import io
+
+        buf = io.BytesIO(b"")
+        return await self.create(path, buf)
+
+
+class AsyncProvider(AsyncWriter):
+    ...
+
+
+class ThreadedAsyncProvider(AsyncProvider):
+    """Runs each call of a blocking Provider in an executor."""
+
+    def __init__(self, provider: Provider, executor: Executor = None):
+        self.provider = provider
+        self.executor = executor
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def exists(self, path):
+        return await self._run(self.provider.exists, path)
+
+    async def info(self, path):
+        return await self._run(self.provider.info, path)
+
+    async def type(self, path):
+        return await self._run(self.provider.type, path)
+
+    async def ls(self, path):
+        return await self._run(self.provider.ls, path)
+
+    async def ll(self, path):
+        return await self._run(self.provider.ll, path)
+
+    async def read(self, path, buf):
+        return await self._run(self.provider.read, path, buf)
+
+    async def read_bytes(self, path):
+        return await self._run(self.provider.read_bytes, path)
+
+    async def iter_chunks(self, path, chunk_size=None):
+        f = await self._run(self.provider.open, path, "rb")
+        try:
+            while True:
+                chunk = await self._run(f.read, chunk_size or 65536)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            await self._run(f.close)
+
+    async def delete(self, path):
+        return await self._run(self.provider.delete, path)
+
+    async def mkdir(self, path):
+        return await self._run(self.provider.mkdir, path)
+
+    async def create(self, path, buf):
+        return await self._run(self.provider.create, path, buf)
+
+    async def put(self, path, buf):
+        return await self._run(self.provider.put, path, buf)
+
+    async def move(self, src, dest):
+        return await self._run(self.provider.move, src, dest)
+
+    async def copy(self, src, dest):
+        return await self._run(self.provider.copy, src, dest)
+
+    async def rename(self, src, name):
+        return await self._run(self.provider.rename, src, name)
+
+    async def write_stream(self, path, aiterable):
+        f = await self._run(self.provider.open, path, "wb")
+        try:
+            async for chunk in aiterable:
+                await self._run(f.write, chunk)
+        except BaseException as e:
+            await self._run(f.__exit__, type(e), e, e.__traceback__)
+            raise
+        await self._run(f.close)
+        return await self._run(self.provider.info, path)
@@ -0,0 +1,273 @@
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from mystorage.concurrency import submit
+from mystorage.exceptions import NOT_FOUND_ERRORS, FileNotFound, StorageException
+from mystorage.hashring import HASHRING_VNODES, HashRing
+from mystorage.types import Provider, ResourceTypes
+from mystorage.walk import entry_name
+
+"""
+# Spreads files over several providers with consistent hashing.
+array = StorageArray(a=LocalConfig(root="/mnt/a").get_provider(), b=WebdavConfig().get_provider())
+array.put("dir/file1", buf)  # stored on the owner of "dir/file1"
+array.add_storage("c", LocalConfig(root="/mnt/c").get_provider())
+array.rebalance()  # moves only the files "c" now owns
+"""
+
+
+class StorageArray(Provider):
+    """Spreads files over `storages` with consistent hashing.
+
+    Directories are created on every member, so any member can hold a file in
+    any directory. After members are added or removed, or a directory is moved,
+    `rebalance()` puts files back on their owners. Until then lookups fall back
+    to the other members.
+    """
+
+    def __init__(
+        self,
+        *,
+        vnodes: int = None,
+        weight_by_free: bool = False,
+        max_workers: int = None,
+        **storages: Provider,
+    ):
+        if not storages:
+            raise StorageException("StorageArray requires at least one storage.")
+        self.storages = storages
+        self.draining: Dict[str, Provider] = {}
+        self.max_workers = max_workers
+        self.ring = HashRing({x: 1.0 for x in storages}, vnodes or HASHRING_VNODES)
+        if weight_by_free:
+            self.refresh_weights()
+
+    def get_storage_by_id(self, id: str):
+        return self.storages[id]
+
+    def refresh_weights(self):
+        # 空き容量に比例して仮想ノードを割り当てる
+        free = self._map(lambda x: x.free(), self.storages.values())
+        mean = sum(free) / len(free) or 1
+        self.ring.set_weights({k: v / mean for k, v in zip(self.storages, free)})
+
+    def add_storage(self, name, storage: Provider, weight: float = 1.0):
+        self.storages[name] = storage
+        self.ring.add(name, weight)
+
+    def remove_storage(self, name):
+        if len(self.storages) == 1 and name in self.storages:
+            raise StorageException("Cannot remove the last storage.")
+        # rebalance() が終わるまでは読み出し元として残す
+        self.draining[name] = self.storages.pop(name)
+        self.ring.remove(name)
+
+    def _map(self, func, items, max_workers=None):
+        items = list(items)
+        if len(items) <= 1:
+            return [func(x) for x in items]
+        workers = min(max_workers or self.max_workers or len(items), len(items))
+        with ThreadPoolExecutor(workers) as executor:
+            return [x.result() for x in [submit(executor, func, x) for x in items]]
+
+    def _members(self) -> List[Provider]:
+        return list(self.storages.values()) + list(self.draining.values())
+
+    @staticmethod
+    def _key(path) -> str:
+        return str(path).strip("/")
+
+    def owner(self, path) -> Provider:
+        return self.storages[self.ring.get(self._key(path))]
+
+    def locate(self, path) -> Provider:
+        owner = self.owner(path)
+        if owner.exists(path):
+            return owner
+        others = [x for x in self._members() if x is not owner]
+        for storage, found in zip(others, self._map(lambda x: x.exists(path), others)):
+            if found:
+                return storage
+        raise FileNotFound(path)
+
+    def exists(self, path) -> bool:
+        try:
+            self.locate(path)
+        except FileNotFound:
+            return False
+        return True
+
+    def info(self, path):
+        return self.locate(path).info(path)
+
+    def type(self, path) -> ResourceTypes:
+        try:
+            return self.locate(path).type(path)
+        except FileNotFound:
+            return ResourceTypes.NO_EXISTS
+
+    def isdir(self, path) -> bool:
+        return self.type(path) == ResourceTypes.DIR
+
+    def free(self):
+        return sum(self._map(lambda x: x.free(), self.storages.values()))
+
+    def ll(self, path):
+        def ll(storage):
+            try:
+                return storage.ll(path)
+            except NOT_FOUND_ERRORS:
+                return None
+
+        results = self._map(ll, self._members())
+        if all(x is None for x in results):
+            raise FileNotFound(path)
+        merged = {}
+        for infos in results:
+            for info in infos or []:
+                merged.setdefault(entry_name(info), info)
+        return list(merged.values())
+
+    def ls(self, path) -> List[str]:
+        return [entry_name(x) for x in self.ll(path)]
+
+    def ll_files(self, path):
+        return [x for x in self.ll(path) if x["isdir"] != ResourceTypes.DIR]
+
+    def ll_dirs(self, path):
+        return [x for x in self.ll(path) if x["isdir"] == ResourceTypes.DIR]
+
+    def ls_files(self, path) -> List[str]:
+        return [entry_name(x) for x in self.ll_files(path)]
+
+    def ls_dirs(self, path):
+        return [entry_name(x) for x in self.ll_dirs(path)]
+
+    def read(self, path, buf):
+        return self.locate(path).read(path, buf)
+
+    def open(self, path, mode="rb", encoding=None):
+        if mode in {"w", "wb"}:
+            return super().open(path, mode, encoding)
+        return self.locate(path).open(path, mode, encoding)
+
+    def iter_chunks(self, path, chunk_size=None):
+        return self.locate(path).iter_chunks(path, chunk_size)
+
+    def read_bytes(self, path):
+        return self.locate(path).read_bytes(path)
+
+    def mkdir(self, path):
+        names = list(self.storages)
+        results = self._map(lambda x: self.storages[x].mkdir(path), names)
+        return results[names.index(self.ring.get(self._key(path)))]
+
+    def create(self, path, buf):
+        if self.exists(path):
+            raise StorageException("Resource already exists.")
+        return self.owner(path).create(path, buf)
+
+    def put(self, path, buf):
+        return self.owner(path).put(path, buf)
+
+    def write_stream(self, path, iterable):
+        return self.owner(path).write_stream(path, iterable)
+
+    def delete(self, path):
+        def delete(storage):
+            try:
+                storage.delete(path)
+            except NOT_FOUND_ERRORS:
+                return False
+            return True
+
+        if not any(self._map(delete, self._members())):
+            raise FileNotFound(path)
+
+    def _transfer(self, src_storage, src, dest_storage, dest, remove):
+        if src_storage is dest_storage:
+            if remove:
+                return src_storage.move(src, dest)
+            return src_storage.copy(src, dest)
+        with src_storage.open(src, "rb") as f:
+            info = dest_storage.put(dest, f)
+        if remove:
+            src_storage.delete(src)
+        return info
+
+    def _move_or_copy(self, src, dest, remove):
+        try:
+            storage = self.locate(src)
+        except FileNotFound:
+            raise StorageException("Src not found.")
+        if self.exists(dest):
+            raise StorageException("Dest already exists.")
+        if not storage.isdir(src):
+            return self._transfer(storage, src, self.owner(dest), dest, remove)
+
+        # ディレクトリは各メンバーの中で移す。中のファイルの配置は rebalance で直す
+        def move_or_copy(storage):
+            if storage.exists(src):
+                if remove:
+                    storage.move(src, dest)
+                else:
+                    storage.copy(src, dest)
+
+        self._map(move_or_copy, self._members())
+
+    def move(self, src, dest):
+        self._move_or_copy(src, dest, remove=True)
+
+    def copy(self, src, dest):
+        self._move_or_copy(src, dest, remove=False)
+        return self.info(dest)
+
+    def rename(self, src, name):
+        key = self._key(src)
+        return self.move(src, posixpath.join(posixpath.dirname(key), str(name)))
+
+    def rebalance(self, path="", max_workers=None) -> int:
+        """Move misplaced files to their owners. Returns the number of files moved."""
+        members = {**self.storages, **self.draining}
+
+        def ll_recursive(storage):
+            try:
+                return storage.ll_recursive(path)
+            except NOT_FOUND_ERRORS:
+                return {}
+
+        trees = dict(zip(members, self._map(ll_recursive, members.values())))
+        dirs = set()
+        for tree in trees.values():
+            dirs.update(k for k, v in tree.items() if v["isdir"] == ResourceTypes.DIR)
+        parts = self._key(path).split("/") if self._key(path) else []
+        for name, storage in self.storages.items():
+            for i in range(len(parts)):
+                if not storage.exists("/".join(parts[: i + 1])):
+                    storage.mkdir("/".join(parts[: i + 1]))
+            missing = dirs - set(trees[name])
+            for d in sorted(missing, key=lambda x: x.count("/")):
+                storage.mkdir(d)
+
+        moves = []
+        for name, tree in trees.items():
+            for key, info in tree.items():
+                if info["isdir"] == ResourceTypes.DIR:
+                    continue
+                owner = self.ring.get(self._key(key))
+                if owner != name:
+                    moves.append((members[name], key, self.storages[owner]))
+
+        def relocate(move):
+            storage, key, owner = move
+            if owner.exists(key):
+                # 配置換え後に owner へ書かれたものが新しい
+                storage.delete(key)
+            else:
+                self._transfer(storage, key, owner, key, remove=True)
+
+        self._map(relocate, moves, max_workers or self.max_workers or 8)
+        if not self._key(path):
+            self.draining.clear()
+        return len(moves)
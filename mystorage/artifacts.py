@@ -0,0 +1,249 @@
+import hashlib
+import posixpath
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Set
+
+from mystorage.exceptions import NOT_FOUND_ERRORS, StorageException
+
+ARTIFACT_MAX_WORKERS = 8
+ARTIFACT_FORMAT = 1
+
+_DIGEST = re.compile("[0-9a-f]{64}")
+
+"""
+# Content-addressed artifact store under a remote SafeClient root:
+#   blobs/<sha256[:2]>/<sha256>         file contents, shared by every version
+#   artifacts/<name>/<version>.json     {"files": {relpath: {"sha256", "size"}}}
+#   artifacts/<name>/LATEST             last pushed version
+# push uploads only the blobs the remote lacks, pull downloads only the files
+# whose content is not already somewhere in the local directory.
+store = ArtifactDir(SafeClient(local, "build"), push_client=SafeClient(remote, "artifacts"))
+store.push("app", "1.0.1")
+store.pull("app")  # latest
+"""
+
+
+def blob_path(digest: str) -> str:
+    return f"blobs/{digest[:2]}/{digest}"
+
+
+def validate_digest(digest) -> str:
+    if not isinstance(digest, str) or not _DIGEST.fullmatch(digest):
+        raise StorageException(f"Invalid sha256: {digest!r}")
+    return digest
+
+
+def part_path(dest: str, digest: str) -> str:
+    dirname, name = posixpath.split(dest)
+    return join(dirname, f".{name}.{digest[:16]}.part")
+
+
+def manifest_path(name: str, version: str) -> str:
+    return f"artifacts/{name}/{version}.json"
+
+
+def latest_path(name: str) -> str:
+    return f"artifacts/{name}/LATEST"
+
+
+def validate_name(value: str, label: str) -> str:
+    value = str(value)
+    if not value or "/" in value or value in {".", ".."} or value == "LATEST":
+        raise StorageException(f"Invalid {label}: {value!r}")
+    return value
+
+
+def join(*parts) -> str:
+    return posixpath.join(*[x for x in parts if x])
+
+
+def hash_chunks(chunks: Iterable[bytes]):
+    h = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        h.update(chunk)
+        size += len(chunk)
+    return h.hexdigest(), size
+
+
+def verified(chunks: Iterable[bytes], digest: str):
+    h = hashlib.sha256()
+    for chunk in chunks:
+        h.update(chunk)
+        yield chunk
+    if h.hexdigest() != digest:
+        raise StorageException(f"Blob {digest} is corrupted.")
+
+
+def scan(provider, root: str, max_workers: int) -> Dict[str, dict]:
+    """{relpath: {"sha256", "size"}} of every file under `root`."""
+    if not provider.exists(root):
+        return {}
+    rels = []
+    for dirpath, _, files in provider.walk(root):
+        rel_dir = dirpath[len(root) :].strip("/")
+        rels.extend(join(rel_dir, x) for x in files)
+
+    def digest(rel):
+        return hash_chunks(provider.iter_chunks(join(root, rel)))
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        results = list(executor.map(digest, rels))
+    return {rel: {"sha256": d, "size": s} for rel, (d, s) in zip(rels, results)}
+
+
+def read_manifest(client, name: str, version: str) -> dict:
+    try:
+        return client.provider.read_json(client.path(manifest_path(name, version)))
+    except NOT_FOUND_ERRORS:
+        raise StorageException(f"Artifact not found: {name}:{version}") from None
+
+
+def latest_version(client, name: str):
+    try:
+        return client.provider.read_text(client.path(latest_path(name))).strip()
+    except NOT_FOUND_ERRORS:
+        return None
+
+
+def missing_dirs(provider, dirs: Iterable[str]) -> Set[str]:
+    needed = set()
+    for path in dirs:
+        while path:
+            needed.add(path)
+            path = posixpath.dirname(path)
+    return {x for x in needed if not provider.exists(x)}
+
+
+def push(local, remote, name, version, path="", max_workers=None) -> dict:
+    name = validate_name(name, "name")
+    version = validate_name(version, "version")
+    max_workers = max_workers or ARTIFACT_MAX_WORKERS
+    root = local.path(path)
+    files = scan(local.provider, root, max_workers)
+    sources = {}
+    for rel, entry in files.items():
+        sources.setdefault(entry["sha256"], (rel, entry["size"]))
+
+    # 前回のバージョンが参照する blob は確認せずに存在するとみなす
+    known = set()
+    previous = latest_version(remote, name)
+    if previous is not None:
+        old = read_manifest(remote, name, previous)["files"].values()
+        known = {x["sha256"] for x in old}
+    unknown = [x for x in sources if x not in known]
+    with ThreadPoolExecutor(max_workers) as executor:
+        exists = executor.map(
+            lambda x: remote.provider.exists(remote.path(blob_path(x))), unknown
+        )
+        missing = [d for d, found in zip(unknown, exists) if not found]
+
+    dirs = [posixpath.dirname(remote.path(blob_path(x))) for x in missing]
+    dirs.append(posixpath.dirname(remote.path(manifest_path(name, version))))
+    with remote.provider.batch(max_workers) as batch:
+        for path in sorted(missing_dirs(remote.provider, dirs)):
+            batch.mkdir(path)
+        for digest in missing:
+            src = join(root, sources[digest][0])
+            chunks = local.provider.iter_chunks(src)
+            batch.write_stream(remote.path(blob_path(digest)), chunks)
+    batch.report.raise_for_errors()
+
+    # blob が揃ってからマニフェストを公開する
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "name": name,
+        "version": version,
+        "created": time.time(),
+        "files": files,
+    }
+    remote.provider.write_json(remote.path(manifest_path(name, version)), manifest)
+    remote.provider.write_text(remote.path(latest_path(name)), version)
+    return {
+        "files": len(files),
+        "blobs": len(sources),
+        "uploaded": len(missing),
+        "bytes": sum(sources[x][1] for x in missing),
+    }
+
+
+def pull(
+    local, remote, name, version=None, path="", max_workers=None, delete=False
+) -> dict:
+    name = validate_name(name, "name")
+    version = version or latest_version(remote, name)
+    if version is None:
+        raise StorageException(f"Artifact not found: {name}")
+    max_workers = max_workers or ARTIFACT_MAX_WORKERS
+    files = read_manifest(remote, name, version)["files"]
+    root = local.path(path)
+    existing = scan(local.provider, root, max_workers)
+
+    todo = {}
+    for rel, entry in files.items():
+        # マニフェストは信用しない。.. を含むパスは SafeClient が弾く
+        dest = local.path(join(path, rel))
+        digest = validate_digest(entry["sha256"])
+        if existing.get(rel, {}).get("sha256") != digest:
+            todo[rel] = (dest, digest, entry["size"])
+    # 書き換えないローカルファイルに同じ内容があればそこからコピーする
+    local_copies = {}
+    for rel, entry in existing.items():
+        if rel not in todo:
+            local_copies.setdefault(entry["sha256"], rel)
+
+    # 1. 一時ファイルに取得してハッシュを確かめる
+    downloads = {}
+    copies = []
+    for rel, (dest, digest, size) in todo.items():
+        if digest in local_copies:
+            copies.append((join(root, local_copies[digest]), dest))
+        else:
+            local_copies[digest] = rel
+            downloads[rel] = (dest, part_path(dest, digest), digest, size)
+
+    dirs = [posixpath.dirname(dest) for dest, *_ in todo.values()]
+    with local.provider.batch(max_workers) as batch:
+        for dirpath in sorted(missing_dirs(local.provider, dirs)):
+            batch.mkdir(dirpath)
+        for rel, (dest, part, digest, size) in downloads.items():
+            blob = remote.path(blob_path(digest))
+            batch.write_stream(
+                part, verified(remote.provider.iter_chunks(blob), digest)
+            )
+    if not batch.report.ok:
+        for _, part, *_ in downloads.values():
+            if local.provider.exists(part):
+                local.provider.delete(part)
+        batch.report.raise_for_errors()
+
+    # 2. 検証済みのファイルだけを置き換える
+    with local.provider.batch(max_workers) as batch:
+        for rel, (dest, part, *_) in downloads.items():
+            if rel in existing:
+                batch.delete(dest)
+            batch.move(part, dest)
+        for src, dest in copies:
+            batch.copy(src, dest)
+        if delete:
+            for rel in existing.keys() - files.keys():
+                batch.delete(join(root, rel))
+    batch.report.raise_for_errors()
+    return {
+        "files": len(files),
+        "downloaded": len(downloads),
+        "copied": len(copies),
+        "bytes": sum(x[3] for x in downloads.values()),
+        "skipped": len(files) - len(todo),
+    }
+
+
+def versions(client, name) -> list:
+    name = validate_name(name, "name")
+    try:
+        names = client.provider.ls_files(client.path(f"artifacts/{name}"))
+    except NOT_FOUND_ERRORS:
+        return []
+    return sorted(x[: -len(".json")] for x in names if x.endswith(".json"))
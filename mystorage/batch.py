@@ -0,0 +1,186 @@
+import posixpath
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Set
+
+from mystorage.concurrency import submit
+from mystorage.exceptions import StorageException
+
+BATCH_MAX_CONCURRENCY = 32
+
+"""
+# Queue operations and run them in parallel. An operation waits for every
+# earlier operation on the same path, an ancestor or a descendant, so
+# `mkdir("dir")` runs before `put("dir/file1")`.
+with provider.batch(max_concurrency=32) as b:
+    b.mkdir("dir")
+    b.put("dir/file1", buf)
+    b.delete("old")
+
+for item in b.report.errors:
+    print(item.op, item.paths, item.error)
+"""
+
+
+def normpath(path) -> str:
+    return posixpath.normpath("/" + str(path)).strip("/")
+
+
+def ancestors(path: str):
+    while path:
+        path = posixpath.dirname(path)
+        yield path
+
+
+class BatchResult:
+    def __init__(self, index: int, op: str, paths: tuple):
+        self.index = index
+        self.op = op
+        self.paths = paths
+        self.result = None
+        self.error = None
+        self.done = False
+
+    @property
+    def ok(self):
+        return self.done and self.error is None
+
+    def __repr__(self):
+        status = "pending" if not self.done else ("ok" if self.ok else "error")
+        return f"<BatchResult {self.index} {self.op}{self.paths} {status}>"
+
+
+class BatchReport(list):
+    @property
+    def errors(self) -> List[BatchResult]:
+        return [x for x in self if x.error is not None]
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def raise_for_errors(self):
+        errors = self.errors
+        if errors:
+            raise StorageException(
+                f"{len(errors)} of {len(self)} batch operations failed."
+            ) from errors[0].error
+
+
+class Batch:
+    def __init__(self, provider, max_concurrency: int = BATCH_MAX_CONCURRENCY):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.report = BatchReport()
+        self._calls = []
+        self._deps: List[Set[int]] = []
+        self._last: Dict[str, int] = {}
+        self._descendants: Dict[str, Set[int]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.run()
+
+    def _add(self, op, func, args, paths) -> BatchResult:
+        index = len(self._calls)
+        paths = tuple(normpath(x) for x in paths)
+        deps = set()
+        for path in paths:
+            for p in (path, *ancestors(path)):
+                if p in self._last:
+                    deps.add(self._last[p])
+            deps |= self._descendants.get(path, set())
+
+        for path in paths:
+            self._last[path] = index
+            self._descendants[path] = set()
+            for p in ancestors(path):
+                self._descendants.setdefault(p, set()).add(index)
+
+        item = BatchResult(index, op, paths)
+        self.report.append(item)
+        self._calls.append((func, args))
+        self._deps.append(deps)
+        return item
+
+    def put(self, path, buf):
+        return self._add("put", self.provider.put, (path, buf), (path,))
+
+    def create(self, path, buf):
+        return self._add("create", self.provider.create, (path, buf), (path,))
+
+    def touch(self, path):
+        return self._add("touch", self.provider.touch, (path,), (path,))
+
+    def write_stream(self, path, iterable):
+        args = (path, iterable)
+        return self._add("write_stream", self.provider.write_stream, args, (path,))
+
+    def delete(self, path):
+        return self._add("delete", self.provider.delete, (path,), (path,))
+
+    def mkdir(self, path):
+        return self._add("mkdir", self.provider.mkdir, (path,), (path,))
+
+    def move(self, src, dest):
+        return self._add("move", self.provider.move, (src, dest), (src, dest))
+
+    def copy(self, src, dest):
+        return self._add("copy", self.provider.copy, (src, dest), (src, dest))
+
+    def rename(self, src, name):
+        dest = posixpath.join(posixpath.dirname(normpath(src)), normpath(name))
+        return self._add("rename", self.provider.rename, (src, name), (src, dest))
+
+    def run(self) -> BatchReport:
+        waiting = {i: set(deps) for i, deps in enumerate(self._deps)}
+        dependents = {i: [] for i in waiting}
+        for i, deps in waiting.items():
+            for d in deps:
+                dependents[d].append(i)
+
+        def finish(index, result=None, error=None):
+            # 失敗は依存先へ連鎖する。長い連鎖でも再帰しないようスタックで辿る
+            ready = []
+            stack = [(index, result, error)]
+            while stack:
+                index, result, error = stack.pop()
+                item = self.report[index]
+                if item.done:
+                    continue
+                item.result, item.error, item.done = result, error, True
+                for i in dependents[index]:
+                    waiting[i].discard(index)
+                    if self.report[i].done:
+                        continue
+                    if error is not None:
+                        skipped = StorageException(
+                            f"Skipped because {item.op}{item.paths} failed."
+                        )
+                        stack.append((i, None, skipped))
+                    elif not waiting[i]:
+                        ready.append(i)
+            return ready
+
+        with ThreadPoolExecutor(self.max_concurrency) as executor:
+            pending = {}
+
+            def start(index):
+                func, args = self._calls[index]
+                pending[submit(executor, func, *args)] = index
+
+            for i, deps in waiting.items():
+                if not deps:
+                    start(i)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    error = future.exception()
+                    result = None if error is not None else future.result()
+                    for i in finish(index, result, error):
+                        start(i)
+
+        return self.report
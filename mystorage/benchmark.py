@@ -0,0 +1,246 @@
+import io
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List
+
+"""
+# Measure provider operations against an in-process WebDAV server.
+# python -m mystorage.benchmark --latency 0.005 --output bench.json
+# python -m mystorage.benchmark --latency 0.005 --compare bench.json
+results = bench_webdav(latency=0.005, bandwidth=50 * 1024**2)
+print(format_table(results["results"]))
+"""
+
+OPS = ["put", "exists", "info", "ll", "read_bytes", "download", "upload"]
+
+
+class Workload:
+    def __init__(self, name: str, files: int, size: int, lists: int = 10):
+        self.name = name
+        self.files = files
+        self.size = size
+        self.lists = lists  # ll is repeated this many times on the whole directory
+
+
+WORKLOADS = {
+    "small": Workload("small", files=100, size=1024),
+    "large": Workload("large", files=3, size=32 * 1024**2, lists=3),
+    "many": Workload("many", files=2000, size=16),
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def measure(op: str, workload: str, calls: Iterable[Callable], size=0) -> dict:
+    latencies, errors = [], 0
+    start = time.perf_counter()
+    for call in calls:
+        t = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    return {
+        "workload": workload,
+        "op": op,
+        "n": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 6),
+        "ops_per_sec": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "bytes": size * len(latencies),
+    }
+
+
+def run_workload(provider, workload: Workload, local_dir: str, ops=None) -> List[dict]:
+    ops = ops or OPS
+    dirname = f"bench-{workload.name}"
+    names = [f"{dirname}/{i:06d}.bin" for i in range(workload.files)]
+    data = os.urandom(workload.size)
+    src = os.path.join(local_dir, workload.name + ".src")
+    with open(src, "wb") as f:
+        f.write(data)
+
+    # put は計測しない場合でも後続の準備として実行する
+    provider.mkdir(dirname)
+    puts = [lambda x=x: provider.put(x, io.BytesIO(data)) for x in names]
+    if "put" not in ops:
+        for put in puts:
+            put()
+
+    def download(name):
+        dest = os.path.join(local_dir, "download.bin")
+        provider.download(name, dest)
+        os.remove(dest)
+
+    calls = {
+        "put": puts,
+        "exists": [lambda x=x: provider.exists(x) for x in names],
+        "info": [lambda x=x: provider.info(x) for x in names],
+        "ll": [lambda: provider.ll(dirname)] * workload.lists,
+        "read_bytes": [lambda x=x: provider.read_bytes(x) for x in names],
+        "download": [lambda x=x: download(x) for x in names],
+        "upload": [lambda x=x: provider.upload(src, x) for x in names],
+    }
+    sizes = {"put": workload.size, "read_bytes": workload.size}
+    sizes.update(download=workload.size, upload=workload.size)
+    try:
+        return [measure(op, workload.name, calls[op], sizes.get(op, 0)) for op in ops]
+    finally:
+        try:
+            provider.delete(dirname)
+        except Exception:
+            ...
+
+
+def run(provider, workloads: Iterable[str] = None, ops=None) -> List[dict]:
+    local_dir = tempfile.mkdtemp(prefix="mystorage-bench-")
+    try:
+        return [
+            row
+            for name in workloads or WORKLOADS
+            for row in run_workload(provider, WORKLOADS[name], local_dir, ops)
+        ]
+    finally:
+        shutil.rmtree(local_dir, ignore_errors=True)
+
+
+def bench_webdav(
+    latency: float = 0.0,
+    bandwidth: int = None,
+    error_rate: float = 0.0,
+    seed: int = 0,
+    workloads: Iterable[str] = None,
+    ops=None,
+) -> Dict:
+    from mystorage.testserver import WebdavTestServer
+
+    params = {
+        "latency": latency,
+        "bandwidth": bandwidth,
+        "error_rate": error_rate,
+        "seed": seed,
+    }
+    root = tempfile.mkdtemp(prefix="mystorage-bench-root-")
+    try:
+        with WebdavTestServer(root, **params) as server:
+            provider = server.config().get_provider()
+            results = run(provider, workloads, ops)
+            requests = dict(server.requests)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return report(results, params, requests=requests)
+
+
+def report(results: List[dict], params: dict, **extra) -> Dict:
+    try:
+        from importlib.metadata import version
+
+        package_version = version("mystorage")
+    except Exception:
+        package_version = "unknown"
+    return {
+        "format": 1,
+        "mystorage": package_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": params,
+        "results": results,
+        **extra,
+    }
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float = 0.1) -> List[dict]:
+    """Rows whose p50/p99 grew or ops/sec fell by more than `tolerance`."""
+    old = {(x["workload"], x["op"]): x for x in baseline["results"]}
+    regressions = []
+    for row in current["results"]:
+        base = old.get((row["workload"], row["op"]))
+        if base is None:
+            continue
+        for metric, worse in (("p50_ms", 1), ("p99_ms", 1), ("ops_per_sec", -1)):
+            if not base[metric]:
+                continue
+            change = (row[metric] - base[metric]) / base[metric]
+            if change * worse > tolerance:
+                regressions.append(
+                    {
+                        "workload": row["workload"],
+                        "op": row["op"],
+                        "metric": metric,
+                        "baseline": base[metric],
+                        "current": row[metric],
+                        "change": round(change, 4),
+                    }
+                )
+    return regressions
+
+
+def format_table(results: List[dict]) -> str:
+    lines = [
+        f"{'workload':<8} {'op':<10} {'n':>6} {'err':>4} {'ops/s':>10}"
+        f" {'p50 ms':>9} {'p99 ms':>9}"
+    ]
+    for x in results:
+        lines.append(
+            f"{x['workload']:<8} {x['op']:<10} {x['n']:>6} {x['errors']:>4}"
+            f" {x['ops_per_sec']:>10.1f} {x['p50_ms']:>9.2f} {x['p99_ms']:>9.2f}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser("mystorage.benchmark")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--bandwidth", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workload", action="append", choices=list(WORKLOADS))
+    parser.add_argument("--op", action="append", choices=OPS)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    result = bench_webdav(
+        args.latency,
+        args.bandwidth,
+        args.error_rate,
+        args.seed,
+        args.workload,
+        args.op,
+    )
+    print(format_table(result["results"]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), result, args.tolerance)
+        for x in regressions:
+            print(
+                f"REGRESSION {x['workload']} {x['op']} {x['metric']}:"
+                f" {x['baseline']} -> {x['current']} ({x['change']:+.1%})"
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
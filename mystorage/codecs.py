@@ -0,0 +1,154 @@
+import zlib
+from typing import Iterable, Iterator, Optional, Tuple
+
+from mystorage.exceptions import StorageException
+
+"""
+# Streaming compression for text/JSON payloads. The codec is recorded in the name,
+# so reads decompress transparently.
+provider.write_json("events.json", data, compression="gzip")  # -> events.json.gz
+provider.read_json("events.json.gz")
+provider.write_text("app.log.zst", text)  # codec inferred from the suffix
+"""
+
+
+class Codec:
+    name: str = ""
+    suffix: str = ""
+
+    def compressor(self):
+        raise NotImplementedError()
+
+    def decompressor(self):
+        raise NotImplementedError()
+
+    def compress(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        compressor = self.compressor()
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        out = compressor.flush()
+        if out:
+            yield out
+
+    def decompress(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        decompressor = self.decompressor()
+        fed = False
+        for chunk in chunks:
+            fed = fed or bool(chunk)
+            out = decompressor.decompress(chunk)
+            if out:
+                yield out
+        if fed and not getattr(decompressor, "eof", True):
+            raise StorageException(f"Truncated {self.name} stream.")
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    suffix = ".gz"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def decompressor(self):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def decompress(self, chunks):
+        # 連結された gzip (複数メンバー) も読む
+        decompressor = self.decompressor()
+        fed = False  # 今のメンバーにデータを渡したか
+        for chunk in chunks:
+            while chunk:
+                fed = True
+                out = decompressor.decompress(chunk)
+                if out:
+                    yield out
+                chunk = b""
+                if decompressor.eof:
+                    chunk = decompressor.unused_data
+                    decompressor = self.decompressor()
+                    fed = False
+        if fed:
+            raise StorageException(f"Truncated {self.name} stream.")
+
+
+class ZstdCodec(Codec):
+    """Requires `zstandard`, or `compression.zstd` (3.14+) / `backports.zstd`."""
+
+    name = "zstd"
+    suffix = ".zst"
+
+    def __init__(self, level: int = 3):
+        self.level = level
+
+    @staticmethod
+    def _module():
+        try:
+            import zstandard
+
+            return zstandard, True
+        except ImportError:
+            ...
+        try:
+            from compression import zstd
+        except ImportError:
+            try:
+                from backports import zstd
+            except ImportError:
+                raise StorageException(
+                    "zstd compression requires the zstandard package."
+                ) from None
+        return zstd, False
+
+    def compressor(self):
+        zstd, is_zstandard = self._module()
+        if is_zstandard:
+            return zstd.ZstdCompressor(level=self.level).compressobj()
+        return zstd.ZstdCompressor(level=self.level)
+
+    def decompressor(self):
+        zstd, is_zstandard = self._module()
+        if is_zstandard:
+            return zstd.ZstdDecompressor().decompressobj()
+        return zstd.ZstdDecompressor()
+
+
+CODECS = {"gzip": GzipCodec(), "zstd": ZstdCodec()}
+
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise StorageException(f"Unknown compression: {name}") from None
+
+
+def codec_for_path(path) -> Optional[Codec]:
+    path = str(path)
+    for codec in CODECS.values():
+        if path.endswith(codec.suffix):
+            return codec
+    return None
+
+
+def resolve(path, compression: str = None) -> Tuple[str, Optional[Codec]]:
+    """(path to write, codec). Without `compression` the codec follows the suffix."""
+    path = str(path)
+    if compression is None:
+        return path, codec_for_path(path)
+    codec = get_codec(compression)
+    if not path.endswith(codec.suffix):
+        path += codec.suffix
+    return path, codec
+
+
+def iter_decoded(provider, path, chunk_size=None) -> Iterator[bytes]:
+    chunks = provider.iter_chunks(path, chunk_size)
+    codec = codec_for_path(path)
+    if codec is None:
+        return iter(chunks)
+    return codec.decompress(chunks)
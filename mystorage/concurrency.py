@@ -0,0 +1,170 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import copy_context
+from email.utils import parsedate_to_datetime
+
+"""
+# AIMD concurrency limit shared by every request of a connection pool.
+# Throttle responses (429/503) halve the limit, requests that are much slower than
+# the best latency seen shrink it a little, and everything else grows it by 1/limit.
+limiter = AdaptiveLimiter(initial=8, max_limit=32)
+with limiter.slot() as slot:
+    response = send()
+    slot.throttled = response.status_code in THROTTLE_STATUSES
+"""
+
+THROTTLE_STATUSES = (429, 503)
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE", "PROPFIND"])
+
+
+class Slot:
+    __slots__ = ("start", "throttled", "measure")
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.throttled = False
+        self.measure = True  # False: 転送量で時間が決まるので latency を判定に使わない
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 3.0,
+        latency_backoff: float = 0.9,
+    ):
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.latency_backoff = latency_backoff
+        self.baseline = None  # 最小 latency。少しずつ緩めて環境の変化に追従する
+        self.inflight = 0
+        self.throttled = 0
+        self.completed = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout: float = None) -> bool:
+        with self._cond:
+            if not self._cond.wait_for(self._has_room, timeout):
+                return False
+            self.inflight += 1
+            return True
+
+    def _has_room(self):
+        return self.inflight < max(int(self.limit), self.min_limit)
+
+    def release(self, latency: float = None, throttled: bool = False):
+        with self._cond:
+            self.inflight -= 1
+            self.completed += 1
+            if throttled:
+                self.throttled += 1
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            elif latency is not None and self._too_slow(latency):
+                self.limit = max(self.min_limit, self.limit * self.latency_backoff)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def cancel(self):
+        """Gives the slot back without changing the limit."""
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    def _too_slow(self, latency):
+        if self.baseline is None or latency < self.baseline:
+            self.baseline = latency
+            return False
+        self.baseline *= 1.01
+        return latency > self.baseline * self.latency_tolerance
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        slot = Slot()
+        try:
+            yield slot
+        except Exception:
+            # 接続エラーやタイムアウトも混雑の兆候として絞る
+            self.release(throttled=True)
+            raise
+        except BaseException:
+            self.cancel()
+            raise
+        latency = time.monotonic() - slot.start if slot.measure else None
+        self.release(latency, slot.throttled)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "completed": self.completed,
+                "throttled": self.throttled,
+                "baseline_ms": None
+                if self.baseline is None
+                else round(self.baseline * 1000, 3),
+            }
+
+
+def retry_after(value: str, now: float = None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        ...
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, dt.timestamp() - (time.time() if now is None else now))
+
+
+class RetryPolicy:
+    """Retries throttled idempotent requests with full jitter backoff."""
+
+    def __init__(
+        self,
+        retries: int = 5,
+        base: float = 0.1,
+        cap: float = 30.0,
+        statuses=THROTTLE_STATUSES,
+        methods=IDEMPOTENT_METHODS,
+    ):
+        self.retries = retries
+        self.base = base
+        self.cap = cap
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(methods)
+
+    def should_retry(self, method: str, status: int, attempt: int) -> bool:
+        return (
+            attempt < self.retries
+            and status in self.statuses
+            and method in self.methods
+        )
+
+    def delay(self, attempt: int, retry_after_value: str = None) -> float:
+        wait = retry_after(retry_after_value)
+        if wait is not None:
+            # 全員が同時に戻ってこないよう少しだけ散らす
+            return min(self.cap, wait) + random.uniform(0, self.base)
+        return random.uniform(0, min(self.cap, self.base * 2**attempt))
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that runs `fn` in a copy of the caller's context.
+
+    Keeps the active metrics spans (and other context variables) in the worker.
+    """
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
@@ -1,6 +1,13 @@
+from webdav3.exceptions import RemoteResourceNotFound
+
+
 class StorageException(Exception):
     ...
 
 
 class FileNotFound(StorageException, FileNotFoundError):
     ...
+
+
+# プロバイダ毎に「存在しない」の例外が異なる
+NOT_FOUND_ERRORS = (FileNotFoundError, RemoteResourceNotFound)
@@ -0,0 +1,196 @@
+import posixpath
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+"""
+# .gitignore rules compiled once per file. Plain names ("node_modules"), plain
+# paths ("/dist") and extensions ("*.pyc") are dict lookups and the remaining
+# globs share one regex, so adding patterns does not add Python-level work per path.
+rules = IgnoreRules(open(".gitignore").read().splitlines())
+rules.match("build/app.o", isdir=False)  # True: ignored, False: re-included, None: no rule
+"""
+
+GITIGNORE_DEFAULT = (".git/",)
+
+_GLOB_CHARS = re.compile(r"[*?\[\\]")
+
+
+def parse_line(line: str) -> Optional[Tuple[str, bool, bool]]:
+    """(glob, negate, dir_only) or None for blank lines and comments."""
+    line = line.rstrip("\r\n")
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "  # "\ " はスペースとして残す
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    elif line.startswith("\\#") or line.startswith("\\!"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    return line, negate, dir_only
+
+
+def translate(glob: str) -> str:
+    """gitignore glob -> regex without capturing groups."""
+    out = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if glob.startswith("**/", i) and (i == 0 or glob[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("/**", i) and i + 3 == n:
+            out.append("/.+")
+            break
+        if c == "*":
+            while i < n and glob[i] == "*":
+                i += 1
+            out.append("[^/]*")
+            continue
+        if c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = glob.find("]", i + 2)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1 : end].replace("\\", "\\\\")
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                out.append(f"(?!/)[{body}]")
+                i = end
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class _Table:
+    """Patterns of one kind ("name" or "path") and one dir_only flag."""
+
+    __slots__ = ("literals", "suffixes", "globs", "regex", "groups")
+
+    def __init__(self):
+        self.literals: Dict[str, Tuple[int, bool]] = {}
+        self.suffixes: Dict[str, Tuple[int, bool]] = {}
+        self.globs: List[Tuple[int, bool, str]] = []
+        self.regex = None
+        self.groups: List[Tuple[int, bool]] = []
+
+    def compile(self):
+        if not self.globs:
+            return
+        # 後ろのパターンが優先なので逆順に並べ、最初にマッチしたグループを採用する
+        globs = self.globs[::-1]
+        self.regex = re.compile("|".join(f"({x})" for _, _, x in globs), re.DOTALL)
+        self.groups = [(index, negate) for index, negate, _ in globs]
+
+    def lookup(self, key: str, best: Tuple[int, bool]) -> Tuple[int, bool]:
+        hit = self.literals.get(key)
+        if hit is not None and hit[0] > best[0]:
+            best = hit
+        if self.suffixes:
+            i = key.find(".")
+            while i != -1:
+                hit = self.suffixes.get(key[i:])
+                if hit is not None and hit[0] > best[0]:
+                    best = hit
+                i = key.find(".", i + 1)
+        if self.regex is not None:
+            m = self.regex.fullmatch(key)
+            if m is not None:
+                hit = self.groups[m.lastindex - 1]
+                if hit[0] > best[0]:
+                    best = hit
+        return best
+
+
+class IgnoreRules:
+    """Patterns of one .gitignore file. Paths are relative to its directory."""
+
+    def __init__(self, lines: Iterable[str] = ()):
+        # [kind][dir_only]
+        self._tables = {
+            "name": (_Table(), _Table()),
+            "path": (_Table(), _Table()),
+        }
+        self.size = 0
+        for line in lines:
+            parsed = parse_line(line)
+            if parsed is not None:
+                self._add(self.size, *parsed)
+                self.size += 1
+        for tables in self._tables.values():
+            for table in tables:
+                table.compile()
+
+    def _add(self, index, glob, negate, dir_only):
+        # "**/foo" は "foo" と同じ。"**/foo/bar" は translate で任意の深さにする
+        while glob.startswith("**/") and "/" not in glob[3:]:
+            glob = glob[3:]
+        # スラッシュを含むパターンはこのファイルのディレクトリからの相対パス
+        kind = "path" if "/" in glob else "name"
+        glob = glob.lstrip("/")
+        table = self._tables[kind][dir_only]
+        if not _GLOB_CHARS.search(glob):
+            table.literals[glob] = (index, negate)
+        elif (
+            kind == "name" and glob.startswith("*.") and not _GLOB_CHARS.search(glob, 1)
+        ):
+            table.suffixes[glob[1:]] = (index, negate)
+        else:
+            table.globs.append((index, negate, translate(glob)))
+
+    def __len__(self):
+        return self.size
+
+    def match(self, path: str, isdir: bool = False) -> Optional[bool]:
+        best = (-1, False)
+        name = path.rsplit("/", 1)[-1]
+        for kind, key in (("name", name), ("path", path)):
+            tables = self._tables[kind]
+            best = tables[0].lookup(key, best)
+            if isdir:
+                best = tables[1].lookup(key, best)
+        if best[0] < 0:
+            return None
+        return not best[1]
+
+
+class IgnoreMatcher:
+    """Nested .gitignore files of a work tree, keyed by their directory."""
+
+    def __init__(self, patterns: Iterable[str] = GITIGNORE_DEFAULT):
+        self.default = IgnoreRules(patterns)  # .git/info/exclude 相当。最も優先度が低い
+        self.rules: Dict[str, Optional[IgnoreRules]] = {}
+
+    def loaded(self, dirpath: str) -> bool:
+        return dirpath in self.rules
+
+    def add(self, dirpath: str, text: Optional[str]):
+        rules = IgnoreRules(text.splitlines()) if text else None
+        self.rules[dirpath] = rules if rules else None
+
+    def match(self, path: str, isdir: bool = False) -> bool:
+        """Whether `path` is ignored, assuming its parent directories are not."""
+        dirpath = path
+        while dirpath:
+            dirpath = posixpath.dirname(dirpath)
+            rules = self.rules.get(dirpath)
+            if rules is not None:
+                result = rules.match(
+                    path[len(dirpath) + 1 :] if dirpath else path, isdir
+                )
+                if result is not None:
+                    return result
+        return bool(self.default.match(path, isdir))
@@ -0,0 +1,74 @@
+import bisect
+import hashlib
+from typing import Dict, List
+
+HASHRING_VNODES = 160
+
+"""
+# Consistent hash ring. Adding or removing a node only moves the keys that
+# belong to that node; weights scale the number of virtual nodes.
+ring = HashRing({"a": 1.0, "b": 2.0})
+ring.get("dir1/file1")  # -> "b"
+"""
+
+
+def hash_key(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes: Dict[str, float] = None, vnodes: int = HASHRING_VNODES):
+        self.vnodes = vnodes
+        self.weights: Dict[str, float] = {}
+        self._hashes: List[int] = []
+        self._nodes: List[str] = []
+        for name, weight in (nodes or {}).items():
+            self.weights[name] = weight
+        self._build()
+
+    def _build(self):
+        points = []
+        for name, weight in self.weights.items():
+            count = max(1, round(self.vnodes * weight))
+            points.extend((hash_key(f"{name}#{i}"), name) for i in range(count))
+        points.sort()
+        self._hashes = [x for x, _ in points]
+        self._nodes = [x for _, x in points]
+
+    def add(self, name: str, weight: float = 1.0):
+        self.weights[name] = weight
+        self._build()
+
+    def remove(self, name: str):
+        self.weights.pop(name, None)
+        self._build()
+
+    def set_weights(self, weights: Dict[str, float]):
+        self.weights = dict(weights)
+        self._build()
+
+    def get(self, key: str) -> str:
+        if not self._hashes:
+            raise KeyError("HashRing is empty.")
+        index = bisect.bisect(self._hashes, hash_key(key)) % len(self._hashes)
+        return self._nodes[index]
+
+    def get_n(self, key: str, n: int) -> List[str]:
+        """Distinct nodes in ring order starting at the owner of key."""
+        result = []
+        if not self._hashes:
+            return result
+        start = bisect.bisect(self._hashes, hash_key(key))
+        for i in range(len(self._hashes)):
+            name = self._nodes[(start + i) % len(self._hashes)]
+            if name not in result:
+                result.append(name)
+                if len(result) >= n:
+                    break
+        return result
+
+    def __contains__(self, name):
+        return name in self.weights
+
+    def __len__(self):
+        return len(self.weights)
@@ -0,0 +1,213 @@
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Tuple
+
+"""
+# Durable queue of writes still to be replayed on each replica.
+# A `put` only records the path: the replica copies whatever the primary holds
+# when it is replayed, so repeated puts to the same path collapse into one row.
+journal = ReplicationJournal("replica.journal.sqlite")
+seqs = journal.append(["b", "c"], "put", "dir1/file1", held=True)  # プライマリへの書き込み前
+journal.commit(seqs)  # 書き込めたら再生できるようにする
+rows = journal.claim("b", 100)
+journal.done([x.seq for x in rows])
+"""
+
+PENDING = 0
+IN_FLIGHT = 1
+HELD = 2  # プライマリへの書き込みが終わるまで再生しない
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    replica TEXT NOT NULL,
+    op TEXT NOT NULL,
+    path TEXT NOT NULL,
+    dest TEXT,
+    created REAL NOT NULL,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS journal_replica ON journal (replica, state, seq);
+"""
+
+
+def escape_like(path):
+    return path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def overlaps(a: str, b: str) -> bool:
+    """Whether `a` and `b` are the same path or one contains the other."""
+    if a == b or not a or not b:
+        return True
+    return a.startswith(b + "/") or b.startswith(a + "/")
+
+
+class JournalRow:
+    __slots__ = ("seq", "replica", "op", "path", "dest", "created", "attempts")
+
+    def __init__(self, seq, replica, op, path, dest, created, attempts):
+        self.seq = seq
+        self.replica = replica
+        self.op = op
+        self.path = path
+        self.dest = dest
+        self.created = created
+        self.attempts = attempts
+
+
+class ReplicationJournal:
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.coalesced = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        # 前回の実行中に中断したものはやり直す
+        with self._conn:
+            self._conn.execute(
+                "UPDATE journal SET state = ? WHERE state = ?", (PENDING, IN_FLIGHT)
+            )
+            # プライマリに書けたか分からないものはプライマリの状態に合わせる
+            self._conn.execute(
+                "UPDATE journal SET op = 'sync', state = ? WHERE state = ?",
+                (PENDING, HELD),
+            )
+
+    def close(self):
+        self._conn.close()
+
+    def _barrier(self, replica, before: int = 1 << 62) -> int:
+        # put 以外の操作を越えて畳み込むと順序が変わる
+        row = self._conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM journal"
+            " WHERE replica = ? AND op != 'put' AND seq < ?",
+            (replica, before),
+        ).fetchone()
+        return row[0]
+
+    def append(
+        self,
+        replicas: Iterable[str],
+        op: str,
+        path: str,
+        dest: str = None,
+        held: bool = False,
+    ) -> List[int]:
+        """Returns the seqs of the inserted rows. `held` rows wait for commit()."""
+        now = time.time()
+        seqs = []
+        with self._lock, self._conn:
+            for replica in replicas:
+                if op == "put" and not held:
+                    found = self._conn.execute(
+                        "SELECT 1 FROM journal WHERE replica = ? AND op = 'put'"
+                        " AND path = ? AND state = ? AND seq > ?",
+                        (replica, path, PENDING, self._barrier(replica)),
+                    ).fetchone()
+                    if found:
+                        self.coalesced += 1
+                        continue
+                elif op == "delete":
+                    cursor = self._conn.execute(
+                        "DELETE FROM journal WHERE replica = ? AND op = 'put'"
+                        " AND state = ? AND seq > ?"
+                        " AND (path = ? OR path LIKE ? ESCAPE '\\')",
+                        (
+                            replica,
+                            PENDING,
+                            self._barrier(replica),
+                            path,
+                            escape_like(path) + "/%" if path else "%",
+                        ),
+                    )
+                    self.coalesced += cursor.rowcount
+                cursor = self._conn.execute(
+                    "INSERT INTO journal (replica, op, path, dest, created, state)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (replica, op, path, dest, now, HELD if held else PENDING),
+                )
+                seqs.append(cursor.lastrowid)
+        return seqs
+
+    def commit(self, seqs: Iterable[int]):
+        with self._lock, self._conn:
+            for seq in seqs:
+                row = self._conn.execute(
+                    "SELECT replica, op, path FROM journal WHERE seq = ? AND state = ?",
+                    (seq, HELD),
+                ).fetchone()
+                if row is None:
+                    continue
+                replica, op, path = row
+                if op == "put":
+                    # 待っている古い put は新しい行に畳み込む
+                    cursor = self._conn.execute(
+                        "DELETE FROM journal WHERE replica = ? AND op = 'put'"
+                        " AND path = ? AND state = ? AND seq > ? AND seq < ?",
+                        (replica, path, PENDING, self._barrier(replica, seq), seq),
+                    )
+                    self.coalesced += cursor.rowcount
+                self._conn.execute(
+                    "UPDATE journal SET state = ? WHERE seq = ?", (PENDING, seq)
+                )
+
+    def abort(self, seqs: Iterable[int]):
+        """Turns held rows into "sync" rows: the replica copies the primary's state."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE journal SET op = 'sync', state = ? WHERE seq = ? AND state = ?",
+                [(PENDING, x, HELD) for x in seqs],
+            )
+
+    def claim(self, replica: str, limit: int) -> List[JournalRow]:
+        # 書き込み中の行と重なるパス (同じパスと親子) の行だけ追い越さない。
+        # 待たせた行と重なる後ろの行も待たせて、同じパスの順序を保つ
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "SELECT seq, replica, op, path, dest, created, attempts, state"
+                " FROM journal WHERE replica = ? AND state IN (?, ?) ORDER BY seq",
+                (replica, PENDING, HELD),
+            )
+            rows, blocked = [], []
+            for *row, state in cursor:
+                if len(rows) >= limit:
+                    break
+                paths = [x for x in row[3:5] if x is not None]
+                if state == HELD or any(overlaps(a, b) for a in paths for b in blocked):
+                    blocked.extend(paths)
+                    continue
+                rows.append(row)
+            cursor.close()
+            self._conn.executemany(
+                "UPDATE journal SET state = ? WHERE seq = ?",
+                [(IN_FLIGHT, x[0]) for x in rows],
+            )
+        return [JournalRow(*x) for x in rows]
+
+    def done(self, seqs: Iterable[int]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM journal WHERE seq = ?", [(x,) for x in seqs]
+            )
+
+    def release(self, seqs: Iterable[int]):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE journal SET state = ?, attempts = attempts + 1 WHERE seq = ?",
+                [(PENDING, x) for x in seqs],
+            )
+
+    def depth(self) -> List[Tuple[str, int, float]]:
+        """(replica, rows, created of the oldest row) per replica."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT replica, COUNT(*), MIN(created) FROM journal GROUP BY replica"
+            ).fetchall()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM journal").fetchone()[0]
@@ -0,0 +1,120 @@
+from typing import Any, Callable, Iterable, Iterator
+
+from mystorage.exceptions import StorageException
+
+"""
+# JSON Lines, one record at a time while the data streams. Compression follows the
+# suffix as in write_text/read_text. json_codec="orjson" is faster if it is installed.
+provider.write_jsonl("events.jsonl.gz", ({"id": i} for i in range(10**7)))
+for record in provider.iter_jsonl("events.jsonl.gz", json_codec="orjson"):
+    ...
+"""
+
+JSONL_BATCH_BYTES = 1024 * 1024
+
+
+class JsonCodec:
+    name = ""
+
+    def loads(self, line: bytes) -> Any:
+        raise NotImplementedError()
+
+    def dumps_line(self, obj) -> bytes:
+        """Encodes `obj` followed by a newline."""
+        raise NotImplementedError()
+
+
+class StdJsonCodec(JsonCodec):
+    name = "json"
+
+    def __init__(self):
+        import json
+
+        self._loads = json.loads
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def loads(self, line):
+        return self._loads(line)
+
+    def dumps_line(self, obj):
+        return (self._encoder.encode(obj) + "\n").encode("utf-8")
+
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+
+        self._orjson = orjson
+        self.loads = orjson.loads
+
+    def dumps_line(self, obj):
+        return self._orjson.dumps(obj, option=self._orjson.OPT_APPEND_NEWLINE)
+
+
+JSON_CODECS = {"json": StdJsonCodec, "orjson": OrjsonCodec}
+
+
+def get_json_codec(codec=None) -> JsonCodec:
+    """`codec` is a JsonCodec, a name in JSON_CODECS, or None (the json module)."""
+    if isinstance(codec, JsonCodec):
+        return codec
+    try:
+        factory = JSON_CODECS[codec or "json"]
+    except KeyError:
+        raise StorageException(f"Unknown json codec: {codec}") from None
+    try:
+        return factory()
+    except ImportError:
+        raise StorageException(f"json codec {codec} is not installed.") from None
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    # 改行が来るまでの断片は bytearray に足していく (長い行でもコピーは 1 回)
+    pending = bytearray()
+    for chunk in chunks:
+        start = 0
+        end = chunk.find(b"\n")
+        while end != -1:
+            if pending:
+                pending += chunk[start:end]
+                line = bytes(pending)
+                pending.clear()
+                yield line
+            else:
+                yield chunk[start:end]
+            start = end + 1
+            end = chunk.find(b"\n", start)
+        pending += chunk[start:]
+    if pending:
+        yield bytes(pending)
+
+
+def decode_jsonl(chunks: Iterable[bytes], loads: Callable[[bytes], Any]):
+    for number, line in enumerate(iter_lines(chunks), 1):
+        if not line.strip():
+            continue
+        try:
+            yield loads(line)
+        except ValueError as e:
+            raise StorageException(f"Invalid JSON at line {number}: {e}") from e
+
+
+def encode_jsonl(
+    records: Iterable, dumps_line: Callable[[Any], bytes], batch_bytes=JSONL_BATCH_BYTES
+) -> Iterator[bytes]:
+    # 1 レコードずつ書くと write_stream のチャンクが細かくなりすぎる
+    batch, size = [], 0
+    for number, record in enumerate(records, 1):
+        try:
+            line = dumps_line(record)
+        except (TypeError, ValueError) as e:
+            raise StorageException(f"Cannot encode record {number}: {e}") from e
+        batch.append(line)
+        size += len(line)
+        if size >= batch_bytes:
+            yield b"".join(batch)
+            batch, size = [], 0
+    if batch:
+        yield b"".join(batch)
@@ -0,0 +1,260 @@
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import lru_cache
+
+from mystorage.types import FileInfo, ResourceTypes
+
+"""
+# Column-oriented directory listing. Values are kept as received and converted
+# only when an entry is read, so a 200k-entry ll() stores 8 lists instead of
+# 200k dicts. Entries behave like the info dicts returned by info().
+listing = provider.ll_listing("dir1")  # WebdavProvider; ll() returns plain dicts
+listing.names()           # no per-entry objects at all
+listing[0]["modified"]    # parsed on access (cached)
+listing[0].to_model()     # typed FileInfo
+"""
+
+MONTHS = {
+    "Jan": 1,
+    "Feb": 2,
+    "Mar": 3,
+    "Apr": 4,
+    "May": 5,
+    "Jun": 6,
+    "Jul": 7,
+    "Aug": 8,
+    "Sep": 9,
+    "Oct": 10,
+    "Nov": 11,
+    "Dec": 12,
+}
+
+
+@lru_cache(maxsize=65536)
+def parse_http_date(value: str) -> datetime:
+    # RFC 1123 "Sat, 17 Dec 2022 13:58:13 GMT" を strptime を使わずに読む
+    try:
+        _, day, month, year, hms, tz = value.split(" ")
+        if tz not in ("GMT", "UTC"):
+            raise ValueError(value)
+        hour, minute, second = hms.split(":")
+        return datetime(
+            int(year),
+            MONTHS[month],
+            int(day),
+            int(hour),
+            int(minute),
+            int(second),
+            tzinfo=timezone.utc,
+        )
+    except (ValueError, KeyError):
+        pass
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # creationdate は RFC 3339 (ISO 8601) で返すサーバーが多い
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+@lru_cache(maxsize=65536)
+def format_http_date(value: str) -> str:
+    try:
+        return str(parse_http_date(value))
+    except ValueError:
+        # 読めない日付はそのまま返す
+        return value
+
+
+def to_size(value) -> int:
+    return int(value) if value else 0
+
+
+class Entry(Mapping):
+    """One row of a Listing. Read-only mapping with the info() keys."""
+
+    __slots__ = ("_listing", "_index")
+    KEYS = (
+        "created",
+        "modified",
+        "name",
+        "size",
+        "etag",
+        "content_type",
+        "isdir",
+        "path",
+    )
+
+    def __init__(self, listing: "Listing", index: int):
+        self._listing = listing
+        self._index = index
+
+    def __getitem__(self, key):
+        listing, i = self._listing, self._index
+        if key == "name":
+            return listing._names[i]
+        if key == "path":
+            return listing._paths[i]
+        if key == "isdir":
+            return listing._types[i]
+        if key == "size":
+            return listing._sizes[i]
+        if key == "etag":
+            return listing._etags[i]
+        if key == "content_type":
+            return listing._content_types[i]
+        if key == "modified":
+            modified = listing._modified[i]
+            return None if modified is None else listing.format_date(modified)
+        if key == "created":
+            created = listing._created[i]
+            if created is None:
+                return self["modified"]
+            return listing.format_date(created)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return f"Entry({dict(self)!r})"
+
+    @property
+    def modified_at(self) -> datetime:
+        return self._listing.parse_date(self._listing._modified[self._index])
+
+    def to_model(self) -> FileInfo:
+        created = self._listing._created[self._index]
+        return FileInfo(
+            created=self.modified_at
+            if created is None
+            else self._listing.parse_date(created),
+            modified=self.modified_at,
+            name=self["name"] or "",
+            size=self["size"],
+            etag=self["etag"] or "",
+            content_type=self["content_type"] or "",
+            is_dir=self["isdir"] == ResourceTypes.DIR,
+            path=self["path"],
+        )
+
+
+class Listing(Sequence):
+    __slots__ = (
+        "_names",
+        "_paths",
+        "_types",
+        "_sizes",
+        "_etags",
+        "_content_types",
+        "_modified",
+        "_created",
+        "parse_date",
+        "format_date",
+    )
+
+    def __init__(self, parse_date=parse_http_date, format_date=format_http_date):
+        self._names = []
+        self._paths = []
+        self._types = bytearray()
+        self._sizes = array("q")
+        self._etags = []
+        self._content_types = []
+        self._modified = []
+        self._created = []
+        self.parse_date = parse_date
+        self.format_date = format_date
+
+    def append(
+        self,
+        path: str,
+        isdir: bool,
+        size: int = 0,
+        modified=None,
+        etag: str = None,
+        name: str = None,
+        content_type: str = None,
+        created=None,
+    ):
+        self._names.append(name)
+        self._paths.append(path)
+        self._types.append(ResourceTypes.DIR if isdir else ResourceTypes.FILE)
+        self._sizes.append(size)
+        self._etags.append(etag)
+        self._content_types.append(content_type)
+        self._modified.append(modified)
+        self._created.append(created)
+
+    def append_info(self, x: dict):
+        """Adds a raw webdav3 info dict (strings as received)."""
+        self.append(
+            x["path"],
+            bool(x.get("isdir")),
+            to_size(x.get("size")),
+            x.get("modified"),
+            x.get("etag"),
+            x.get("name"),
+            x.get("content_type"),
+            x.get("created"),
+        )
+
+    @classmethod
+    def from_infos(cls, infos) -> "Listing":
+        listing = cls()
+        for x in infos:
+            listing.append_info(x)
+        return listing
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self._take(range(len(self))[index])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return Entry(self, index)
+
+    def _take(self, indexes) -> "Listing":
+        result = Listing(self.parse_date, self.format_date)
+        for name in ("_names", "_paths", "_etags", "_content_types", "_modified"):
+            values = getattr(self, name)
+            getattr(result, name).extend(values[i] for i in indexes)
+        result._created.extend(self._created[i] for i in indexes)
+        result._types.extend(self._types[i] for i in indexes)
+        result._sizes.extend(self._sizes[i] for i in indexes)
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self):
+        return f"Listing({len(self)} entries)"
+
+    def files(self) -> "Listing":
+        t = ResourceTypes.FILE
+        return self._take([i for i, x in enumerate(self._types) if x == t])
+
+    def dirs(self) -> "Listing":
+        t = ResourceTypes.DIR
+        return self._take([i for i, x in enumerate(self._types) if x == t])
+
+    def names(self):
+        return [
+            name or path.rstrip("/").rsplit("/", 1)[-1]
+            for name, path in zip(self._names, self._paths)
+        ]
+
+    def to_dicts(self):
+        return [dict(x) for x in self]
+
+    def to_models(self):
+        return [x.to_model() for x in self]
@@ -0,0 +1,431 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict
+
+from mystorage.types import Provider, ProviderWrapper
+
+"""
+# Latency histograms, HTTP round trips, bytes and retries per Provider call.
+metrics = InMemoryExporter()
+provider = InstrumentedProvider(WebdavConfig().get_provider(), metrics)
+provider.ll("dir1")
+metrics.snapshot()["ll"]  # {"count": 1, "requests": 1, "p50_ms": 5.0, ...}
+provider.enabled = False  # 委譲だけになる
+"""
+
+# ミリ秒。最後のバケットはそれ以上
+HISTOGRAM_BOUNDS_MS = (
+    1,
+    2,
+    5,
+    10,
+    20,
+    50,
+    100,
+    200,
+    500,
+    1000,
+    2000,
+    5000,
+    10000,
+    30000,
+    60000,
+)
+
+_spans = ContextVar("mystorage_spans", default=())
+
+
+class Span:
+    __slots__ = (
+        "name",
+        "path",
+        "start",
+        "end",
+        "requests",
+        "retries",
+        "bytes_in",
+        "bytes_out",
+        "bytes_sent",
+        "bytes_received",
+        "error",
+        "_lock",
+    )
+
+    def __init__(self, name: str, path=None):
+        self.name = name
+        self.path = path
+        self.start = time.time()
+        self.end = None
+        self.requests = 0  # HTTP round trips
+        self.retries = 0
+        self.bytes_in = 0  # payload read through the call
+        self.bytes_out = 0  # payload written through the call
+        self.bytes_sent = 0  # HTTP request bodies
+        self.bytes_received = 0  # HTTP response bodies
+        self.error = None
+        self._lock = threading.Lock()
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def add(self, **counts):
+        # 並列転送のワーカーからも加算される
+        with self._lock:
+            for key, value in counts.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def to_otel(self) -> dict:
+        """OpenTelemetry-like span dict."""
+        attributes = {
+            "storage.method": self.name,
+            "storage.path": "" if self.path is None else str(self.path),
+            "storage.requests": self.requests,
+            "storage.retries": self.retries,
+            "storage.bytes_in": self.bytes_in,
+            "storage.bytes_out": self.bytes_out,
+            "http.request_content_length": self.bytes_sent,
+            "http.response_content_length": self.bytes_received,
+        }
+        status = {"code": "OK"}
+        if self.error is not None:
+            attributes["exception.type"] = type(self.error).__name__
+            status = {"code": "ERROR", "description": str(self.error)}
+        return {
+            "name": f"mystorage.{self.name}",
+            "start_time_unix_nano": int(self.start * 1e9),
+            "end_time_unix_nano": int((self.end or time.time()) * 1e9),
+            "attributes": attributes,
+            "status": status,
+        }
+
+
+def active_spans():
+    return _spans.get()
+
+
+def record_retry():
+    for span in _spans.get():
+        span.add(retries=1)
+
+
+def count_response(response, *args, **kwargs):
+    """requests response hook: attributes HTTP round trips to the active spans.
+
+    Must run before hooks that read the body.
+    """
+    spans = _spans.get()
+    if not spans:
+        return response
+    body = response.request.body
+    if isinstance(body, (bytes, str)):
+        sent = len(body)
+    else:
+        sent = int(response.request.headers.get("Content-Length") or 0)
+    for span in spans:
+        span.add(requests=1, bytes_sent=sent)
+
+    # Content-Length の無いチャンク転送や HEAD もあるので、実際に読んだ量を数える
+    iter_content = response.iter_content
+
+    def counted(*args, **kwargs):
+        for chunk in iter_content(*args, **kwargs):
+            for span in spans:
+                span.add(bytes_received=len(chunk))
+            yield chunk
+
+    response.iter_content = counted
+    return response
+
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect_left(HISTOGRAM_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th value."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BOUNDS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(bound), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        buckets = {str(x): c for x, c in zip(HISTOGRAM_BOUNDS_MS, self.counts) if c}
+        if self.counts[-1]:
+            buckets["+Inf"] = self.counts[-1]
+        return {
+            "sum_ms": round(self.total, 3),
+            "max_ms": round(self.max, 3),
+            "p50_ms": self.percentile(0.5),
+            "p90_ms": self.percentile(0.9),
+            "p99_ms": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+
+class InMemoryExporter:
+    FIELDS = (
+        "requests",
+        "retries",
+        "bytes_in",
+        "bytes_out",
+        "bytes_sent",
+        "bytes_received",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def export(self, span: Span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = {
+                    "count": 0,
+                    "errors": 0,
+                    "max_requests": 0,
+                    "histogram": Histogram(),
+                    **{x: 0 for x in self.FIELDS},
+                }
+            stats["count"] += 1
+            stats["errors"] += span.error is not None
+            stats["max_requests"] = max(stats["max_requests"], span.requests)
+            for x in self.FIELDS:
+                stats[x] += getattr(span, x)
+            stats["histogram"].observe(span.duration * 1000)
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                row = {k: v for k, v in stats.items() if k != "histogram"}
+                row["requests_per_call"] = round(stats["requests"] / stats["count"], 3)
+                row.update(stats["histogram"].to_dict())
+                result[name] = row
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+
+class LoggingExporter:
+    def __init__(self, logger=None, level=logging.DEBUG, slow_ms: float = None):
+        self.logger = logger or logging.getLogger("mystorage.metrics")
+        self.level = level
+        self.slow_ms = slow_ms  # 指定するとこれより遅い呼び出しとエラーだけ出す
+
+    def export(self, span: Span):
+        ms = span.duration * 1000
+        if span.error is not None:
+            level = max(self.level, logging.WARNING)
+        elif self.slow_ms is not None and ms < self.slow_ms:
+            return
+        else:
+            level = self.level
+        if not self.logger.isEnabledFor(level):
+            return
+        self.logger.log(
+            level,
+            "%s %s %.1fms requests=%d retries=%d in=%d out=%d%s",
+            span.name,
+            span.path,
+            ms,
+            span.requests,
+            span.retries,
+            span.bytes_in,
+            span.bytes_out,
+            "" if span.error is None else f" error={span.error!r}",
+        )
+
+
+class SpanExporter:
+    """Passes each call to `callback` as an OpenTelemetry-like span dict."""
+
+    def __init__(self, callback: Callable[[dict], None]):
+        self.callback = callback
+
+    def export(self, span: Span):
+        self.callback(span.to_otel())
+
+
+def _instrument(name):
+    def method(self, *args, **kwargs):
+        func = getattr(self.provider, name)
+        if not self.enabled:
+            return func(*args, **kwargs)
+        return self._call(name, args[0] if args else None, func, *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+def _instrument_iter(name):
+    def method(self, *args, **kwargs):
+        func = getattr(self.provider, name)
+        if not self.enabled:
+            return func(*args, **kwargs)
+        return self._iter(name, args[0] if args else None, func, *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+class InstrumentedProvider(ProviderWrapper):
+    """Records every call to `provider` and hands it to the exporters.
+
+    HTTP round trips are counted for providers that report them (WebdavProvider).
+    """
+
+    def __init__(self, provider: Provider, *exporters, enabled: bool = True):
+        super().__init__(provider)
+        self.exporters = list(exporters) or [InMemoryExporter()]
+        self.enabled = enabled
+
+    def snapshot(self) -> Dict[str, dict]:
+        for exporter in self.exporters:
+            if isinstance(exporter, InMemoryExporter):
+                return exporter.snapshot()
+        return {}
+
+    def _finish(self, span: Span):
+        span.end = time.time()
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                logging.getLogger("mystorage.metrics").exception("Exporter failed.")
+
+    def _call(self, name, path, func, *args, **kwargs):
+        span = Span(name, path)
+        token = _spans.set(_spans.get() + (span,))
+        try:
+            result = func(*args, **kwargs)
+            if isinstance(result, bytes):
+                span.add(bytes_in=len(result))
+            return result
+        except BaseException as e:
+            span.error = e
+            raise
+        finally:
+            _spans.reset(token)
+            self._finish(span)
+
+    def _iter(self, name, path, func, *args, **kwargs):
+        # ジェネレーターの外にスパンが漏れないよう、next() の間だけ有効にする
+        span = Span(name, path)
+        try:
+            token = _spans.set(_spans.get() + (span,))
+            try:
+                iterator = iter(func(*args, **kwargs))
+            finally:
+                _spans.reset(token)
+            while True:
+                token = _spans.set(_spans.get() + (span,))
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    _spans.reset(token)
+                if isinstance(item, bytes):
+                    span.add(bytes_in=len(item))
+                yield item
+        except GeneratorExit:
+            raise
+        except BaseException as e:
+            span.error = e
+            raise
+        finally:
+            self._finish(span)
+
+    def put(self, path, buf):
+        if not self.enabled:
+            return self.provider.put(path, buf)
+        try:
+            start = buf.tell()
+        except Exception:
+            start = None
+
+        def put():
+            result = self.provider.put(path, buf)
+            if start is not None:
+                for span in _spans.get()[-1:]:
+                    span.add(bytes_out=buf.tell() - start)
+            return result
+
+        return self._call("put", path, put)
+
+    def write_stream(self, path, iterable):
+        if not self.enabled:
+            return self.provider.write_stream(path, iterable)
+
+        def counted():
+            for chunk in iterable:
+                for span in spans:
+                    span.add(bytes_out=len(chunk))
+                yield chunk
+
+        spans = ()
+
+        def write_stream():
+            nonlocal spans
+            spans = _spans.get()[-1:]
+            return self.provider.write_stream(path, counted())
+
+        return self._call("write_stream", path, write_stream)
+
+
+for _name in (
+    "exists",
+    "info",
+    "type",
+    "isdir",
+    "ls",
+    "ls_files",
+    "ls_dirs",
+    "ll",
+    "ll_files",
+    "ll_dirs",
+    "read",
+    "read_bytes",
+    "read_text",
+    "read_json",
+    "open",
+    "open_if_modified",
+    "download",
+    "upload",
+    "create",
+    "delete",
+    "mkdir",
+    "move",
+    "copy",
+    "rename",
+    "free",
+):
+    setattr(InstrumentedProvider, _name, _instrument(_name))
+
+for _name in ("iter_chunks", "iter_ll", "walk"):
+    setattr(InstrumentedProvider, _name, _instrument_iter(_name))
+
+del _name
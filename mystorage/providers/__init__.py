@@ -1,3 +1,4 @@
+from .local import LocalConfig
 from .webdav import WebdavConfig
 
-__all__ = ["WebdavConfig"]
+__all__ = ["LocalConfig", "WebdavConfig"]
@@ -0,0 +1,167 @@
+from urllib.parse import unquote, urlsplit
+
+import httpx
+from webdav3.client import WebDavXmlUtils
+from webdav3.urn import Urn
+
+from mystorage.aio import AsyncProvider
+from mystorage.exceptions import FileNotFound, StorageException
+from mystorage.providers.webdav import WebdavConfig, WebdavProvider
+from mystorage.types import ResourceTypes
+
+# httpx は任意依存 (pip install mystorage[aio])。WebdavConfig.get_async_provider() から遅延 import される
+
+CHUNK_SIZE = 65536
+
+
+class AsyncWebdavProvider(AsyncProvider):
+    def __init__(self, client: httpx.AsyncClient, base_url: str):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+
+    @classmethod
+    def from_config(cls, config: WebdavConfig):
+        limits = httpx.Limits(
+            max_connections=config.pool_maxsize if config.pool_block else None,
+            max_keepalive_connections=config.pool_maxsize,
+        )
+        client = httpx.AsyncClient(
+            auth=(config.user, config.password),
+            verify=config.verify,
+            limits=limits,
+            timeout=30,
+        )
+        root = Urn(config.webdav_root).quote().rstrip("/")
+        return cls(client, config.get_url() + root)
+
+    async def close(self):
+        await self.client.aclose()
+
+    def _url(self, path, directory=False):
+        return self.base_url + Urn(str(path), directory=directory).quote()
+
+    async def _request(self, method, path, headers=None, **kwargs):
+        response = await self.client.request(
+            method, self._url(path), headers=headers, **kwargs
+        )
+        self._raise_for_status(response, path)
+        return response
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, path):
+        if response.status_code == 404:
+            raise FileNotFound(path)
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise StorageException(
+                f"{response.request.method} {path}: HTTP {response.status_code}"
+            ) from e
+
+    async def _propfind(self, path, depth):
+        response = await self._request(
+            "PROPFIND", path, headers={"Depth": str(depth), "Accept": "*/*"}
+        )
+        infos = WebDavXmlUtils.parse_get_list_info_response(response.content)
+        return [WebdavProvider.convert_info(x) for x in infos]
+
+    async def exists(self, path):
+        response = await self.client.head(self._url(path))
+        if response.status_code == 404:
+            return False
+        self._raise_for_status(response, path)
+        return True
+
+    async def info(self, path):
+        return (await self._propfind(path, 0))[0]
+
+    async def type(self, path):
+        try:
+            info = await self.info(path)
+        except FileNotFound:
+            return ResourceTypes.NO_EXISTS
+        return info["isdir"]
+
+    async def ll(self, path):
+        url_path = Urn.normalize_path(urlsplit(self._url(path, True)).path)
+        return [
+            x
+            for x in await self._propfind(path, 1)
+            if Urn.normalize_path(x["path"]) != unquote(url_path)
+        ]
+
+    async def ls(self, path):
+        return [x["path"].rstrip("/").rsplit("/", 1)[-1] for x in await self.ll(path)]
+
+    async def iter_chunks(self, path, chunk_size=None):
+        async with self.client.stream("GET", self._url(path)) as response:
+            self._raise_for_status(response, path)
+            async for chunk in response.aiter_bytes(chunk_size or CHUNK_SIZE):
+                yield chunk
+
+    async def delete(self, path):
+        await self._request("DELETE", path)
+
+    async def mkdir(self, path):
+        response = await self.client.request("MKCOL", self._url(path, True))
+        if response.status_code != 405:  # already exists
+            self._raise_for_status(response, path)
+        return await self.info(path)
+
+    async def put(self, path, buf):
+        return await self._create_or_put("put", path, buf)
+
+    async def create(self, path, buf):
+        return await self._create_or_put("create", path, buf)
+
+    async def _create_or_put(self, action, path, buf):
+        await self._check_writable(action, path)
+        return await self._upload(path, self._iter_buffer(buf))
+
+    async def _check_writable(self, action, path):
+        if action == "create":
+            if await self.exists(path):
+                raise StorageException("Resource already exists.")
+        elif action == "put":
+            if await self.type(path) == ResourceTypes.DIR:
+                raise StorageException("PUT is not allowed on non-files.")
+        else:
+            raise Exception()
+
+    @staticmethod
+    async def _iter_buffer(buf):
+        while True:
+            chunk = buf.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    async def _upload(self, path, aiterable):
+        await self._request("PUT", path, content=aiterable)
+        return await self.info(path)
+
+    async def write_stream(self, path, aiterable):
+        await self._check_writable("put", path)
+        return await self._upload(path, aiterable)
+
+    async def _move_or_copy(self, method, src, dest, overwrite=False):
+        headers = {
+            "Destination": self._url(dest),
+            "Overwrite": "T" if overwrite else "F",
+        }
+        try:
+            await self._request(method, src, headers=headers)
+        except FileNotFound:
+            raise StorageException("Src not found.")
+
+    async def move(self, src, dest):
+        await self._move_or_copy("MOVE", src, dest)
+
+    async def copy(self, src, dest):
+        await self._move_or_copy("COPY", src, dest, overwrite=True)
+        return await self.info(dest)
+
+    async def rename(self, src, name):
+        urn = Urn(str(src))
+        dest = urn.parent() + Urn(str(name)).filename()
+        await self.move(src, dest)
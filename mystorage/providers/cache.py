@@ -0,0 +1,222 @@
+import posixpath
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from mystorage.exceptions import NOT_FOUND_ERRORS
+from mystorage.types import Provider, ProviderWrapper, ResourceTypes
+
+"""
+# Answer exists / info / type from memory. Writes made through the wrapper
+# update or drop the affected entries.
+provider = MetadataCachedProvider(WebdavConfig().get_provider(), ttl=30)
+"""
+
+
+def normpath(path) -> str:
+    return posixpath.normpath("/" + str(path)).strip("/")
+
+
+def parent_of(key: str) -> str:
+    return posixpath.dirname(key)
+
+
+class CacheEntry:
+    __slots__ = ("exists", "info", "type", "expires", "error")
+
+    def __init__(self, exists, info, type, expires, error=None):
+        self.exists = exists
+        self.info = info
+        self.type = type
+        self.expires = expires
+        self.error = error  # info() が失敗したときの例外。同じ型で投げ直す
+
+
+class MetadataCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 30, negative_ttl: float = 5):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry.expires < time.monotonic():
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, exists: bool, info=None, type=None, error=None):
+        if not exists:
+            type = ResourceTypes.NO_EXISTS
+        elif info is not None:
+            type = info["isdir"]
+        ttl = self.ttl if exists else self.negative_ttl
+        entry = CacheEntry(exists, info, type, time.monotonic() + ttl, error)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key, recursive=False):
+        with self._lock:
+            self._data.pop(key, None)
+            if recursive:
+                prefix = key + "/" if key else ""
+                for k in [k for k in self._data if k.startswith(prefix)]:
+                    del self._data[k]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        return {"size": size, "hits": self.hits, "misses": self.misses}
+
+
+class MetadataCachedProvider(ProviderWrapper):
+    def __init__(self, provider: Provider, cache: MetadataCache = None, **kwargs):
+        super().__init__(provider)
+        self.cache = cache or MetadataCache(**kwargs)
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    @contextmanager
+    def _invalidating(self, *paths):
+        # 実行中に他スレッドが古い値を入れ直すことがあるので前後で消す
+        keys = [normpath(x) for x in paths]
+        for key in keys:
+            self._invalidate(key)
+        try:
+            yield keys
+        finally:
+            for key in keys:
+                self._invalidate(key)
+
+    def _invalidate(self, key):
+        self.cache.invalidate(key, recursive=True)
+        self.cache.invalidate(parent_of(key))
+
+    def _lookup(self, key):
+        entry = self.cache.get(key)
+        if entry is None and key:
+            parent = self.cache.get(parent_of(key))
+            if parent is not None and not parent.exists:
+                return parent
+        return entry
+
+    def _store_info(self, key, info):
+        if isinstance(info, dict) and "isdir" in info:
+            self.cache.set(key, True, info=info)
+
+    def exists(self, path):
+        key = normpath(path)
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry.exists
+        result = self.provider.exists(path)
+        self.cache.set(key, result)
+        return result
+
+    def info(self, path):
+        key = normpath(path)
+        entry = self._lookup(key)
+        if entry is not None:
+            # exists() で分かった不在は例外を持たないので、プロバイダーに投げさせる
+            if entry.error is not None:
+                raise entry.error.with_traceback(None)
+            if entry.exists and entry.info is not None:
+                return dict(entry.info)
+        try:
+            info = self.provider.info(path)
+        except NOT_FOUND_ERRORS as e:
+            self.cache.set(key, False, error=e)
+            raise
+        self._store_info(key, info)
+        return dict(info)
+
+    def info_or_none(self, path):
+        try:
+            return self.info(path)
+        except NOT_FOUND_ERRORS:
+            return None
+
+    def type(self, path):
+        key = normpath(path)
+        entry = self._lookup(key)
+        if entry is not None and entry.type is not None:
+            return entry.type
+        result = self.provider.type(path)
+        self.cache.set(key, result != ResourceTypes.NO_EXISTS, type=result)
+        return result
+
+    def isdir(self, path):
+        return self.type(path) == ResourceTypes.DIR
+
+    def delete(self, path):
+        with self._invalidating(path) as (key,):
+            result = self.provider.delete(path)
+        self.cache.set(key, False)
+        return result
+
+    def mkdir(self, path):
+        with self._invalidating(path) as (key,):
+            info = self.provider.mkdir(path)
+        self._store_info(key, info)
+        return info
+
+    def create(self, path, buf):
+        with self._invalidating(path) as (key,):
+            info = self.provider.create(path, buf)
+        self._store_info(key, info)
+        return info
+
+    def put(self, path, buf):
+        with self._invalidating(path) as (key,):
+            info = self.provider.put(path, buf)
+        self._store_info(key, info)
+        return info
+
+    def write_stream(self, path, iterable):
+        with self._invalidating(path) as (key,):
+            info = self.provider.write_stream(path, iterable)
+        self._store_info(key, info)
+        return info
+
+    def upload(self, local_path, remote_path, *args, **kwargs):
+        with self._invalidating(remote_path) as (key,):
+            info = self.provider.upload(local_path, remote_path, *args, **kwargs)
+        self._store_info(key, info)
+        return info
+
+    def move(self, src, dest):
+        with self._invalidating(src, dest) as (key, _):
+            result = self.provider.move(src, dest)
+        self.cache.set(key, False)
+        return result
+
+    def copy(self, src, dest):
+        with self._invalidating(dest):
+            return self.provider.copy(src, dest)
+
+    def rename(self, src, name):
+        key = normpath(src)
+        dest = posixpath.join(parent_of(key), posixpath.basename(normpath(name)))
+        with self._invalidating(src, dest):
+            result = self.provider.rename(src, name)
+        self.cache.set(key, False)
+        return result
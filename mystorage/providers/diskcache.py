@@ -0,0 +1,364 @@
+import hashlib
+import os
+import posixpath
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from mystorage.providers.local import copy_fd, regular_fileno
+from mystorage.streams import DEFAULT_CHUNK_SIZE, iter_stream
+from mystorage.types import Provider, ProviderWrapper, Reader, ResourceTypes
+
+"""
+# Keep file contents on local disk and revalidate them with If-None-Match.
+# The cache directory can be shared by several processes on the same host.
+provider = DiskCachedProvider(
+    WebdavConfig().get_provider(), "~/.cache/mystorage", max_bytes=50 * 1024**3
+)
+"""
+
+DISKCACHE_MAX_BYTES = 1024**3 * 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    etag TEXT,
+    file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    atime REAL NOT NULL,
+    checked REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime);
+"""
+
+
+def normpath(path) -> str:
+    return posixpath.normpath("/" + str(path)).strip("/")
+
+
+def digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+class DiskCacheIndex:
+    """LRU index of cached files. Backed by SQLite so processes can share it."""
+
+    def __init__(self, root: str, max_bytes: int = DISKCACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                os.path.join(self.root, "index.sqlite"),
+                timeout=60,
+                isolation_level=None,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key):
+        row = (
+            self._conn()
+            .execute(
+                "SELECT etag, file, size, checked FROM entries WHERE key = ?", (key,)
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return {"etag": row[0], "file": row[1], "size": row[2], "checked": row[3]}
+
+    def touch(self, key, checked=False):
+        now = time.time()
+        with self._transaction() as conn:
+            if checked:
+                conn.execute(
+                    "UPDATE entries SET atime = ?, checked = ? WHERE key = ?",
+                    (now, now, key),
+                )
+            else:
+                conn.execute("UPDATE entries SET atime = ? WHERE key = ?", (now, key))
+
+    def set(self, key, etag, file, size):
+        now = time.time()
+        with self._transaction() as conn:
+            old = conn.execute("SELECT file FROM entries WHERE key = ?", (key,))
+            old = old.fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, etag, file, size, now, now),
+            )
+            removed = self._evict(conn, keep=key)
+        if old is not None and old[0] != file:
+            removed.append(old[0])
+        self._remove_files(removed)
+
+    def invalidate(self, key, recursive=False):
+        with self._transaction() as conn:
+            sql = "SELECT key, file FROM entries WHERE key = ?"
+            params = [key]
+            if recursive:
+                sql += " OR substr(key, 1, ?) = ?"
+                params += [len(key) + 1, key + "/"] if key else [0, ""]
+            rows = conn.execute(sql, params).fetchall()
+            conn.executemany(
+                "DELETE FROM entries WHERE key = ?", [(x[0],) for x in rows]
+            )
+        self._remove_files([x[1] for x in rows])
+
+    def _evict(self, conn, keep=None):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        removed = []
+        if total <= self.max_bytes:
+            return removed
+        for key, file, size in conn.execute(
+            "SELECT key, file, size FROM entries ORDER BY atime"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            removed.append(file)
+            total -= size
+        return removed
+
+    def _remove_files(self, files):
+        # 他プロセスが開いているファイルも unlink 後に読み切れる
+        for file in files:
+            try:
+                os.remove(os.path.join(self.root, file))
+            except FileNotFoundError:
+                ...
+
+    def stats(self):
+        count, size = (
+            self._conn()
+            .execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries")
+            .fetchone()
+        )
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes}
+
+
+class DiskCachedProvider(ProviderWrapper):
+    """Serves reads from a local content cache, revalidated by ETag.
+
+    With `max_age` > 0 an entry checked less than `max_age` seconds ago is used
+    without contacting the server.
+    """
+
+    def __init__(
+        self,
+        provider: Provider,
+        root: str,
+        max_bytes: int = DISKCACHE_MAX_BYTES,
+        max_age: float = 0,
+    ):
+        super().__init__(provider)
+        self.root = os.path.abspath(os.path.expanduser(root))
+        os.makedirs(os.path.join(self.root, "data"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "locks"), exist_ok=True)
+        self.index = DiskCacheIndex(self.root, max_bytes)
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def cache_stats(self):
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            **self.index.stats(),
+        }
+
+    @contextmanager
+    def _key_lock(self, key):
+        # 同じファイルを複数プロセスが同時に取りに行かないようにする
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        path = os.path.join(self.root, "locks", digest(key)[:2])
+        with open(path, "a") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _open_cached(self, path):
+        """Opens an up-to-date local copy of `path`."""
+        # 開いた後なら他プロセスに削除・追い出しされても読める
+        key = normpath(path)
+        with self._key_lock(key):
+            entry = self.index.get(key)
+            etag = None
+            cached = None
+            if entry is not None:
+                # 存在確認と open の間に追い出されないよう、先に開いてみる
+                try:
+                    cached = open(os.path.join(self.root, entry["file"]), "rb", 0)
+                except FileNotFoundError:
+                    entry = None
+            if cached is not None:
+                if self.max_age and time.time() - entry["checked"] < self.max_age:
+                    self.hits += 1
+                    self.index.touch(key)
+                    return cached
+                etag = entry["etag"]
+
+            try:
+                f, new_etag = self.provider.open_if_modified(path, etag)
+            except BaseException:
+                if cached is not None:
+                    cached.close()
+                raise
+            if f is None:
+                self.revalidated += 1
+                self.index.touch(key, checked=True)
+                return cached
+            if cached is not None:
+                cached.close()
+
+            self.misses += 1
+            return self._store(key, new_etag, f)
+
+    def _store(self, key, etag, f):
+        """Copies `f` into the cache and returns the local copy opened for reading.
+
+        Objects larger than the whole cache are not stored; once `max_bytes` is
+        exceeded the rest of `f` is streamed through instead. Takes ownership of `f`.
+        """
+        name = digest(key)
+        file = f"data/{name[:2]}/{name}-{digest(etag or str(time.time()))[:16]}"
+        abspath = os.path.join(self.root, file)
+        os.makedirs(os.path.dirname(abspath), exist_ok=True)
+        tmp = f"{abspath}.{os.getpid()}.{threading.get_ident()}.tmp"
+        size = 0
+        overflow = None
+        try:
+            chunks = iter_stream(f)
+            with open(tmp, "wb") as out:
+                for chunk in chunks:
+                    if size + len(chunk) > self.index.max_bytes:
+                        overflow = chunk
+                        break
+                    out.write(chunk)
+                    size += len(chunk)
+            if overflow is not None:
+                return self._stream_through(tmp, overflow, chunks, f)
+            os.replace(tmp, abspath)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            f.close()
+            raise
+        f.close()
+        result = open(abspath, "rb", buffering=0)
+        self.index.set(key, etag, file, size)
+        return result
+
+    @staticmethod
+    def _stream_through(tmp, overflow, chunks, f):
+        # 読み終えた先頭部分は開いたまま消し、残りはサーバーから直接読む
+        from itertools import chain
+
+        from mystorage.streams import open_iter_reader
+
+        head = open(tmp, "rb")
+        os.remove(tmp)
+
+        def close():
+            head.close()
+            f.close()
+
+        return open_iter_reader(chain(iter_stream(head), [overflow], chunks), close)
+
+    def open(self, path, mode="rb", encoding=None):
+        from mystorage.streams import wrap_mode
+
+        if mode in {"w", "wb"}:
+            return super().open(path, mode, encoding)
+        if mode not in {"r", "rb"}:
+            raise ValueError(f"Unsupported mode: {mode}")
+        return wrap_mode(self._open_cached(path), mode, encoding)
+
+    def read(self, path, buf):
+        with self.open(path) as f:
+            shutil.copyfileobj(f, buf)
+        return buf
+
+    def read_bytes(self, path):
+        with self.open(path) as f:
+            return f.read()
+
+    def read_text(self, path, encoding=None):
+        return Reader.read_text(self, path, encoding)
+
+    def read_json(self, path):
+        return Reader.read_json(self, path)
+
+    def iter_chunks(self, path, chunk_size=None):
+        with self.open(path) as f:
+            yield from iter_stream(f, chunk_size or DEFAULT_CHUNK_SIZE)
+
+    def download(self, remote_path, local_path, *args, **kwargs):
+        if self.provider.type(remote_path) == ResourceTypes.DIR:
+            return self.provider.download(remote_path, local_path, *args, **kwargs)
+        os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+        with self._open_cached(remote_path) as src, open(local_path, "wb") as dest:
+            fd = regular_fileno(src)
+            if fd is None:
+                shutil.copyfileobj(src, dest, DEFAULT_CHUNK_SIZE)
+            else:
+                copy_fd(fd, dest.fileno(), os.fstat(fd).st_size)
+
+    # 書き込みは通過させ、キャッシュを捨てる
+    def _invalidating(self, paths, func, *args):
+        try:
+            return func(*args)
+        finally:
+            for path in paths:
+                self.index.invalidate(normpath(path), recursive=True)
+
+    def delete(self, path):
+        return self._invalidating([path], self.provider.delete, path)
+
+    def create(self, path, buf):
+        return self._invalidating([path], self.provider.create, path, buf)
+
+    def put(self, path, buf):
+        return self._invalidating([path], self.provider.put, path, buf)
+
+    def write_stream(self, path, iterable):
+        return self._invalidating([path], self.provider.write_stream, path, iterable)
+
+    def move(self, src, dest):
+        return self._invalidating([src, dest], self.provider.move, src, dest)
+
+    def copy(self, src, dest):
+        return self._invalidating([dest], self.provider.copy, src, dest)
+
+    def rename(self, src, name):
+        dest = posixpath.join(posixpath.dirname(normpath(src)), str(name))
+        return self._invalidating([src, dest], self.provider.rename, src, name)
@@ -1,6 +1,175 @@
+import posixpath
+from typing import Dict, Iterable, List, Optional
+
+from mystorage.batch import normpath
+from mystorage.exceptions import NOT_FOUND_ERRORS, FileNotFound
+from mystorage.gitignore import GITIGNORE_DEFAULT, IgnoreMatcher
+from mystorage.types import Provider, ProviderWrapper, Reader, ResourceTypes
+from mystorage.walk import entry_name, join
+
+"""
+# Hides what the .gitignore files of a work tree ignore. Ignored directories are
+# dropped from listings, so walk() never lists them and sync() never uploads them.
+src = GitIgnoreStorage(LocalConfig(root="~/myproject").get_provider())
+sync(src, "", WebdavConfig().get_provider(), "backup/myproject")
+"""
+
+
 class GitStorage:
     ...
 
 
-class GitIgnoreStorage:
-    ...
+class GitIgnoreStorage(ProviderWrapper):
+    """`root` is the work tree in `provider`; paths outside it are not filtered.
+
+    .gitignore files are read once, when their directory is first listed or
+    looked up. Call `reload()` after editing them.
+    """
+
+    def __init__(
+        self,
+        provider: Provider,
+        root: str = "",
+        patterns: Iterable[str] = GITIGNORE_DEFAULT,
+        ignore_file: str = ".gitignore",
+    ):
+        super().__init__(provider)
+        self.root = normpath(root)
+        self.patterns = tuple(patterns)
+        self.ignore_file = ignore_file
+        self.reload()
+
+    def reload(self):
+        self.matcher = IgnoreMatcher(self.patterns)
+        self._dirs: Dict[str, bool] = {}  # ディレクトリ -> 無視されているか
+
+    def _rel(self, path) -> Optional[str]:
+        path = normpath(path)
+        if not self.root or path == self.root:
+            return path[len(self.root) :]
+        if path.startswith(self.root + "/"):
+            return path[len(self.root) + 1 :]
+        return None
+
+    def _load(self, rel: str, names: Iterable[str] = None):
+        if self.matcher.loaded(rel):
+            return
+        text = None
+        # 一覧があれば .gitignore の有無が分かるので、無ければ読みに行かない
+        if names is None or self.ignore_file in names:
+            path = join(join(self.root, rel), self.ignore_file)
+            try:
+                text = self.provider.read_text(path)
+            except NOT_FOUND_ERRORS:
+                ...
+        self.matcher.add(rel, text)
+
+    def _ignored(self, rel: str, isdir: bool) -> bool:
+        if not rel:
+            return False
+        parent = posixpath.dirname(rel)
+        if self._ignored_dir(parent):
+            return True
+        self._load(parent)
+        return self.matcher.match(rel, isdir)
+
+    def _ignored_dir(self, rel: str) -> bool:
+        ignored = self._dirs.get(rel)
+        if ignored is None:
+            ignored = self._dirs[rel] = self._ignored(rel, True)
+        return ignored
+
+    def is_ignored(self, path, isdir: bool = False) -> bool:
+        rel = self._rel(path)
+        return rel is not None and self._ignored(rel, isdir)
+
+    def _check_file(self, path):
+        if self.is_ignored(path):
+            raise FileNotFound(f"Ignored: {path}")
+
+    def type(self, path) -> ResourceTypes:
+        type = self.provider.type(path)
+        if type != ResourceTypes.NO_EXISTS and self.is_ignored(
+            path, type == ResourceTypes.DIR
+        ):
+            return ResourceTypes.NO_EXISTS
+        return type
+
+    def exists(self, path) -> bool:
+        return self.type(path) != ResourceTypes.NO_EXISTS
+
+    def isdir(self, path) -> bool:
+        return self.type(path) == ResourceTypes.DIR
+
+    def info(self, path):
+        info = self.provider.info(path)
+        if self.is_ignored(path, info["isdir"] == ResourceTypes.DIR):
+            raise FileNotFound(f"Ignored: {path}")
+        return info
+
+    def ll(self, path):
+        rel = self._rel(path)
+        if rel is None:
+            return self.provider.ll(path)
+        if rel and self._ignored_dir(rel):
+            raise FileNotFound(f"Ignored: {path}")
+        infos = self.provider.ll(path)
+        self._load(rel, [entry_name(x) for x in infos])
+        result = []
+        for info in infos:
+            child = join(rel, entry_name(info))
+            isdir = info["isdir"] == ResourceTypes.DIR
+            ignored = self.matcher.match(child, isdir)
+            if isdir:
+                self._dirs[child] = ignored
+            if not ignored:
+                result.append(info)
+        return result
+
+    def ll_files(self, path):
+        return [x for x in self.ll(path) if x["isdir"] != ResourceTypes.DIR]
+
+    def ll_dirs(self, path):
+        return [x for x in self.ll(path) if x["isdir"] == ResourceTypes.DIR]
+
+    def ls(self, path) -> List[str]:
+        return [entry_name(x) for x in self.ll(path)]
+
+    def ls_files(self, path) -> List[str]:
+        return [entry_name(x) for x in self.ll_files(path)]
+
+    def ls_dirs(self, path) -> List[str]:
+        return [entry_name(x) for x in self.ll_dirs(path)]
+
+    def iter_ll(self, path, props=None):
+        # 判定に name と isdir が要るので射影せずに絞り込む
+        return iter(self.ll(path))
+
+    def walk(self, path="", max_workers=None, max_depth=None, detail=False):
+        # self.ll で一覧するので無視されたディレクトリには降りない
+        return Reader.walk(self, path, max_workers, max_depth, detail)
+
+    def read(self, path, buf):
+        self._check_file(path)
+        return self.provider.read(path, buf)
+
+    def open(self, path, mode="rb", encoding=None):
+        if mode not in {"w", "wb"}:
+            self._check_file(path)
+        return super().open(path, mode, encoding)
+
+    def iter_chunks(self, path, chunk_size=None):
+        self._check_file(path)
+        return self.provider.iter_chunks(path, chunk_size)
+
+    def read_bytes(self, path):
+        self._check_file(path)
+        return self.provider.read_bytes(path)
+
+    def read_text(self, path, encoding=None):
+        self._check_file(path)
+        return self.provider.read_text(path, encoding)
+
+    def read_json(self, path):
+        self._check_file(path)
+        return self.provider.read_json(path)
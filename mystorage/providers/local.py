@@ -0,0 +1,360 @@
+import io
+import mimetypes
+import mmap
+import os
+import shutil
+import stat
+import threading
+from datetime import datetime, timezone
+
+from pydantic import BaseModel
+
+from mystorage.exceptions import FileNotFound, StorageException
+from mystorage.types import LocalStorageBase, ProviderFactory, ResourceTypes
+
+COPY_CHUNK_SIZE = 1024 * 1024 * 8
+
+
+class LocalConfig(BaseModel, ProviderFactory):
+    root: str = "."
+
+    def get_native_provider(self):
+        return os.path.abspath(self.root)
+
+    def get_provider(self):
+        root = self.get_native_provider()
+        provider = LocalProvider(root)
+        return provider
+
+
+def regular_fileno(buf):
+    """fileno of a plain regular file, otherwise None.
+
+    Pipes, sockets and wrappers such as GzipFile must be copied through read/write.
+    """
+    raw = buf
+    if isinstance(buf, (io.BufferedReader, io.BufferedWriter, io.BufferedRandom)):
+        raw = buf.raw
+    if not isinstance(raw, io.FileIO) or raw.closed:
+        return None
+    fd = raw.fileno()
+    if not stat.S_ISREG(os.fstat(fd).st_mode):
+        return None
+    return fd
+
+
+def copy_fd(src_fd: int, dest_fd: int, count: int) -> int:
+    # カーネル内でコピーする。copy_file_range -> sendfile -> read/write の順に試す
+    copied = 0
+    copy_file_range = getattr(os, "copy_file_range", None)
+    while copy_file_range and copied < count:
+        try:
+            n = copy_file_range(src_fd, dest_fd, min(count - copied, COPY_CHUNK_SIZE))
+        except OSError:
+            break
+        if n == 0:
+            return copied
+        copied += n
+
+    sendfile = getattr(os, "sendfile", None)
+    while sendfile and copied < count:
+        try:
+            n = sendfile(dest_fd, src_fd, None, min(count - copied, COPY_CHUNK_SIZE))
+        except OSError:
+            break
+        if n == 0:
+            return copied
+        copied += n
+
+    while copied < count:
+        chunk = os.read(src_fd, min(count - copied, COPY_CHUNK_SIZE))
+        if not chunk:
+            break
+        view = memoryview(chunk)
+        while view:
+            n = os.write(dest_fd, view)
+            view = view[n:]
+        copied += len(chunk)
+
+    return copied
+
+
+def copyfile(src, dest, *, follow_symlinks=True):
+    with open(src, "rb") as fsrc, open(dest, "wb") as fdest:
+        size = os.fstat(fsrc.fileno()).st_size
+        copy_fd(fsrc.fileno(), fdest.fileno(), size)
+    shutil.copystat(src, dest, follow_symlinks=follow_symlinks)
+    return dest
+
+
+def strftime(timestamp: float):
+    return str(datetime.fromtimestamp(timestamp, timezone.utc).replace(microsecond=0))
+
+
+class LocalProvider(LocalStorageBase):
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def abspath(self, path):
+        path = os.path.normpath(os.path.join(self.root, str(path).lstrip("/")))
+        try:
+            inside = os.path.commonpath([self.root, path]) == self.root
+        except ValueError:  # Windows の別ドライブ
+            inside = False
+        if not inside:
+            raise StorageException("Path is outside of root.")
+        return path
+
+    @staticmethod
+    def convert_info(path: str, name: str, st: os.stat_result):
+        is_dir = stat.S_ISDIR(st.st_mode)
+        return {
+            "created": strftime(st.st_ctime),
+            "modified": strftime(st.st_mtime),
+            "name": name,
+            "size": 0 if is_dir else st.st_size,
+            "etag": f'"{st.st_mtime_ns:x}-{st.st_size:x}"',
+            "content_type": "" if is_dir else (mimetypes.guess_type(name)[0] or ""),
+            "isdir": ResourceTypes.DIR if is_dir else ResourceTypes.FILE,
+            "path": path,
+        }
+
+    def login(self):
+        return True
+
+    def free(self):
+        return shutil.disk_usage(self.root).free
+
+    def info(self, path):
+        abspath = self.abspath(path)
+        try:
+            st = os.stat(abspath)
+        except FileNotFoundError:
+            raise FileNotFound(path)
+        return self.convert_info(abspath, os.path.basename(abspath), st)
+
+    def info_or_none(self, path):
+        if self.exists(path):
+            return self.info(path)
+        else:
+            return None
+
+    def exists(self, path):
+        return os.path.exists(self.abspath(path))
+
+    def type(self, path):
+        try:
+            st = os.stat(self.abspath(path))
+        except FileNotFoundError:
+            return ResourceTypes.NO_EXISTS
+        if stat.S_ISDIR(st.st_mode):
+            return ResourceTypes.DIR
+        else:
+            return ResourceTypes.FILE
+
+    def isdir(self, path):
+        return os.path.isdir(self.abspath(path))
+
+    def delete(self, path):
+        abspath = self.abspath(path)
+        if abspath == self.root:
+            raise StorageException("Can not delete root.")
+        if os.path.isdir(abspath) and not os.path.islink(abspath):
+            shutil.rmtree(abspath)
+        elif os.path.lexists(abspath):
+            os.remove(abspath)
+        else:
+            raise FileNotFound(path)
+
+    def mkdir(self, path):
+        abspath = self.abspath(path)
+        try:
+            os.mkdir(abspath)
+        except FileExistsError:
+            if not os.path.isdir(abspath):
+                raise StorageException("Resource already exists.")
+        return self.info(path)
+
+    def put(self, path, buf):
+        return self._create_or_put("put", path, buf)
+
+    def create(self, path, buf):
+        return self._create_or_put("create", path, buf)
+
+    def _create_or_put(self, action, path, buf):
+        abspath = self.abspath(path)
+        if action == "create":
+            mode = "xb"
+        elif action == "put":
+            if os.path.isdir(abspath):
+                raise StorageException("PUT is not allowed on non-files.")
+            mode = "wb"
+        else:
+            raise Exception()
+
+        try:
+            f = open(abspath, mode)
+        except FileExistsError:
+            raise StorageException("Resource already exists.")
+        except FileNotFoundError:
+            raise FileNotFound(os.path.dirname(path))
+
+        with f:
+            src_fd = regular_fileno(buf)
+            if src_fd is None:
+                shutil.copyfileobj(buf, f, COPY_CHUNK_SIZE)
+            else:
+                pos = buf.tell()
+                os.lseek(src_fd, pos, os.SEEK_SET)
+                size = os.fstat(src_fd).st_size - pos
+                copied = copy_fd(src_fd, f.fileno(), size)
+                buf.seek(pos + copied)
+
+        return self.info(path)
+
+    def _open_reader(self, path):
+        abspath = self.abspath(path)
+        try:
+            return open(abspath, "rb")
+        except FileNotFoundError:
+            raise FileNotFound(path)
+        except IsADirectoryError:
+            raise StorageException("READ is not allowed on non-files.")
+
+    def _open_writer(self, path):
+        abspath = self.abspath(path)
+        try:
+            return open(abspath, "wb")
+        except FileNotFoundError:
+            raise FileNotFound(os.path.dirname(path))
+        except IsADirectoryError:
+            raise StorageException("PUT is not allowed on non-files.")
+
+    def write_stream(self, path, iterable):
+        # 途中で失敗しても既存のファイルを壊さないよう、書き終えてから置き換える
+        abspath = self.abspath(path)
+        if os.path.isdir(abspath):
+            raise StorageException("PUT is not allowed on non-files.")
+        dirname, name = os.path.split(abspath)
+        tmp = os.path.join(
+            dirname, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            f = open(tmp, "wb")
+        except FileNotFoundError:
+            raise FileNotFound(os.path.dirname(path))
+        try:
+            with f:
+                for chunk in iterable:
+                    f.write(chunk)
+            os.replace(tmp, abspath)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return self.info(path)
+
+    def read(self, path, buf):
+        with self._open_reader(path) as f:
+            size = os.fstat(f.fileno()).st_size
+            dest_fd = regular_fileno(buf)
+            if dest_fd is not None:
+                buf.flush()
+                pos = buf.tell()
+                os.lseek(dest_fd, pos, os.SEEK_SET)
+                copied = copy_fd(f.fileno(), dest_fd, size)
+                buf.seek(pos + copied)
+            elif size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                    buf.write(m)
+        return buf
+
+    def read_bytes(self, path):
+        with self._open_reader(path) as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                return m[:]
+
+    def _scandir(self, path):
+        abspath = self.abspath(path)
+        try:
+            it = os.scandir(abspath)
+        except FileNotFoundError:
+            raise FileNotFound(path)
+        return it
+
+    def ll(self, path):
+        convert = self.convert_info
+        with self._scandir(path) as it:
+            return [convert(x.path, x.name, x.stat()) for x in it]
+
+    def ls(self, path):
+        with self._scandir(path) as it:
+            return [x.name for x in it]
+
+    def ls_files(self, path):
+        with self._scandir(path) as it:
+            return [x.name for x in it if not x.is_dir()]
+
+    def ls_dirs(self, path):
+        with self._scandir(path) as it:
+            return [x.name for x in it if x.is_dir()]
+
+    def ll_files(self, path):
+        type = ResourceTypes.FILE
+        return [x for x in self.ll(path) if x["isdir"] == type]
+
+    def ll_dirs(self, path):
+        type = ResourceTypes.DIR
+        return [x for x in self.ll(path) if x["isdir"] == type]
+
+    def move(self, src, dest):
+        abssrc = self.abspath(src)
+        absdest = self.abspath(dest)
+        if not os.path.lexists(abssrc):
+            raise StorageException("Src not found.")
+        if os.path.lexists(absdest):
+            raise StorageException("Dest already exists.")
+        shutil.move(abssrc, absdest, copy_function=copyfile)
+
+    def copy(self, src, dest):
+        abssrc = self.abspath(src)
+        absdest = self.abspath(dest)
+        if not os.path.lexists(abssrc):
+            raise StorageException("Src not found.")
+        if os.path.isdir(abssrc):
+            shutil.copytree(abssrc, absdest, copy_function=copyfile)
+        else:
+            copyfile(abssrc, absdest)
+        return self.info(dest)
+
+    def rename(self, src, name):
+        if not self.exists(src):
+            raise StorageException("Src not found.")
+        parent = os.path.dirname(str(src).rstrip("/"))
+        dest = os.path.join(parent, os.path.basename(str(name).rstrip("/")))
+        return self.move(src, dest)
+
+    def download(self, remote_path, local_path):
+        src = self.abspath(remote_path)
+        if not os.path.lexists(src):
+            raise FileNotFound(remote_path)
+        if os.path.isdir(src):
+            shutil.copytree(src, local_path, copy_function=copyfile, dirs_exist_ok=True)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+            copyfile(src, local_path)
+
+    def upload(self, local_path, remote_path):
+        dest = self.abspath(remote_path)
+        if not os.path.lexists(local_path):
+            raise FileNotFound(local_path)
+        if os.path.isdir(local_path):
+            shutil.copytree(
+                local_path, dest, copy_function=copyfile, dirs_exist_ok=True
+            )
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            copyfile(local_path, dest)
+        return self.info(remote_path)
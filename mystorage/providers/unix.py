@@ -1,8 +1,12 @@
-import glob
 import os
 import tempfile
+import threading
 import uuid
-from typing import Iterable
+from array import array
+from fnmatch import fnmatch
+from typing import Iterable, Iterator, List
+
+TEMPNAME_SHARDS = 256
 
 """
 # create a temporary directory, which is cleaned up when you go out of scope
@@ -11,7 +15,10 @@ With TempDir() as dir:
   with open(file_1, "w") as f:
     f.write("")
 
-  dir.ls()
+  dir.ls()  # list; dir.iter_ls() streams through os.scandir
+
+# names come from a counter and are spread over TEMPNAME_SHARDS subdirectories:
+# <dir>/<shard>/<pool id>-<counter><suffix>
 
 # for permanently al directory. Created files and directories are not deleted.
 With RealDir("your_dir", ignore_exists=True) as dir:
@@ -44,9 +51,30 @@ class Dir:
     def next(self, suffix=""):
         raise NotImplementedError()
 
-    def ls(self, filter="*"):
-        path = os.path.join(self.dirname, "*")
-        return glob.glob(path)
+    def _is_shard(self, name: str) -> bool:
+        return len(name) == 2 and all(c in "0123456789abcdef" for c in name)
+
+    def ls(self, filter="*") -> List[str]:
+        return list(self.iter_ls(filter))
+
+    def iter_ls(self, filter="*") -> Iterator[str]:
+        """Yields the entries under dirname, looking inside the shard directories.
+
+        Like glob, names starting with "." are skipped.
+        """
+        with os.scandir(self.dirname) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if self._is_shard(entry.name) and entry.is_dir(follow_symlinks=False):
+                    with os.scandir(entry.path) as children:
+                        for child in children:
+                            if not child.name.startswith(".") and fnmatch(
+                                child.name, filter
+                            ):
+                                yield child.path
+                elif fnmatch(entry.name, filter):
+                    yield entry.path
 
     def touch(self, suffix=""):
         filename = self.next(suffix)
@@ -56,33 +84,87 @@ class Dir:
 
 
 class InfinityTempNames(Dir):
-    def __init__(self):
-        self._published: set
-        self._tmpdir: str
+    """Issues unique file names without touching the file system.
+
+    Names are `<pool id>-<counter>`, so nothing is checked per name and only the
+    index of its suffix is remembered; `names` regenerates them from the counter.
+    """
+
+    def __init__(self, shards: int = TEMPNAME_SHARDS):
+        self._shards = shards
+        self._width = max(2, len(f"{shards - 1:x}"))
+        self._issued: int
+        self._lock = threading.Lock()
+        self._prefix: str
+        self._suffixes: list
+        self._suffix_ids: dict
+        self._kinds: array
+        self._created: bytearray
+        self._tmpdir: tempfile.TemporaryDirectory
         self._dirname: str
 
+    def _start(self, dirname):
+        self._dirname = dirname
+        self._issued = 0
+        # 他のプール・プロセスが同じディレクトリを使っても衝突しない
+        self._prefix = uuid.uuid4().hex[:12] + "-"
+        # suffix は種類ごとに 1 度だけ持ち、名前ごとにはその番号 (2 バイト) を記録する
+        self._suffixes = [""]
+        self._suffix_ids = {"": 0}
+        self._kinds = array("H")
+        self._created = bytearray(self._shards)
+
+    def _stop(self):
+        del self._issued
+        del self._prefix
+        del self._suffixes
+        del self._suffix_ids
+        del self._kinds
+        del self._created
+        del self._dirname
+
     def __enter__(self):
-        self._published = set()
         self._tmpdir = tempfile.TemporaryDirectory()
-        self._dirname = self._tmpdir.__enter__()
+        self._start(self._tmpdir.__enter__())
         return self
 
     def __exit__(self, *args, **kwargs):
         tmpdir = self._tmpdir
         tmpdir.__exit__(*args, **kwargs)
         del self._tmpdir
-        del self._published
-        del self._dirname
+        self._stop()
+
+    def _shard(self, number: int) -> int:
+        # 連番を散らす (Knuth の乗算ハッシュ)
+        return ((number * 2654435761) & 0xFFFFFFFF) % self._shards
+
+    def _is_shard(self, name: str) -> bool:
+        return len(name) == self._width and all(c in "0123456789abcdef" for c in name)
+
+    def _shard_dir(self, shard: int) -> str:
+        return f"{self._dirname}/{shard:0{self._width}x}"
+
+    def _name(self, number: int, suffix="") -> str:
+        shard_dir = self._shard_dir(self._shard(number))
+        return f"{shard_dir}/{self._prefix}{number:x}{suffix}"
 
     def __next__(self, suffix="") -> str:
         suffix = suffix or ""
-        while True:
-            filename = self._dirname + "/" + str(uuid.uuid4()) + suffix
-            if (not os.path.exists(filename)) and filename not in self._published:
-                break
-
-        self._published.add(filename)
-        return filename
+        with self._lock:
+            kind = self._suffix_ids.get(suffix)
+            if kind is None:
+                if len(self._suffixes) > 0xFFFF:
+                    raise ValueError("Too many distinct suffixes.")
+                kind = self._suffix_ids[suffix] = len(self._suffixes)
+                self._suffixes.append(suffix)
+            number = self._issued
+            self._issued += 1
+            self._kinds.append(kind)
+        shard = self._shard(number)
+        if not self._created[shard]:
+            os.makedirs(self._shard_dir(shard), exist_ok=True)
+            self._created[shard] = 1
+        return self._name(number, suffix)
 
     def __iter__(self):
         while True:
@@ -95,13 +177,22 @@ class InfinityTempNames(Dir):
     def dirname(self):
         return self._dirname
 
+    @property
+    def issued(self) -> int:
+        return self._issued
+
     @property
     def names(self):
-        return self._published.__iter__()
+        suffixes, kinds = self._suffixes, self._kinds
+        for i in range(self._issued):
+            yield self._name(i, suffixes[kinds[i]])
 
 
 class RealDir(InfinityTempNames):
-    def __init__(self, dirname, ignore_exists: bool = False):
+    def __init__(
+        self, dirname, ignore_exists: bool = False, shards: int = TEMPNAME_SHARDS
+    ):
+        super().__init__(shards)
         self._tmpdirname = dirname
         self._ignore_exists = ignore_exists
 
@@ -114,14 +205,10 @@ class RealDir(InfinityTempNames):
             raise RuntimeError("Must be directory.")
 
     def __enter__(self):
-        self._dirname = self._tmpdirname
-        self._published = set()
-
-        if not os.path.exists(self._dirname):
-            os.mkdir(self._dirname)
-
+        if not os.path.exists(self._tmpdirname):
+            os.mkdir(self._tmpdirname)
+        self._start(self._tmpdirname)
         return self
 
     def __exit__(self, *args, **kwargs):
-        del self._published
-        del self._dirname
+        self._stop()
@@ -1,12 +1,33 @@
 import os
-from datetime import datetime, timedelta, timezone
-
-from pydantic import BaseModel
+import posixpath
+import socket
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from urllib.parse import unquote, urlsplit
+
+from pydantic import BaseModel, PrivateAttr
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
 from webdav3.client import Client as Webdav3Client
-from webdav3.exceptions import RemoteResourceNotFound, ResponseErrorCode
+from webdav3.exceptions import (
+    MethodNotSupported,
+    RemoteResourceNotFound,
+    ResponseErrorCode,
+)
 
+from mystorage.concurrency import THROTTLE_STATUSES, AdaptiveLimiter, RetryPolicy
 from mystorage.exceptions import StorageException
+from mystorage.listing import Listing, format_http_date, parse_http_date, to_size
+from mystorage.metrics import count_response, record_retry
 from mystorage.types import Provider, ProviderFactory, ResourceTypes
+from mystorage.walk import entry_name, join, walk_tree
+
+# この大きさ以上の本文を送るリクエストは latency を混雑判定に使わない
+LATENCY_BODY_LIMIT = 64 * 1024
+# max_depth がこれ以下の walk は Depth: 1 で階層ごとに一覧する (木全体を取らない)
+DEPTH_INFINITY_MIN_DEPTH = 3
 
 # https://github.com/ezhov-evgeny/webdav-client-python-3
 # PUT DELETE MKCOL COPY MOVE
@@ -23,6 +44,16 @@ class WebdavConfig(BaseModel, ProviderFactory):
     verify: bool = False  # To not check SSL certificates (Default = True)
     base_path: str = "remote.php/dav/files"
     webdav_root: str = "/"
+    pool_connections: int = 10  # number of hosts to keep pools for
+    pool_maxsize: int = 10  # max connections per host
+    pool_block: bool = False  # True: wait for a free connection instead of opening more
+    tcp_keepalive: bool = True
+    max_concurrency: int = 64  # upper bound of the adaptive request limit (0: no limit)
+    initial_concurrency: int = 8
+    throttle_retries: int = 5  # retries of idempotent requests answered with 429/503
+
+    _pool = PrivateAttr(None)
+    _pool_lock = PrivateAttr(default_factory=threading.Lock)
 
     def get_url(self):
         return f"{self.protocol}://{self.host}:{self.port}/{self.base_path}/{self.user}"
@@ -40,21 +71,281 @@ class WebdavConfig(BaseModel, ProviderFactory):
         client.verify = self.verify  # To not check SSL certificates (Default = True)
         return client
 
+    def get_pool(self) -> "WebdavClientPool":
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = WebdavClientPool(self)
+            return self._pool
+
     def get_provider(self):
-        client = self.get_native_provider()
-        provider = WebdavProvider(client)
+        pool = self.get_pool()
+        provider = WebdavProvider(pool=pool)
         return provider
 
+    def get_async_provider(self):
+        # requires httpx
+        from mystorage.providers.aiowebdav import AsyncWebdavProvider
+
+        return AsyncWebdavProvider.from_config(self)
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """Also applies the pool's adaptive concurrency limit and retries throttled requests."""
+
+    def __init__(
+        self,
+        tcp_keepalive=True,
+        limiter: AdaptiveLimiter = None,
+        retry: RetryPolicy = None,
+        **kwargs,
+    ):
+        self.tcp_keepalive = tcp_keepalive
+        self.limiter = limiter
+        self.retry = retry
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if self.limiter is None and self.retry is None:
+            return super().send(request, **kwargs)
+        # ストリームやファイルの本文は送り直せない
+        body = request.body
+        replayable = body is None or isinstance(body, (bytes, str))
+        attempt = 0
+        while True:
+            response = self._send_limited(request, body, **kwargs)
+            if not (
+                replayable
+                and self.retry is not None
+                and self.retry.should_retry(
+                    request.method, response.status_code, attempt
+                )
+            ):
+                return response
+            delay = self.retry.delay(attempt, response.headers.get("Retry-After"))
+            response.content  # コネクションをプールに戻す
+            response.close()
+            record_retry()
+            time.sleep(delay)
+            attempt += 1
+
+    def _send_limited(self, request, body, **kwargs):
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+        with self.limiter.slot() as slot:
+            # 大きな本文の送信時間は混雑の指標にならない
+            slot.measure = body is None or (
+                isinstance(body, (bytes, str)) and len(body) < LATENCY_BODY_LIMIT
+            )
+            response = super().send(request, **kwargs)
+            slot.throttled = response.status_code in THROTTLE_STATUSES
+        return response
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.tcp_keepalive:
+            kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+_streaming = threading.local()
+
+
+def release_response(response, *args, **kwargs):
+    # webdav3 は stream=True でリクエストするため、本文を読まないとコネクションがプールに戻らない
+    # ダウンロード以外（とエラー）はここで読み切る。webdav3 が例外を投げる前に呼ばれる
+    if response.status_code < 300:
+        if response.request.method == "GET" or getattr(_streaming, "active", False):
+            return response
+    response.content
+    return response
+
+
+@contextmanager
+def streaming_response():
+    """Leaves the body of successful responses unread (e.g. a PROPFIND parsed on the fly)."""
+    _streaming.active = True
+    try:
+        yield
+    finally:
+        _streaming.active = False
+
+
+# iter_ll の props 名と DAV プロパティの対応
+PROPFIND_PROPS = {
+    "created": "creationdate",
+    "name": "displayname",
+    "size": "getcontentlength",
+    "modified": "getlastmodified",
+    "etag": "getetag",
+    "content_type": "getcontenttype",
+}
+
+
+def propfind_body(props) -> bytes:
+    names = ["resourcetype"]
+    for key in props:
+        if key not in PROPFIND_PROPS:
+            raise StorageException(f"Unknown prop: {key}")
+        names.append(PROPFIND_PROPS[key])
+    prop = "".join(f"<d:{x}/>" for x in names)
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        f'<d:propfind xmlns:d="DAV:"><d:prop>{prop}</d:prop></d:propfind>'
+    ).encode()
+
+
+PROP_KEYS = {f"{{DAV:}}{name}": key for key, name in PROPFIND_PROPS.items()}
+
+
+def parse_response(elem):
+    """Reads one <d:response> in a single pass over its children."""
+    href = None
+    info = dict.fromkeys(PROPFIND_PROPS)
+    info["isdir"] = False
+    for child in elem:
+        if child.tag == "{DAV:}href":
+            href = child.text
+        elif child.tag == "{DAV:}propstat":
+            prop, ok = None, True
+            for x in child:
+                if x.tag == "{DAV:}prop":
+                    prop = x
+                elif x.tag == "{DAV:}status" and x.text:
+                    # 未知のプロパティは 404 の propstat に空要素で返ってくる
+                    ok = " 200 " in f"{x.text} "
+            if prop is None or not ok:
+                continue
+            for x in prop:
+                key = PROP_KEYS.get(x.tag)
+                if key is not None:
+                    if x.text:
+                        info[key] = x.text
+                elif x.tag == "{DAV:}resourcetype":
+                    if any(r.tag == "{DAV:}collection" for r in x):
+                        info["isdir"] = True
+    if href is None:
+        return None
+    info["path"] = unquote(urlsplit(href).path)
+    return info
+
+
+def iter_multistatus(chunks):
+    """Parses a multistatus body incrementally, yielding webdav3-style info dicts."""
+    from xml.etree.ElementTree import XMLPullParser
+
+    # end イベントは要素ごとに Python 側へ渡って遅いので start だけ受け取る。
+    # 要素は start の時点で親に追加されるため、root 直下の最後以外の子は閉じている
+    parser = XMLPullParser(("start",))
+    root = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, elem in parser.read_events():
+            if root is None:
+                root = elem
+        if root is None or len(root) < 2:
+            continue
+        done = root[:-1]
+        # 処理済みの要素を捨ててメモリを一定に保つ
+        del root[:-1]
+        for elem in done:
+            if elem.tag == "{DAV:}response":
+                info = parse_response(elem)
+                if info is not None:
+                    yield info
+    parser.close()
+    for elem in [] if root is None else list(root):
+        if elem.tag == "{DAV:}response":
+            info = parse_response(elem)
+            if info is not None:
+                yield info
+
+
+def walk_as_dicts(walk):
+    # 一覧はまとめて Listing で持ち、返すディレクトリの分だけ dict にする
+    for dirpath, dirs, files in walk:
+        # 呼び出し側が dirs を削って降りる先を絞れるよう、同じリストを書き換える
+        dirs[:] = [dict(x) for x in dirs]
+        files[:] = [dict(x) for x in files]
+        yield dirpath, dirs, files
+
+
+def rejects_chunking(error) -> bool:
+    """Whether the server lacks the uploads collection (404/405/501)."""
+    if isinstance(error, (MethodNotSupported, RemoteResourceNotFound)):
+        return True
+    return isinstance(error, ResponseErrorCode) and error.code == 501
+
+
+def rejects_depth_infinity(error: ResponseErrorCode) -> bool:
+    """Whether PROPFIND failed because the server refuses Depth: infinity (RFC 4918 9.1)."""
+    message = error.message or b""
+    if isinstance(message, str):
+        message = message.encode()
+    return error.code in {403, 501} or b"propfind-finite-depth" in message
+
+
+class WebdavClientPool:
+    """Hands out one Webdav3Client per thread; all of them share one connection pool."""
+
+    def __init__(self, config: WebdavConfig):
+        self.config = config
+        self.limiter = None
+        if config.max_concurrency:
+            self.limiter = AdaptiveLimiter(
+                config.initial_concurrency, max_limit=config.max_concurrency
+            )
+        retry = (
+            RetryPolicy(config.throttle_retries) if config.throttle_retries else None
+        )
+        self.adapter = KeepAliveAdapter(
+            tcp_keepalive=config.tcp_keepalive,
+            limiter=self.limiter,
+            retry=retry,
+            pool_connections=config.pool_connections,
+            pool_maxsize=config.pool_maxsize,
+            pool_block=config.pool_block,
+        )
+        self._local = threading.local()
+        self._clients = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def client(self) -> Webdav3Client:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self.config.get_native_provider()
+            client.session.mount("http://", self.adapter)
+            client.session.mount("https://", self.adapter)
+            client.session.hooks["response"].append(count_response)
+            client.session.hooks["response"].append(release_response)
+            self._local.client = client
+            with self._lock:
+                self._clients.add(client)
+        return client
+
+    def stats(self):
+        pools = self.adapter.poolmanager.pools
+        connections = requests = idle = 0
+        with pools.lock:
+            hosts = [pools[key] for key in pools.keys()]
+        for pool in hosts:
+            connections += pool.num_connections
+            requests += pool.num_requests
+            idle += sum(1 for x in list(pool.pool.queue) if x is not None)
+        with self._lock:
+            clients = len(self._clients)
+        return {
+            "clients": clients,
+            "hosts": len(hosts),
+            "connections": connections,
+            "idle": idle,
+            "requests": requests,
+            "max_connections_per_host": self.config.pool_maxsize,
+            "limiter": None if self.limiter is None else self.limiter.stats(),
+        }
 
-class FileInfo(BaseModel):
-    created: datetime
-    modified: datetime
-    name: str
-    size: int
-    etag: str
-    content_type: str = ""
-    is_dir: bool
-    path: str
+    def close(self):
+        self.adapter.close()
 
 
 DT_SAMPLE = "Sat, 17 Dec 2022 13:58:13 GMT"
@@ -62,40 +353,110 @@ DT_FORMAT = "%a, %d %b %Y %H:%M:%S %Z"
 
 
 def strptime(dt: str):
-    tzname = dt.split(" ")[-1].upper()
-    if tzname not in {"GMT", "UTC"}:
-        raise Exception()
-    dt = datetime.strptime(dt, DT_FORMAT)
-    tz = timezone(timedelta(hours=+0))
-    dt = dt.replace(tzinfo=tz)
-    return dt
+    return parse_http_date(dt)
+
+
+class NextcloudChunking:
+    """Nextcloud chunked upload v2 session used by ChunkedUpload.
+
+    MKCOL uploads/<user>/<id> -> PUT uploads/<user>/<id>/<n> -> MOVE .../<id>/.file
+    """
+
+    def __init__(self, provider: "WebdavProvider", remote_path, size: int):
+        from webdav3.urn import Urn
+
+        self.provider = provider
+        self.size = size
+        client = provider.client
+        hostname = client.webdav.hostname.rstrip("/")
+        base, sep, user = hostname.rpartition("/files/")
+        if not sep:
+            raise StorageException("Chunked upload is not supported.")
+        self.uploads_url = f"{base}/uploads/{user}"
+        self.destination = client.get_url(Urn(remote_path).quote())
+
+    def _request(self, method, url, headers=None, data=None):
+        client = self.provider.client
+        headers = {"Destination": self.destination, **(headers or {})}
+        response = client.session.request(
+            method,
+            url,
+            auth=(client.webdav.login, client.webdav.password),
+            headers=headers,
+            data=data,
+            timeout=client.timeout,
+            verify=client.verify,
+        )
+        if response.status_code == 404:
+            raise RemoteResourceNotFound(path=url)
+        if response.status_code == 405:
+            raise MethodNotSupported(name=method, server=url)
+        if response.status_code >= 400:
+            raise ResponseErrorCode(url, response.status_code, response.content)
+        return response
+
+    def start(self):
+        import uuid
+
+        upload_id = f"mystorage-{uuid.uuid4().hex}"
+        self._request("MKCOL", f"{self.uploads_url}/{upload_id}")
+        return upload_id
+
+    def exists(self, upload_id):
+        try:
+            self._request("PROPFIND", f"{self.uploads_url}/{upload_id}", {"Depth": "0"})
+        except RemoteResourceNotFound:
+            return False
+        return True
+
+    def put_chunk(self, upload_id, number, data):
+        url = f"{self.uploads_url}/{upload_id}/{number:05d}"
+        self._request("PUT", url, {"OC-Total-Length": str(self.size)}, data)
+
+    def finish(self, upload_id):
+        url = f"{self.uploads_url}/{upload_id}/.file"
+        self._request("MOVE", url, {"OC-Total-Length": str(self.size)})
 
 
 class WebdavProvider(Provider):
-    def __init__(self, client: Webdav3Client):
-        self.client = client
+    """Providers created from a pool are safe to share between threads.
+
+    Each thread gets its own session, and all sessions reuse the pool's
+    keep-alive connections.
+    """
+
+    def __init__(self, client: Webdav3Client = None, pool: WebdavClientPool = None):
+        if (client is None) == (pool is None):
+            raise Exception("Either client or pool is required.")
+        if (
+            client is not None
+            and count_response not in client.session.hooks["response"]
+        ):
+            client.session.hooks["response"].insert(0, count_response)
+        self._client = client
+        self.pool = pool
+        self.depth_infinity = None  # None: unknown yet
+        self.chunked_upload = None  # None: unknown yet
+
+    @property
+    def client(self) -> Webdav3Client:
+        if self.pool is None:
+            return self._client
+        return self.pool.client()
+
+    def pool_stats(self):
+        if self.pool is None:
+            return None
+        return self.pool.stats()
 
     @staticmethod
     def convert_info(x: dict):
         # return [FileInfo(**x) for x in self.client.list(path, get_info=True)]
-        dt = str(strptime(x["modified"]))
+        dt = None if x["modified"] is None else format_http_date(x["modified"])
         x["modified"] = dt
-        if x["created"] is None:
-            x["created"] = dt
-        if x["size"] is None:
-            x["size"] = 0
-        else:
-            if x["size"] == "":
-                x["size"] = 0
-            else:
-                x["size"] = int(x["size"])
-        if "isdir" in x:
-            if x["isdir"]:
-                x["isdir"] = ResourceTypes.DIR
-            else:
-                x["isdir"] = ResourceTypes.FILE
-        else:
-            x["isdir"] = ResourceTypes.FILE
+        x["created"] = dt if x["created"] is None else format_http_date(x["created"])
+        x["size"] = to_size(x["size"])
+        x["isdir"] = ResourceTypes.DIR if x.get("isdir") else ResourceTypes.FILE
         return x
 
     def login(self):
@@ -117,8 +478,18 @@ class WebdavProvider(Provider):
         return int(self.client.free())
 
     def info(self, path):
-        info = self.client.info(path)
-        return self.convert_info(info)
+        # webdav3 の info は HEAD x2 + Depth: 1 の PROPFIND を送り、isdir も返さない
+        from webdav3.client import WebDavXmlUtils
+        from webdav3.urn import Urn
+
+        urn = Urn(path)
+        response = self.client.execute_request(
+            action="info", path=urn.quote(), headers_ext=["Depth: 0"]
+        )
+        infos = WebDavXmlUtils.parse_get_list_info_response(response.content)
+        if not infos:
+            raise RemoteResourceNotFound(path)
+        return self.convert_info(infos[0])
 
     def info_or_none(self, path):
         if self.exists(path):
@@ -133,10 +504,13 @@ class WebdavProvider(Provider):
         return self.client.check(path)
 
     def type(self, path):
-        if not self.exists(path):
-            return ResourceTypes.NO_EXISTS
-        else:
+        try:
             return self.info(path)["isdir"]
+        except RemoteResourceNotFound:
+            return ResourceTypes.NO_EXISTS
+
+    def isdir(self, path):
+        return self.type(path) == ResourceTypes.DIR
 
     def mkdir(self, path):
         self.client.mkdir(path)
@@ -149,6 +523,50 @@ class WebdavProvider(Provider):
         return self._create_or_put("create", path, buf)
 
     def _create_or_put(self, action, path, buf):
+        self._check_writable(action, path)
+        if not self._put_chunked(path, buf):
+            res = self.client.resource(path)
+            res.read_from(buf)
+        return self.info(path)
+
+    def _put_chunked(self, path, buf):
+        # 大きな実ファイルはチャンクに分けて並列に送る。非対応サーバーでは単一 PUT に戻す
+        from mystorage.providers.local import regular_fileno
+        from mystorage.transfer import UPLOAD_CHUNK_SIZE, ChunkedUpload, chunk_size_for
+
+        fd = regular_fileno(buf)
+        if fd is None or self.chunked_upload is False:
+            return False
+        offset = buf.tell()
+        size = os.fstat(fd).st_size - offset
+        chunk_size = chunk_size_for(size, UPLOAD_CHUNK_SIZE)
+        if size <= chunk_size:
+            return False
+
+        try:
+            session = NextcloudChunking(self, path, size)
+        except StorageException:
+            self.chunked_upload = False
+            return False
+        upload = ChunkedUpload(
+            session,
+            lambda start, end: os.pread(fd, end - start + 1, offset + start),
+            size,
+            chunk_size=chunk_size,
+        )
+        try:
+            upload.run()
+        except (MethodNotSupported, RemoteResourceNotFound, ResponseErrorCode) as e:
+            # 一時的な失敗では無効にしない。非対応と分かったときだけ単一 PUT に戻す
+            if upload.upload_id is not None or not rejects_chunking(e):
+                raise
+            self.chunked_upload = False
+            return False
+        self.chunked_upload = True
+        buf.seek(offset + size)
+        return True
+
+    def _check_writable(self, action, path):
         if action == "create":
             try:
                 if self.exists(path):
@@ -156,59 +574,168 @@ class WebdavProvider(Provider):
             except RemoteResourceNotFound as e:
                 ...
         elif action == "put":
-            try:
-                if self.client.is_dir(path):
-                    raise StorageException("PUT is not allowed on non-files.")
-            except RemoteResourceNotFound as e:
-                ...
+            if self.type(path) == ResourceTypes.DIR:
+                raise StorageException("PUT is not allowed on non-files.")
         else:
             raise Exception()
-        res = self.client.resource(path)
-        res.read_from(buf)
-        return self.convert_info(res.info())
+
+    def write_stream(self, path, iterable):
+        # requests は generator を chunked transfer encoding でそのまま送信する
+        from webdav3.urn import Urn
+
+        self._check_writable("put", path)
+        urn = Urn(path)
+        chunks = (bytes(x) for x in iterable if x)
+        self.client.execute_request(action="upload", path=urn.quote(), data=chunks)
+        return self.info(path)
+
+    def _download_response(self, path):
+        from webdav3.urn import Urn
+
+        urn = Urn(path)
+        return self.client.execute_request(action="download", path=urn.quote())
+
+    def _open_reader(self, path):
+        from mystorage.streams import open_iter_reader
+
+        response = self._download_response(path)
+        chunk_size = self.client.chunk_size
+        return open_iter_reader(
+            response.iter_content(chunk_size), response.close, chunk_size
+        )
+
+    def open_if_modified(self, path, etag: str = None):
+        # 条件付き GET。変更が無ければ 304 で本文は返らない
+        from webdav3.urn import Urn
+
+        from mystorage.streams import open_iter_reader
+
+        headers_ext = [f"If-None-Match: {etag}"] if etag else None
+        response = self.client.execute_request(
+            action="download", path=Urn(path).quote(), headers_ext=headers_ext
+        )
+        if response.status_code == 304:
+            return None, etag
+        chunk_size = self.client.chunk_size
+        f = open_iter_reader(
+            response.iter_content(chunk_size), response.close, chunk_size
+        )
+        return f, response.headers.get("ETag")
+
+    def iter_chunks(self, path, chunk_size=None):
+        response = self._download_response(path)
+        with response:
+            yield from response.iter_content(chunk_size or self.client.chunk_size)
 
     def read(self, path, buf):
         res = self.client.resource(path)
         res.write_to(buf)
         return buf
 
-    def read_bytes(self, path):
-        import io
-
-        buf = io.BytesIO()
-        buf = self.read(path, buf)
-        buf.seek(0)
-        return buf.read()
+    def _propfind(self, path, depth, directory=False, props=None):
+        """Sends PROPFIND and returns (own url path, iterator of raw infos).
 
-    def read_text(self, path, encoding=None):
-        import io
+        The body is parsed while it downloads; `props` limits the requested properties.
+        """
+        from webdav3.urn import Urn
 
-        buf = io.BytesIO()
-        buf = self.read(path, buf)
-        buf.seek(0)
-        return io.TextIOWrapper(buf, encoding).read()
+        urn = Urn(path, directory=directory)
+        headers_ext = [f"Depth: {depth}"]
+        data = None
+        if props is not None:
+            headers_ext.append("Content-Type: application/xml; charset=utf-8")
+            data = propfind_body(props)
+        with streaming_response():
+            response = self.client.execute_request(
+                action="list", path=urn.quote(), data=data, headers_ext=headers_ext
+            )
+        url_path = unquote(urlsplit(self.client.get_url(urn.quote())).path)
+
+        def iter_infos():
+            with response:
+                chunks = response.iter_content(self.client.chunk_size)
+                yield from iter_multistatus(chunks)
+
+        return url_path.rstrip("/"), iter_infos()
+
+    def iter_ll(self, path, props=None):
+        # webdav3 の list は hostname にパスを含むと自身も結果に含めてしまう
+        self_path, infos = self._propfind(path, 1, directory=True, props=props)
+        keys = list(PROPFIND_PROPS) if props is None else list(props)
+        for x in infos:
+            if x["path"].rstrip("/") == self_path:
+                continue
+            info = {key: x[key] for key in keys}
+            for key in ("modified", "created"):
+                if info.get(key) is not None:
+                    info[key] = format_http_date(info[key])
+            if "created" in info and info["created"] is None:
+                info["created"] = info.get("modified")
+            if "size" in info:
+                info["size"] = to_size(info["size"])
+            info["isdir"] = ResourceTypes.DIR if x["isdir"] else ResourceTypes.FILE
+            info["path"] = x["path"]
+            yield info
 
     def ll(self, path):
-        # return [FileInfo(**x) for x in self.client.list(path, get_info=True)]
+        # 他の Provider と同じく info の dict のリストを返す。
+        # Listing を経由すると entry ごとの変換が増えるので直接 dict にする
+        self_path, infos = self._propfind(path, 1, directory=True)
         convert = self.convert_info
-        return [convert(x) for x in self.client.list(path, get_info=True)]
+        return [convert(x) for x in infos if x["path"].rstrip("/") != self_path]
 
+    def ll_listing(self, path) -> Listing:
+        """ll as a column-oriented Listing; cheaper for very large directories."""
+        self_path, infos = self._propfind(path, 1, directory=True)
+        return Listing.from_infos(
+            x for x in infos if x["path"].rstrip("/") != self_path
+        )
+
+    # 名前は href から取る。displayname はパスの要素と一致するとは限らない
     def ls(self, path):
-        return [x.replace("/", "") for x in self.client.list(path, get_info=False)]
+        return [entry_name(x) for x in self.iter_ll(path, props=[])]
 
     def ls_files(self, path):
-        return [x["name"] for x in self.ll_files()]
+        type = ResourceTypes.FILE
+        infos = self.iter_ll(path, props=[])
+        return [entry_name(x) for x in infos if x["isdir"] == type]
 
     def ls_dirs(self, path):
-        return [x["name"] for x in self.ll_dirs()]
+        type = ResourceTypes.DIR
+        infos = self.iter_ll(path, props=[])
+        return [entry_name(x) for x in infos if x["isdir"] == type]
 
     def ll_files(self, path):
-        type = ResourceTypes.FILE
-        return [x for x in self.ll() if x["isdir"] == type]
+        return self.ll_listing(path).files().to_dicts()
 
     def ll_dirs(self, path):
-        type = ResourceTypes.DIR
-        return [x for x in self.ll() if x["isdir"] == type]
+        return self.ll_listing(path).dirs().to_dicts()
+
+    def walk(self, path="", max_workers=None, max_depth=None, detail=False):
+        path = str(path).strip("/")
+        shallow = max_depth is not None and max_depth <= DEPTH_INFINITY_MIN_DEPTH
+        if not shallow and self.depth_infinity is not False:
+            try:
+                return self._walk_depth_infinity(path, max_depth, detail)
+            except ResponseErrorCode as e:
+                # Nextcloud などは既定で Depth: infinity を拒否する。それ以外の失敗は伝える
+                if not rejects_depth_infinity(e):
+                    raise
+                self.depth_infinity = False
+        return super().walk(path, max_workers, max_depth, detail)
+
+    def _walk_depth_infinity(self, path, max_depth, detail):
+        root, infos = self._propfind(path, "infinity", directory=True)
+        self.depth_infinity = True
+        tree = {}
+        for x in infos:
+            rel = x["path"].rstrip("/")[len(root) :].strip("/")
+            if not rel:
+                continue
+            parent = join(path, posixpath.dirname(rel))
+            tree.setdefault(parent, Listing()).append_info(x)
+        walk = walk_tree(tree, path, max_depth, detail)
+        return walk_as_dicts(walk) if detail else walk
 
     def move(self, src, dest):
         if not self.exists(src):
@@ -229,11 +756,96 @@ class WebdavProvider(Provider):
         res = self.client.resource(src)
         return res.rename(name)
 
-    def download(self, remote_path, local_path):
+    def download(self, remote_path, local_path, max_workers=None, chunk_size=None):
+        if max_workers and not self.client.is_dir(remote_path):
+            return self.download_ranged(
+                remote_path, local_path, max_workers, chunk_size
+            )
         return self.client.download_sync(remote_path, local_path)
 
-    def upload(self, local_path, remote_path):
-        return self.client.upload_sync(remote_path, local_path)
+    def download_ranged(
+        self, remote_path, local_path, max_workers=None, chunk_size=None
+    ):
+        # Range GET を並列に発行し、完了したレンジを local_path + ".part" に記録して再開可能にする
+        from webdav3.urn import Urn
+
+        from mystorage.transfer import (
+            RANGE_CHUNK_SIZE,
+            RANGE_MAX_WORKERS,
+            RangedDownload,
+        )
+
+        chunk_size = chunk_size or RANGE_CHUNK_SIZE
+        urn = Urn(remote_path)
+        headers = self.client.execute_request(action="check", path=urn.quote()).headers
+        size = headers.get("Content-Length")
+        etag = headers.get("ETag", "")
+        accepts_ranges = headers.get("Accept-Ranges", "").lower() == "bytes"
+        if size is None or not accepts_ranges or int(size) <= chunk_size:
+            os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+            return self.client.download_sync(remote_path, local_path)
+
+        def fetch_range(start, end):
+            headers_ext = [f"Range: bytes={start}-{end}"]
+            if etag:
+                headers_ext.append(f"If-Range: {etag}")
+            response = self.client.execute_request(
+                action="download", path=urn.quote(), headers_ext=headers_ext
+            )
+            with response:
+                if response.status_code != 206:
+                    raise StorageException("Resource changed during download.")
+                yield from response.iter_content(self.client.chunk_size)
+
+        RangedDownload(
+            fetch_range,
+            int(size),
+            etag,
+            local_path,
+            chunk_size=chunk_size,
+            max_workers=max_workers or RANGE_MAX_WORKERS,
+        ).run()
+
+    def upload(self, local_path, remote_path, max_workers=None, chunk_size=None):
+        if max_workers and os.path.isfile(local_path):
+            return self.upload_chunked(local_path, remote_path, max_workers, chunk_size)
+        self.client.upload_sync(remote_path, local_path)
+        return self.info(remote_path)
+
+    def upload_chunked(
+        self, local_path, remote_path, max_workers=None, chunk_size=None
+    ):
+        # チャンクを並列に PUT し、送信済みのチャンクを local_path + ".upload" に記録して再開可能にする
+        from mystorage.transfer import (
+            UPLOAD_CHUNK_SIZE,
+            UPLOAD_MAX_WORKERS,
+            ChunkedUpload,
+            chunk_size_for,
+        )
+
+        st = os.stat(local_path)
+        chunk_size = chunk_size_for(st.st_size, chunk_size or UPLOAD_CHUNK_SIZE)
+        if st.st_size <= chunk_size:
+            self.client.upload_sync(remote_path, local_path)
+            return self.info(remote_path)
+
+        session = NextcloudChunking(self, remote_path, st.st_size)
+        fingerprint = {
+            "remote_path": str(remote_path),
+            "mtime_ns": st.st_mtime_ns,
+        }
+        with open(local_path, "rb") as f:
+            fd = f.fileno()
+            ChunkedUpload(
+                session,
+                lambda start, end: os.pread(fd, end - start + 1, start),
+                st.st_size,
+                state_path=local_path + ".upload",
+                fingerprint=fingerprint,
+                chunk_size=chunk_size,
+                max_workers=max_workers or UPLOAD_MAX_WORKERS,
+            ).run()
+        return self.info(remote_path)
 
     # download_sync
     # download_async
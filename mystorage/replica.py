@@ -0,0 +1,593 @@
+import logging
+import posixpath
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List
+
+from mystorage.batch import Batch
+from mystorage.concurrency import submit
+from mystorage.exceptions import NOT_FOUND_ERRORS, StorageException
+from mystorage.journal import ReplicationJournal, overlaps
+from mystorage.streams import Spool
+from mystorage.types import Provider, ProviderWrapper, ResourceTypes
+
+"""
+# Keeps copies of a provider on other providers.
+replica = StorageSyncReplica(a_provider, b=b_provider, c=c_provider)  # quorum writes
+replica.put("dir1/file1", buf)  # returns once 2 of 3 members have it
+replica = StorageAsyncReplica(a_provider, journal="replica.journal.sqlite", b=b_provider)
+replica.put("dir1/file1", buf)  # returns once a_provider has it; b follows
+replica.close(timeout=30)
+"""
+
+
+class StorageSyncReplica(Provider):
+    """Writes go to `storage` and every replica at once; reads are hedged.
+
+    A write returns as soon as `write_quorum` members have acknowledged it and
+    the rest finish in the background. On each member, a write waits only for
+    earlier writes to the same path, its ancestors or its descendants.
+
+    A read that has not been answered within the `hedge_percentile` of recent
+    read latencies is also sent to the next member, and the first answer wins.
+    Reads skip members that have a write to an overlapping path still in flight
+    or whose last write to it failed, so a read sees every write made through
+    this instance. Writes made elsewhere (another process, before a restart)
+    are not tracked; a lagging member may still answer those reads.
+    """
+
+    def __init__(
+        self,
+        storage: Provider,
+        *,
+        write_quorum: int = None,
+        hedge_percentile: float = 0.95,
+        hedge_min_delay: float = 0.02,
+        max_workers: int = None,
+        write_workers: int = 4,
+        **replicas: Provider,
+    ):
+        self.storage = storage
+        self.storages = replicas
+        self.members = [storage, *replicas.values()]
+        self.write_quorum = write_quorum or len(self.members) // 2 + 1
+        if not 1 <= self.write_quorum <= len(self.members):
+            raise StorageException("Invalid write quorum.")
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.executor = ThreadPoolExecutor(max_workers or 4 * len(self.members))
+        # 別のパスへの書き込みはメンバー毎に並列に流す
+        self._writers = [ThreadPoolExecutor(write_workers) for _ in self.members]
+        # メンバー毎の書き込み中 (future -> paths) と書き込みに失敗したパス
+        self._inflight = [{} for _ in self.members]
+        self._failed = [set() for _ in self.members]
+        self._submit_lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._lock = threading.Lock()
+        self._counters = {"writes": 0, "background_errors": 0, "reads": 0, "hedged": 0}
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._counters[key] += n
+
+    def close(self, wait: bool = True):
+        """Waits for background writes (if `wait`) and stops the worker threads."""
+        for writer in self._writers:
+            writer.shutdown(wait=wait)
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def replica_stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats["hedge_delay"] = self.hedge_delay()
+        return stats
+
+    def hedge_delay(self) -> float:
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < 20:
+            return self.hedge_min_delay
+        index = min(int(len(samples) * self.hedge_percentile), len(samples) - 1)
+        return max(self.hedge_min_delay, samples[index])
+
+    def _on_background_done(self, future):
+        if future.exception() is not None:
+            self._count("background_errors")
+
+    @staticmethod
+    def _key(path) -> str:
+        return str(path).strip("/")
+
+    def _stale(self, index, key) -> bool:
+        """Whether member `index` may not have the latest write to `key` yet."""
+        with self._lock:
+            inflight = [x for paths in self._inflight[index].values() for x in paths]
+            failed = list(self._failed[index])
+        return any(overlaps(key, x) for x in inflight + failed)
+
+    def _submit_write(self, index, call, paths):
+        with self._lock:
+            deps = [
+                future
+                for future, others in self._inflight[index].items()
+                if any(overlaps(a, b) for a in paths for b in others)
+            ]
+
+        def run(member):
+            # 同じパス (親子を含む) への先の書き込みが終わるのを待つ。失敗しても続ける
+            wait(deps)
+            return call(member)
+
+        future = submit(self._writers[index], run, self.members[index])
+        with self._lock:
+            self._inflight[index][future] = paths
+
+        def finished(_):
+            with self._lock:
+                del self._inflight[index][future]
+                if future.exception() is None:
+                    self._failed[index].difference_update(paths)
+                else:
+                    self._failed[index].update(paths)
+
+        future.add_done_callback(finished)
+        return future
+
+    def _write(self, call, paths, on_finished=None):
+        paths = [self._key(x) for x in paths]
+        # 並行する書き込みも全メンバーで同じ順番に並べる
+        with self._submit_lock:
+            futures = [
+                self._submit_write(i, call, paths) for i in range(len(self.members))
+            ]
+        if on_finished is not None:
+            remaining = [len(futures)]
+
+            def finished(_):
+                with self._lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    on_finished()
+
+            for future in futures:
+                future.add_done_callback(finished)
+
+        acks, errors, pending = [], [], set(futures)
+        max_errors = len(futures) - self.write_quorum
+        while pending and len(acks) < self.write_quorum and len(errors) <= max_errors:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                (acks if future.exception() is None else errors).append(future)
+        # 残りはバックグラウンドで完了させる
+        for future in pending:
+            future.add_done_callback(self._on_background_done)
+        self._count("writes")
+
+        if len(acks) < self.write_quorum:
+            raise errors[0].exception()
+        if futures[0] in acks:
+            return futures[0].result()
+        return acks[0].result()
+
+    def _read(self, path, call, discard=None):
+        key = self._key(path)
+        # 書き込みが届いていないメンバーには聞かない
+        members = [x for i, x in enumerate(self.members) if not self._stale(i, key)]
+        members = members or self.members
+        start = time.monotonic()
+        delay = self.hedge_delay()
+        pending = {submit(self.executor, call, members[0])}
+        submitted, winner, error = 1, None, None
+        while True:
+            has_next = submitted < len(members)
+            done, pending = wait(
+                pending,
+                timeout=delay if has_next else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                e = future.exception()
+                # 存在しない等はそのメンバーの答え。通信エラー等は他のメンバーに聞く
+                if e is None or isinstance(e, (*NOT_FOUND_ERRORS, StorageException)):
+                    winner = future
+                    break
+                error = e
+            if winner is not None:
+                break
+            if not has_next:
+                if not pending:
+                    raise error
+                continue
+            if not done:
+                self._count("hedged")
+            pending.add(submit(self.executor, call, members[submitted]))
+            submitted += 1
+
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        self._count("reads")
+        if discard is not None:
+            for future in pending:
+                future.add_done_callback(
+                    lambda f: f.exception() is None and discard(f.result())
+                )
+        return winner.result()
+
+    def exists(self, path) -> bool:
+        return self._read(path, lambda x: x.exists(path))
+
+    def info(self, path):
+        return self._read(path, lambda x: x.info(path))
+
+    def type(self, path) -> ResourceTypes:
+        return self._read(path, lambda x: x.type(path))
+
+    def isdir(self, path) -> bool:
+        return self.type(path) == ResourceTypes.DIR
+
+    def ls(self, path) -> List[str]:
+        return self._read(path, lambda x: x.ls(path))
+
+    def ls_files(self, path) -> List[str]:
+        return self._read(path, lambda x: x.ls_files(path))
+
+    def ls_dirs(self, path):
+        return self._read(path, lambda x: x.ls_dirs(path))
+
+    def ll(self, path):
+        return self._read(path, lambda x: x.ll(path))
+
+    def ll_files(self, path):
+        return self._read(path, lambda x: x.ll_files(path))
+
+    def ll_dirs(self, path):
+        return self._read(path, lambda x: x.ll_dirs(path))
+
+    def open(self, path, mode="rb", encoding=None):
+        if mode in {"w", "wb"}:
+            return super().open(path, mode, encoding)
+        return self._read(
+            path, lambda x: x.open(path, mode, encoding), lambda f: f.close()
+        )
+
+    def read(self, path, buf):
+        with self.open(path, "rb") as f:
+            shutil.copyfileobj(f, buf)
+        return buf
+
+    def read_bytes(self, path):
+        return self._read(path, lambda x: x.read_bytes(path))
+
+    def delete(self, path):
+        return self._write(lambda x: x.delete(path), [path])
+
+    def mkdir(self, path):
+        return self._write(lambda x: x.mkdir(path), [path])
+
+    def _write_spool(self, method, path, spool):
+        def call(member):
+            with spool.open() as f:
+                return getattr(member, method)(path, f)
+
+        return self._write(call, [path], spool.close)
+
+    def create(self, path, buf):
+        return self._write_spool("create", path, Spool.from_buffer(buf))
+
+    def put(self, path, buf):
+        return self._write_spool("put", path, Spool.from_buffer(buf))
+
+    def write_stream(self, path, iterable):
+        return self._write_spool("put", path, Spool(iterable))
+
+    def move(self, src, dest):
+        return self._write(lambda x: x.move(src, dest), [src, dest])
+
+    def copy(self, src, dest):
+        return self._write(lambda x: x.copy(src, dest), [src, dest])
+
+    def rename(self, src, name):
+        dest = posixpath.join(posixpath.dirname(self._key(src)), str(name))
+        return self._write(lambda x: x.rename(src, name), [src, dest])
+
+
+class StorageAsyncReplica(ProviderWrapper):
+    """Writes commit to `storage` and return; replicas follow in the background.
+
+    Writes waiting for a replica are kept in a journal (SQLite file), so they
+    are replayed after a restart. A write is journaled before it reaches
+    `storage`; if it fails or the process dies, the replica is synced to the
+    primary's state instead. Writers block while `max_pending` rows are queued.
+    Reads are served by `storage`.
+    """
+
+    def __init__(
+        self,
+        storage: Provider,
+        *,
+        journal,
+        max_pending: int = 10000,
+        max_workers: int = 8,
+        batch_size: int = 256,
+        **replicas: Provider,
+    ):
+        super().__init__(storage)
+        self.storage = storage
+        self.storages = replicas
+        if not isinstance(journal, ReplicationJournal):
+            journal = ReplicationJournal(journal)
+        self.journal = journal
+        self.max_pending = max_pending
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self._counters = {"replicated": 0, "errors": 0}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._replicate, args=(x,), daemon=True)
+            for x in replicas
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @staticmethod
+    def _key(path) -> str:
+        return str(path).strip("/")
+
+    def _wait_for_capacity(self):
+        with self._cond:
+            while not self._closed and self._pending() >= self.max_pending:
+                self._cond.wait(1)
+
+    def _write(self, op, path, dest, func, *args, **kwargs):
+        self._wait_for_capacity()
+        dest = None if dest is None else self._key(dest)
+        # 先に記録する。書き込み前に落ちても再起動後にプライマリと揃える
+        seqs = self.journal.append(self.storages, op, self._key(path), dest, held=True)
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            self.journal.abort(seqs)
+            raise
+        finally:
+            with self._cond:
+                self._cond.notify_all()
+        self.journal.commit(seqs)
+        with self._cond:
+            self._cond.notify_all()
+        return result
+
+    def delete(self, path):
+        return self._write("delete", path, None, self.storage.delete, path)
+
+    def mkdir(self, path):
+        return self._write("mkdir", path, None, self.storage.mkdir, path)
+
+    def create(self, path, buf):
+        return self._write("put", path, None, self.storage.create, path, buf)
+
+    def put(self, path, buf):
+        return self._write("put", path, None, self.storage.put, path, buf)
+
+    def write_stream(self, path, iterable):
+        func = self.storage.write_stream
+        return self._write("put", path, None, func, path, iterable)
+
+    def upload(self, local_path, remote_path, *args, **kwargs):
+        # ProviderWrapper の __getattr__ に任せると journal に残らない
+        func = self.storage.upload
+        return self._write(
+            "put", remote_path, None, func, local_path, remote_path, *args, **kwargs
+        )
+
+    def upload_chunked(self, local_path, remote_path, *args, **kwargs):
+        func = self.storage.upload_chunked
+        return self._write(
+            "put", remote_path, None, func, local_path, remote_path, *args, **kwargs
+        )
+
+    def move(self, src, dest):
+        return self._write("move", src, dest, self.storage.move, src, dest)
+
+    def copy(self, src, dest):
+        return self._write("copy", src, dest, self.storage.copy, src, dest)
+
+    def rename(self, src, name):
+        dest = posixpath.join(posixpath.dirname(self._key(src)), str(name))
+        return self._write("move", src, dest, self.storage.rename, src, name)
+
+    def _replay(self, batch, row):
+        # put は再生時点のプライマリの内容を送る
+        if row.op == "put":
+            return batch.write_stream(row.path, self.storage.iter_chunks(row.path))
+        if row.op in {"move", "copy"}:
+            return getattr(batch, row.op)(row.path, row.dest)
+        return getattr(batch, row.op)(row.path)
+
+    def _sync(self, replica: Provider, row):
+        for path in (row.path, row.dest):
+            if path is None:
+                continue
+            if self.storage.type(path) == ResourceTypes.NO_EXISTS:
+                if replica.exists(path):
+                    replica.delete(path)
+            else:
+                self._resync(replica, path)
+
+    def _recover(self, replica: Provider, row) -> bool:
+        # 失敗しても結果の状態になっていれば完了とする (再起動後の再実行など)
+        try:
+            if row.op == "sync":
+                return False
+            if row.op == "put":
+                return not self.storage.exists(row.path)
+            if row.op == "delete":
+                return not replica.exists(row.path)
+            if row.op == "mkdir":
+                return replica.isdir(row.path)
+            if replica.exists(row.path):
+                return False
+            # 移動元が畳み込み等でレプリカに無い。移動先をプライマリから写す
+            self._resync(replica, row.dest)
+            return True
+        except Exception:
+            return False
+
+    def _resync(self, replica: Provider, path):
+        type = self.storage.type(path)
+        if type == ResourceTypes.NO_EXISTS:
+            return
+        if type == ResourceTypes.FILE:
+            with self.storage.open(path, "rb") as f:
+                replica.put(path, f)
+            return
+        if replica.exists(path) and not replica.isdir(path):
+            replica.delete(path)
+        for dirpath, dirs, files in self.storage.walk(path):
+            if not replica.isdir(dirpath):
+                replica.mkdir(dirpath)
+            for name in files:
+                key = f"{dirpath}/{name}"
+                with self.storage.open(key, "rb") as f:
+                    replica.put(key, f)
+
+    def _apply(self, replica: Provider, rows):
+        """Replays `rows` in order. Returns (done seqs, failed rows)."""
+
+        done, failed = [], []
+        i = 0
+        while i < len(rows):
+            if rows[i].op == "sync":
+                row = rows[i]
+                try:
+                    self._sync(replica, row)
+                    done.append(row.seq)
+                except Exception:
+                    logging.getLogger("mystorage.replica").warning(
+                        "sync %s failed", row.path, exc_info=True
+                    )
+                    failed.append(row)
+                i += 1
+                continue
+            # sync までの行はまとめて並列に流す
+            batch = Batch(replica, self.max_workers)
+            items = []
+            while i < len(rows) and rows[i].op != "sync":
+                items.append((rows[i], self._replay(batch, rows[i])))
+                i += 1
+            batch.run()
+            for row, item in items:
+                if item.ok or self._recover(replica, row):
+                    done.append(row.seq)
+                else:
+                    failed.append(row)
+        return done, failed
+
+    def _replicate_once(self, name, replica):
+        """Replays one batch. Returns the failed rows, or None when idle."""
+        rows = self.journal.claim(name, self.batch_size)
+        if not rows:
+            return None
+        try:
+            done, failed = self._apply(replica, rows)
+        except Exception:
+            logging.getLogger("mystorage.replica").exception("Replay failed.")
+            done, failed = [], rows
+        self.journal.done(done)
+        self.journal.release([x.seq for x in failed])
+        with self._cond:
+            self._counters["replicated"] += len(done)
+            self._counters["errors"] += len(failed)
+            self._cond.notify_all()
+        return failed
+
+    def _replicate(self, name):
+        replica = self.storages[name]
+        attempts = 0
+        while not self._closed:
+            try:
+                failed = self._replicate_once(name, replica)
+            except Exception:
+                # スレッドを止めずに後で再試行する
+                logging.getLogger("mystorage.replica").exception(
+                    "Replication to %s failed.", name
+                )
+                failed = [None]
+            if failed is None:
+                with self._cond:
+                    if not self._closed:
+                        self._cond.wait(0.5)
+                continue
+            if not failed:
+                attempts = 0
+                continue
+            attempts = min(attempts + 1, 6)
+            time.sleep(min(0.1 * 2**attempts, 5))
+
+    def _pending(self) -> int:
+        return sum(
+            rows for name, rows, _ in self.journal.depth() if name in self.storages
+        )
+
+    def replication_stats(self):
+        now = time.time()
+        replicas = {x: {"pending": 0, "lag_seconds": 0.0} for x in self.storages}
+        for name, rows, oldest in self.journal.depth():
+            if name in replicas:
+                replicas[name] = {"pending": rows, "lag_seconds": now - oldest}
+        with self._cond:
+            counters = dict(self._counters)
+        return {
+            "pending": sum(x["pending"] for x in replicas.values()),
+            "lag_seconds": max([x["lag_seconds"] for x in replicas.values()] or [0.0]),
+            "coalesced": self.journal.coalesced,
+            **counters,
+            "replicas": replicas,
+        }
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until every replica has caught up."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            # 設定にないレプリカ宛ての行は待たない
+            while self._pending():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 1)
+        return True
+
+    def close(self, flush: bool = True, timeout: float = None) -> bool:
+        """Stops replication. Returns False if `timeout` expired while flushing.
+
+        Rows that did not reach a replica stay in the journal and are replayed
+        by the next StorageAsyncReplica opened on it.
+        """
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        flushed = not flush or self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            thread.join(None if remaining is None else max(remaining, 0))
+        if any(x.is_alive() for x in self._threads):
+            # 再生中の行は次に開いたときにやり直す
+            logging.getLogger("mystorage.replica").warning(
+                "Replication threads did not stop within %s seconds.", timeout
+            )
+            return False
+        self.journal.close()
+        return flushed
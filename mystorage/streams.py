@@ -0,0 +1,273 @@
+import io
+import queue
+import threading
+from typing import Callable, Iterable, Iterator
+
+DEFAULT_CHUNK_SIZE = 65536
+PIPE_MAX_CHUNKS = 8
+
+_EOF = object()
+
+
+class IterReader(io.RawIOBase):
+    """Readable raw stream over an iterable of bytes chunks."""
+
+    def __init__(self, iterable: Iterable[bytes], on_close: Callable = None):
+        self._it = iter(iterable)
+        self._view = memoryview(b"")
+        self._on_close = on_close
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._view:
+            try:
+                self._view = memoryview(next(self._it))
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._view))
+        b[:n] = self._view[:n]
+        self._view = self._view[n:]
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._on_close is not None:
+                self._on_close()
+        finally:
+            super().close()
+
+
+def open_iter_reader(iterable, on_close=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    return io.BufferedReader(IterReader(iterable, on_close), chunk_size)
+
+
+def iter_stream(f, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+class _Channel:
+    # スレッド間で chunk を受け渡す。キューの上限でメモリ使用量を抑える
+    def __init__(self, max_chunks=PIPE_MAX_CHUNKS):
+        self.queue = queue.Queue(max_chunks)
+        self.error = None
+        self.closed = False
+
+    def put(self, item, alive: Callable[[], bool]):
+        while True:
+            if self.closed:
+                raise BrokenPipeError("Stream was closed by the other side.")
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                if not alive():
+                    raise BrokenPipeError("Stream was closed by the other side.")
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is _EOF:
+                break
+            yield item
+        if self.error is not None:
+            raise self.error
+
+    def drain(self):
+        self.closed = True
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+
+
+class _ChannelSink(io.RawIOBase):
+    def __init__(self, channel: _Channel, alive: Callable[[], bool]):
+        self._channel = channel
+        self._alive = alive
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        if data:
+            self._channel.put(data, self._alive)
+        return len(data)
+
+
+def open_pipe_reader(produce: Callable[[io.RawIOBase], object], **kwargs):
+    """Run `produce(buf)` in a thread and return a reader over what it writes."""
+    channel = _Channel(kwargs.pop("max_chunks", PIPE_MAX_CHUNKS))
+    reading = threading.Event()
+    reading.set()
+
+    def target():
+        try:
+            produce(_ChannelSink(channel, reading.is_set))
+        except BaseException as e:
+            channel.error = e
+        try:
+            channel.put(_EOF, reading.is_set)
+        except BrokenPipeError:
+            ...
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+
+    def on_close():
+        reading.clear()
+        channel.drain()
+        thread.join()
+
+    return open_iter_reader(channel, on_close, **kwargs)
+
+
+class PipeWriter(io.RawIOBase):
+    """Writable raw stream that feeds `consume(chunks)` running in a thread."""
+
+    def __init__(self, consume: Callable[[Iterable[bytes]], object], **kwargs):
+        self._channel = _Channel(kwargs.get("max_chunks", PIPE_MAX_CHUNKS))
+        self._error = None
+        self.result = None
+        self._thread = threading.Thread(target=self._run, args=(consume,), daemon=True)
+        self._thread.start()
+
+    def _run(self, consume):
+        try:
+            self.result = consume(iter(self._channel))
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._channel.drain()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        if data:
+            try:
+                self._channel.put(data, self._thread.is_alive)
+            except BrokenPipeError:
+                self._raise_error()
+                raise
+        return len(data)
+
+    def abort(self, error: BaseException = None):
+        self._channel.error = error or BrokenPipeError("Stream was aborted.")
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            try:
+                self._channel.put(_EOF, self._thread.is_alive)
+            except BrokenPipeError:
+                ...
+            self._thread.join()
+        finally:
+            super().close()
+        if self._channel.error is None:
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort(exc)
+        else:
+            self.close()
+
+
+class BufferedPipeWriter(io.BufferedWriter):
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.raw.abort(exc)
+        else:
+            self.close()
+
+    @property
+    def result(self):
+        return self.raw.result
+
+
+class TextPipeWriter(io.TextIOWrapper):
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # 書きかけのテキストは捨て、消費側にも失敗を伝える
+            self.buffer.raw.abort(exc)
+        else:
+            self.close()
+
+
+def open_pipe_writer(consume, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+    return BufferedPipeWriter(PipeWriter(consume, **kwargs), chunk_size)
+
+
+def wrap_mode(f, mode: str, encoding=None):
+    if "b" in mode:
+        return f
+    if isinstance(f, BufferedPipeWriter):
+        return TextPipeWriter(f, encoding)
+    return io.TextIOWrapper(f, encoding)
+
+
+SPOOL_MAX_SIZE = 1024 * 1024 * 8
+
+
+class Spool:
+    """Keeps a stream once so that several consumers can read it independently.
+
+    Small data stays in memory, larger data goes to a temporary file.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], max_size: int = SPOOL_MAX_SIZE):
+        self._data = None
+        self._path = None
+        buf = bytearray()
+        it = iter(chunks)
+        for chunk in it:
+            buf += chunk
+            if len(buf) > max_size:
+                break
+        else:
+            self._data = bytes(buf)
+            return
+
+        import tempfile
+
+        with tempfile.NamedTemporaryFile(prefix="mystorage-", delete=False) as f:
+            self._path = f.name
+            f.write(buf)
+            for chunk in it:
+                f.write(chunk)
+
+    @classmethod
+    def from_buffer(cls, buf, max_size: int = SPOOL_MAX_SIZE):
+        return cls(iter_stream(buf), max_size)
+
+    def open(self):
+        if self._path is None:
+            return io.BytesIO(self._data)
+        return open(self._path, "rb")
+
+    def close(self):
+        if self._path is not None:
+            import os
+
+            try:
+                os.remove(self._path)
+            except FileNotFoundError:
+                ...
@@ -0,0 +1,242 @@
+import posixpath
+import sqlite3
+import threading
+
+from mystorage.batch import BATCH_MAX_CONCURRENCY
+from mystorage.exceptions import NOT_FOUND_ERRORS
+from mystorage.types import Provider, ResourceTypes
+from mystorage.walk import entry_name, join
+
+"""
+# One-way incremental mirror. The manifest remembers what was transferred last
+# time (path, size, modified, etag), so only new / changed / removed entries are
+# touched. With `prune_by_dir_etag=True` unchanged directories are not listed at all,
+# which is valid for servers whose directory etag changes with any descendant
+# (Nextcloud / ownCloud).
+report = sync(remote, "dir1", local, "dir1", manifest="dir1.sync.sqlite")
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    isdir INTEGER NOT NULL,
+    size INTEGER,
+    modified TEXT,
+    etag TEXT
+);
+CREATE INDEX IF NOT EXISTS entries_parent ON entries (parent);
+"""
+
+
+def relpath(path: str, root: str) -> str:
+    if not root:
+        return path
+    return "" if path == root else path[len(root) + 1 :]
+
+
+def ancestors(path: str):
+    while path:
+        path = posixpath.dirname(path)
+        yield path
+
+
+class Manifest:
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def get(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT path, isdir, size, modified, etag FROM entries WHERE path = ?",
+                (path,),
+            ).fetchone()
+        return None if row is None else self._to_dict(row)
+
+    def children(self, parent):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, isdir, size, modified, etag FROM entries WHERE parent = ?",
+                (parent,),
+            ).fetchall()
+        return {posixpath.basename(x[0]): self._to_dict(x) for x in rows}
+
+    @staticmethod
+    def _to_dict(row):
+        path, isdir, size, modified, etag = row
+        return {
+            "path": path,
+            "isdir": ResourceTypes.DIR if isdir else ResourceTypes.FILE,
+            "size": size,
+            "modified": modified,
+            "etag": etag,
+        }
+
+    def update(self, upserts, deletes):
+        with self._lock, self._conn:
+            for path in deletes:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                    (path, self._escape(path) + "/%" if path else "%"),
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        path,
+                        posixpath.dirname(path),
+                        info["isdir"] == ResourceTypes.DIR,
+                        info.get("size"),
+                        None if info.get("modified") is None else str(info["modified"]),
+                        info.get("etag"),
+                    )
+                    for path, info in upserts
+                ],
+            )
+
+    @staticmethod
+    def _escape(path):
+        return path.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+def is_changed(info, old) -> bool:
+    if old is None or old["isdir"] != info["isdir"]:
+        return True
+    if info["isdir"] == ResourceTypes.DIR:
+        return False
+    if info.get("etag") and old["etag"]:
+        return info["etag"] != old["etag"] or info.get("size") != old["size"]
+    return (info.get("size"), str(info.get("modified"))) != (
+        old["size"],
+        old["modified"],
+    )
+
+
+class Sync:
+    def __init__(
+        self,
+        src: Provider,
+        src_path: str,
+        dest: Provider,
+        dest_path: str,
+        manifest: Manifest,
+        max_workers: int = None,
+        delete: bool = True,
+        prune_by_dir_etag: bool = False,
+    ):
+        self.src = src
+        self.src_path = str(src_path).strip("/")
+        self.dest = dest
+        self.dest_path = str(dest_path).strip("/")
+        self.manifest = manifest
+        self.max_workers = max_workers or BATCH_MAX_CONCURRENCY
+        self.delete = delete
+        self.prune_by_dir_etag = prune_by_dir_etag
+
+    def plan(self):
+        """Compare the source tree with the manifest. Returns (deletes, dirs, files)."""
+        deletes, dirs, files = [], [], []
+        walk = self.src.walk(self.src_path, max_workers=self.max_workers, detail=True)
+        for dirpath, sub_dirs, sub_files in walk:
+            rel_dir = relpath(dirpath, self.src_path)
+            known = self.manifest.children(rel_dir)
+            for info in list(sub_dirs) + sub_files:
+                name = entry_name(info)
+                rel = join(rel_dir, name)
+                old = known.pop(name, None)
+                if old is not None and old["isdir"] != info["isdir"]:
+                    deletes.append(rel)
+                    old = None
+                if info["isdir"] == ResourceTypes.DIR:
+                    if (
+                        self.prune_by_dir_etag
+                        and old is not None
+                        and info.get("etag")
+                        and info["etag"] == old["etag"]
+                    ):
+                        sub_dirs.remove(info)
+                        continue
+                    dirs.append((rel, info, old is None))
+                elif is_changed(info, old):
+                    files.append((rel, info))
+            if self.delete:
+                deletes.extend(join(rel_dir, name) for name in known)
+        return deletes, dirs, files
+
+    def run(self):
+        deletes, dirs, files = self.plan()
+
+        if self.dest_path and not self.dest.exists(self.dest_path):
+            self.dest.mkdir(self.dest_path)
+
+        batch = self.dest.batch(self.max_workers)
+        delete_items = [(x, batch.delete(join(self.dest_path, x))) for x in deletes]
+        dir_items = [
+            (rel, info, batch.mkdir(join(self.dest_path, rel)) if new else None)
+            for rel, info, new in dirs
+        ]
+        file_items = [
+            (
+                rel,
+                info,
+                batch.write_stream(
+                    join(self.dest_path, rel),
+                    self.src.iter_chunks(join(self.src_path, rel)),
+                ),
+            )
+            for rel, info in files
+        ]
+        batch.run()
+
+        # 失敗したものは manifest に残さず、次回に再試行する
+        failed = set()
+        for rel, _, item in file_items + dir_items:
+            if item is not None and not item.ok:
+                failed.add(rel)
+                failed.update(ancestors(rel))
+        upserts = [(rel, info) for rel, info, item in file_items if item.ok]
+        for rel, info, item in dir_items:
+            if item is not None and not item.ok:
+                continue
+            if rel in failed:
+                info = dict(info, etag=None)
+            upserts.append((rel, info))
+        # 既に消えているものは削除済みとして扱う
+        gone = [x for _, x in delete_items if isinstance(x.error, NOT_FOUND_ERRORS)]
+        removed = [rel for rel, x in delete_items if x.ok or x in gone]
+        self.manifest.update(upserts, removed)
+
+        return {
+            "delete": len(removed),
+            "mkdir": sum(1 for *_, x in dir_items if x is not None and x.ok),
+            "put": sum(1 for *_, x in file_items if x.ok),
+            "errors": [x for x in batch.report.errors if x not in gone],
+        }
+
+
+def sync(
+    src: Provider,
+    src_path: str,
+    dest: Provider,
+    dest_path: str,
+    manifest: str = ":memory:",
+    **kwargs,
+):
+    with Manifest(manifest) as m:
+        return Sync(src, src_path, dest, dest_path, m, **kwargs).run()
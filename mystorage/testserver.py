@@ -0,0 +1,484 @@
+import mimetypes
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+from xml.etree import ElementTree
+
+from mystorage.providers.webdav import WebdavConfig
+
+"""
+# In-process WebDAV server that mimics the parts of Nextcloud used by WebdavProvider,
+# including chunked uploads under /remote.php/dav/uploads/<user>.
+with WebdavTestServer("your_dir") as server:
+    provider = server.config().get_provider()
+
+# Slow, lossy link: 20ms per request, 1MB/s per connection, 1% of requests fail with 503.
+with WebdavTestServer("your_dir", latency=0.02, bandwidth=1024**2, error_rate=0.01):
+    ...
+"""
+
+PROPS = [
+    "displayname",
+    "getcontentlength",
+    "getlastmodified",
+    "getetag",
+    "getcontenttype",
+    "resourcetype",
+    "quota-available-bytes",
+    "quota-used-bytes",
+]
+
+
+def etag_of(st: os.stat_result):
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+class WebdavTestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "_HTTPServer"
+
+    def log_message(self, format, *args):
+        ...
+
+    @property
+    def owner(self) -> "WebdavTestServer":
+        return self.server.owner
+
+    def handle_one_request(self):
+        try:
+            super().handle_one_request()
+        except ConnectionError:
+            self.close_connection = True
+
+    def _dispatch(self):
+        self.owner.count(self.command)
+        if self.owner.latency:
+            time.sleep(self.owner.latency)
+        if self.owner.should_fail(self):
+            return self._send(503, headers={"Retry-After": "0"})
+        method = getattr(self, "_do_" + self.command, None)
+        if method is None:
+            return self._send(405)
+        try:
+            local = self._resolve(self.path)
+        except PermissionError:
+            return self._send(403)
+        if local is None:
+            return self._send(404)
+        method(local)
+
+    do_OPTIONS = do_HEAD = do_GET = do_PUT = do_DELETE = _dispatch
+    do_MKCOL = do_MOVE = do_COPY = do_PROPFIND = _dispatch
+
+    def _resolve(self, url):
+        path = unquote(urlsplit(url).path)
+        for prefix, root in [
+            (self.owner.files_prefix, self.owner.root),
+            (self.owner.uploads_prefix, self.owner.uploads_root),
+        ]:
+            if path.rstrip("/") == prefix:
+                path = ""
+            elif path.startswith(prefix + "/"):
+                path = path[len(prefix) + 1 :]
+            else:
+                continue
+            local = os.path.normpath(os.path.join(root, path))
+            if local != root and not local.startswith(root + os.sep):
+                raise PermissionError(path)
+            return local
+        return None
+
+    def _is_upload(self, local):
+        return local.startswith(self.owner.uploads_root + os.sep)
+
+    def _href(self, local):
+        rel = os.path.relpath(local, self.owner.root)
+        rel = "" if rel == "." else rel.replace(os.sep, "/")
+        href = self.owner.files_prefix + "/" + rel
+        if os.path.isdir(local) and not href.endswith("/"):
+            href += "/"
+        return quote(href)
+
+    def _send(self, status, body=b"", headers=None):
+        self._discard_body()
+        self.send_response(status)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _discard_body(self):
+        if getattr(self, "_body_consumed", False):
+            return
+        for _ in self._iter_body():
+            ...
+
+    def _iter_body(self):
+        self._body_consumed = True
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip(), 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        ...
+                    break
+                chunk = self.rfile.read(size)
+                self.owner.throttle(len(chunk))
+                yield chunk
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length") or 0)
+            while remaining > 0:
+                chunk = self.rfile.read(min(remaining, 65536))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                self.owner.throttle(len(chunk))
+                yield chunk
+
+    def _read_body(self):
+        return b"".join(self._iter_body())
+
+    def _do_OPTIONS(self, local):
+        headers = {
+            "DAV": "1, 3",
+            "Allow": "OPTIONS, GET, HEAD, DELETE, PROPFIND, PUT, MKCOL, MOVE, COPY",
+        }
+        self._send(200, headers=headers)
+
+    def _file_headers(self, st, local):
+        return {
+            "ETag": etag_of(st),
+            "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+            "Content-Type": mimetypes.guess_type(local)[0]
+            or "application/octet-stream",
+            "Accept-Ranges": "bytes",
+        }
+
+    def _do_HEAD(self, local):
+        if not os.path.exists(local):
+            return self._send(404)
+        if os.path.isdir(local):
+            return self._send(200)
+        st = os.stat(local)
+        headers = self._file_headers(st, local)
+        headers["Content-Length"] = str(st.st_size)
+        self.send_response(200)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+
+    def _do_GET(self, local):
+        if not os.path.exists(local):
+            return self._send(404)
+        if os.path.isdir(local):
+            return self._send(501)
+        st = os.stat(local)
+        headers = self._file_headers(st, local)
+        if self.headers.get("If-None-Match") == headers["ETag"]:
+            return self._send(304, headers=headers)
+
+        start, end, status = 0, st.st_size - 1, 200
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes=") and st.st_size:
+            first, _, last = range_header[6:].split(",")[0].partition("-")
+            if first:
+                start = int(first)
+                end = min(int(last), end) if last else end
+            else:
+                start = max(st.st_size - int(last), 0)
+            if start > end:
+                headers["Content-Range"] = f"bytes */{st.st_size}"
+                return self._send(416, headers=headers)
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{st.st_size}"
+
+        self._discard_body()
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        with open(local, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(remaining, 65536))
+                if not chunk:
+                    break
+                self.owner.send_chunk(self.wfile, chunk)
+                remaining -= len(chunk)
+
+    def _do_PUT(self, local):
+        if os.path.isdir(local):
+            return self._send(405)
+        if not os.path.isdir(os.path.dirname(local)):
+            return self._send(409)
+        existed = os.path.exists(local)
+        tmp = f"{local}.~{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            for chunk in self._iter_body():
+                f.write(chunk)
+        os.replace(tmp, local)
+        self._send(204 if existed else 201, headers={"ETag": etag_of(os.stat(local))})
+
+    def _do_DELETE(self, local):
+        if not os.path.exists(local):
+            return self._send(404)
+        if local == self.owner.root:
+            return self._send(403)
+        if os.path.isdir(local):
+            shutil.rmtree(local)
+        else:
+            os.remove(local)
+        self._send(204)
+
+    def _do_MKCOL(self, local):
+        if os.path.exists(local):
+            return self._send(405)
+        if not os.path.isdir(os.path.dirname(local)):
+            return self._send(409)
+        os.mkdir(local)
+        self._send(201)
+
+    def _do_MOVE(self, local):
+        self._move_or_copy(local, move=True)
+
+    def _do_COPY(self, local):
+        self._move_or_copy(local, move=False)
+
+    def _move_or_copy(self, local, move):
+        if move and os.path.basename(local) == ".file" and self._is_upload(local):
+            return self._assemble(os.path.dirname(local))
+        if not os.path.exists(local):
+            return self._send(404)
+        dest = self._resolve(self.headers.get("Destination", ""))
+        if dest is None:
+            return self._send(502)
+        if not os.path.isdir(os.path.dirname(dest)):
+            return self._send(409)
+        existed = os.path.exists(dest)
+        if existed:
+            if self.headers.get("Overwrite", "T").upper() == "F":
+                return self._send(412)
+            if os.path.isdir(dest):
+                shutil.rmtree(dest)
+            else:
+                os.remove(dest)
+        if move:
+            os.replace(local, dest)
+        elif os.path.isdir(local):
+            shutil.copytree(local, dest)
+        else:
+            shutil.copy2(local, dest)
+        self._send(204 if existed else 201)
+
+    def _assemble(self, staging):
+        # Nextcloud chunking v2: MOVE <staging>/.file でチャンクを番号順に連結する
+        if not os.path.isdir(staging):
+            return self._send(404)
+        dest = self._resolve(self.headers.get("Destination", ""))
+        if dest is None or self._is_upload(dest):
+            return self._send(502)
+        if not os.path.isdir(os.path.dirname(dest)):
+            return self._send(409)
+        chunks = sorted(os.listdir(staging), key=int)
+        total = sum(os.path.getsize(os.path.join(staging, x)) for x in chunks)
+        expected = self.headers.get("OC-Total-Length")
+        if expected is not None and int(expected) != total:
+            return self._send(400)
+        existed = os.path.exists(dest)
+        tmp = f"{dest}.~{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            for name in chunks:
+                with open(os.path.join(staging, name), "rb") as chunk:
+                    shutil.copyfileobj(chunk, f)
+        os.replace(tmp, dest)
+        shutil.rmtree(staging)
+        self._send(204 if existed else 201, headers={"ETag": etag_of(os.stat(dest))})
+
+    def _do_PROPFIND(self, local):
+        if not os.path.exists(local):
+            return self._send(404)
+        depth = self.headers.get("Depth", "infinity").lower()
+        if depth == "infinity" and not self.owner.allow_depth_infinity:
+            return self._send(403)
+
+        props = set(PROPS)
+        body = self._read_body()
+        if body.strip():
+            requested = ElementTree.fromstring(body).find("{DAV:}prop")
+            if requested is not None:
+                props = {x.tag.split("}")[-1] for x in requested}
+
+        self._discard_body()
+        self.send_response(207)
+        self.send_header("Content-Type", "application/xml; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._write_chunk(
+            b'<?xml version="1.0" encoding="utf-8"?>\n<d:multistatus xmlns:d="DAV:">'
+        )
+        for path in self._iter_propfind(local, depth):
+            self._write_chunk(self._response_xml(path, props))
+        self._write_chunk(b"</d:multistatus>")
+        self._write_chunk(b"")
+
+    def _iter_propfind(self, local, depth):
+        yield local
+        if depth == "0" or not os.path.isdir(local):
+            return
+        if depth == "1":
+            for entry in sorted(os.scandir(local), key=lambda x: x.name):
+                yield entry.path
+        else:
+            for dirpath, dirnames, filenames in os.walk(local):
+                dirnames.sort()
+                for name in dirnames + sorted(filenames):
+                    yield os.path.join(dirpath, name)
+
+    def _write_chunk(self, data: bytes):
+        self.owner.send_chunk(self.wfile, b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _response_xml(self, local, props):
+        st = os.stat(local)
+        is_dir = os.path.isdir(local)
+        values = {
+            "displayname": os.path.basename(local),
+            "getlastmodified": formatdate(st.st_mtime, usegmt=True),
+            "getetag": self.owner.etag(local, st),
+        }
+        if is_dir:
+            usage = shutil.disk_usage(self.owner.root)
+            values["quota-available-bytes"] = str(usage.free)
+            values["quota-used-bytes"] = str(usage.used)
+        else:
+            values["getcontentlength"] = str(st.st_size)
+            values["getcontenttype"] = (
+                mimetypes.guess_type(local)[0] or "application/octet-stream"
+            )
+
+        found, missing = [], []
+        for name in sorted(props):
+            if name == "resourcetype":
+                found.append(
+                    "<d:resourcetype><d:collection/></d:resourcetype>"
+                    if is_dir
+                    else "<d:resourcetype/>"
+                )
+            elif name in values:
+                value = str(values[name])
+                value = value.replace("&", "&amp;").replace("<", "&lt;")
+                found.append(f"<d:{name}>{value}</d:{name}>")
+            else:
+                missing.append(f"<d:{name}/>")
+
+        xml = f"<d:response><d:href>{self._href(local)}</d:href>"
+        xml += "<d:propstat><d:prop>" + "".join(found) + "</d:prop>"
+        xml += "<d:status>HTTP/1.1 200 OK</d:status></d:propstat>"
+        if missing:
+            xml += "<d:propstat><d:prop>" + "".join(missing) + "</d:prop>"
+            xml += "<d:status>HTTP/1.1 404 Not Found</d:status></d:propstat>"
+        xml += "</d:response>"
+        return xml.encode("utf8")
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    owner: "WebdavTestServer"
+
+
+class WebdavTestServer:
+    def __init__(
+        self,
+        root: str,
+        user: str = "admin",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        allow_depth_infinity: bool = False,
+        latency: float = 0.0,
+        bandwidth: int = None,
+        error_rate: float = 0.0,
+        seed: int = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.user = user
+        self.files_prefix = f"/remote.php/dav/files/{user}"
+        self.uploads_prefix = f"/remote.php/dav/uploads/{user}"
+        self.uploads_root = None
+        self.allow_depth_infinity = allow_depth_infinity
+        self.latency = latency  # seconds added to every request
+        self.bandwidth = bandwidth  # bytes/sec per connection, both directions
+        self.error_rate = error_rate  # share of requests answered with 503
+        self.random = random.Random(seed)
+        self.injected_errors = 0
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        self._server = _HTTPServer((host, port), WebdavTestHandler)
+        self._server.owner = self
+        self._thread = None
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def config(self, **kwargs) -> WebdavConfig:
+        return WebdavConfig(host=self.host, port=self.port, user=self.user, **kwargs)
+
+    def count(self, method):
+        with self._lock:
+            self.requests[method] += 1
+
+    def etag(self, local, st):
+        return etag_of(st)
+
+    def should_fail(self, handler: WebdavTestHandler = None) -> bool:
+        if not self.error_rate:
+            return False
+        with self._lock:
+            failed = self.random.random() < self.error_rate
+            self.injected_errors += failed
+        return failed
+
+    def throttle(self, size: int):
+        if self.bandwidth:
+            time.sleep(size / self.bandwidth)
+
+    def send_chunk(self, wfile, data: bytes):
+        self.throttle(len(data))
+        wfile.write(data)
+
+    def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self.uploads_root = os.path.realpath(
+            tempfile.mkdtemp(prefix="mystorage-uploads-")
+        )
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        shutil.rmtree(self.uploads_root, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args, **kwargs):
+        self.stop()
@@ -1,4 +1,26 @@
-from mystorage.types import Provider
+import base64
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
+
+from mystorage.exceptions import NOT_FOUND_ERRORS, StorageException
+from mystorage.types import Provider, ProviderWrapper
+
+"""
+# Run the same operations on several providers at once and diff results and latency.
+with SpecDiffTool("spec", WebdavConfig().get_provider(), new_provider) as tool:
+    tool.mkdir("spec")
+    tool.put("spec/a.txt", b"data")
+    tool.replay(load_trace("trace.jsonl"))
+    tool.assert_not_slower(tolerance=0.2)  # 0 番目 (基準) より遅いプロバイダを検出
+
+# Record a trace from real traffic.
+provider = TraceRecorder(WebdavConfig().get_provider(), "trace.jsonl")
+"""
+
+SPEC_MAX_LATENCIES = 10000
 
 
 class Cleanup:
@@ -32,50 +54,300 @@ class SpecType(Cleanup):
         return result
 
 
-def iterate(func):
+class SpecDiffError(Exception):
+    ...
+
+
+def error_kind(e: BaseException) -> str:
+    # プロバイダ毎に例外クラスが異なるため、分類で比較する
+    if isinstance(e, NOT_FOUND_ERRORS):
+        return "NotFound"
+    if isinstance(e, StorageException):
+        return "StorageException"
+    return type(e).__name__
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def iterate(func=None, *, compare=True, normalize=None):
+    """Runs `func` on every provider concurrently and diffs results and errors.
+
+    Writes usually return provider specific values; use compare=False for them.
+    """
+    if func is None:
+        return lambda func: iterate(func, compare=compare, normalize=normalize)
+
+    name = func.__name__
+
+    def call(provider, args, kwargs):
+        start = time.perf_counter()
+        try:
+            result, error = func(provider, *args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+        return result, error, time.perf_counter() - start
+
     def wrapper(self, *args, **kwargs):
-        it = iter(self.providers)
-        ignores = self.ignore_functions
-        actual = func(next(it), *args, **kwargs)
+        futures = [self.executor.submit(call, x, args, kwargs) for x in self.providers]
+        outcomes = [x.result() for x in futures]
+        for i, (_, _, seconds) in enumerate(outcomes):
+            self._record_latency(name, i, seconds)
 
-        for provider in it:
-            expect = func(provider, *args, **kwargs)
-            if func.__name__ not in ignores:
+        (actual, actual_error, _), others = outcomes[0], outcomes[1:]
+        for provider, (expect, error, _) in zip(self.providers[1:], others):
+            if name in self.ignore_functions:
+                continue
+            if (actual_error is None) != (error is None) or (
+                error is not None and error_kind(error) != error_kind(actual_error)
+            ):
+                raise SpecDiffError(
+                    f"{provider.__class__}.{name}({args}, {kwargs}) error differs: {actual_error!r} != {error!r}"
+                )
+            if compare and error is None:
+                if normalize:
+                    actual, expect = normalize(actual), normalize(expect)
                 if actual != expect:
-                    raise Exception(
-                        f"{provider.__class__}.{func.__name__}({args}, {kwargs}) actual != expect: {actual} != {expect}"
+                    raise SpecDiffError(
+                        f"{provider.__class__}.{name}({args}, {kwargs}) actual != expect: {actual} != {expect}"
                     )
 
+        if actual_error is not None:
+            raise actual_error
         return True
 
+    wrapper.__name__ = name
     return wrapper
 
 
+def normalize_ll(infos):
+    from mystorage.types import ResourceTypes
+    from mystorage.walk import entry_name
+
+    # ディレクトリのサイズはプロバイダ毎に異なる
+    return sorted(
+        (entry_name(x), x["isdir"], x["size"] if x["isdir"] != ResourceTypes.DIR else 0)
+        for x in infos
+    )
+
+
 class SpecDiffTool:
-    def __init__(self, root, *providers: Provider, ignore_functions=set()):
+    def __init__(
+        self, root, *providers: Provider, ignore_functions=set(), max_workers=None
+    ):
         self.root = root
         self.providers = providers
+        self.ignore_functions = set(ignore_functions)
         if not root:
             raise Exception()
 
         if len(self.providers) < 2:
             raise Exception()
+        self.executor = ThreadPoolExecutor(max_workers or len(providers))
+        self.latencies = {}  # {function: [[seconds, ...] per provider]}
 
     @staticmethod
     def cleanup(root, *providers):
-        for provider in providers:
-            try:
-                if provider.exists(root):
-                    provider.delete(root)
-            except Exception as e:
-                ...
+        # プロバイダ毎に並列で消す。失敗は無視する
+        def delete(provider):
+            if provider.exists(root):
+                provider.delete(root)
+
+        if not providers:
+            return
+        with ThreadPoolExecutor(len(providers)) as executor:
+            for future in [executor.submit(delete, x) for x in providers]:
+                try:
+                    future.result()
+                except Exception as e:
+                    ...
 
     def __enter__(self):
         self.cleanup(self.root, *self.providers)
+        return self
 
     def __exit__(self, *args, **kwargs):
         self.cleanup(self.root, *self.providers)
+        self.executor.shutdown(wait=True)
+
+    def _record_latency(self, name, index, seconds):
+        rows = self.latencies.setdefault(name, [[] for _ in self.providers])
+        if len(rows[index]) < SPEC_MAX_LATENCIES:
+            rows[index].append(seconds)
+
+    def latency_stats(self):
+        """{function: [{"provider", "n", "p50_ms", "p99_ms", "mean_ms"} per provider]}"""
+        result = {}
+        for name, rows in self.latencies.items():
+            result[name] = [
+                {
+                    "provider": f"{i}:{provider.__class__.__name__}",
+                    "n": len(values),
+                    "p50_ms": round(percentile(values, 0.5) * 1000, 3),
+                    "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+                    "mean_ms": round(sum(values) / len(values) * 1000, 3)
+                    if values
+                    else 0.0,
+                }
+                for i, (provider, values) in enumerate(zip(self.providers, rows))
+            ]
+        return result
+
+    def latency_diff(self, baseline: int = 0, tolerance: float = 0.2, q=0.5):
+        """Functions where a provider is slower than `baseline` by more than `tolerance`."""
+        slower = []
+        for name, rows in self.latencies.items():
+            base = percentile(rows[baseline], q)
+            for i, values in enumerate(rows):
+                if i == baseline or not values or not base:
+                    continue
+                value = percentile(values, q)
+                if value > base * (1 + tolerance):
+                    slower.append(
+                        {
+                            "function": name,
+                            "provider": f"{i}:{self.providers[i].__class__.__name__}",
+                            "baseline_ms": round(base * 1000, 3),
+                            "ms": round(value * 1000, 3),
+                            "ratio": round(value / base, 3),
+                        }
+                    )
+        return slower
+
+    def assert_not_slower(self, baseline: int = 0, tolerance: float = 0.2, q=0.5):
+        slower = self.latency_diff(baseline, tolerance, q)
+        if slower:
+            raise SpecDiffError(f"Slower than baseline: {slower}")
+
+    def replay(self, trace: Iterable[dict]):
+        """Replays recorded operations ({"op", "args"}) on every provider."""
+        count = 0
+        for entry in trace:
+            op = entry["op"]
+            if op not in TRACE_OPS:
+                raise SpecDiffError(f"Unsupported op in trace: {op}")
+            args = list(entry.get("args", []))
+            if op == "put":
+                args[1] = base64.b64decode(args[1])
+            getattr(self, op)(*args)
+            count += 1
+        return count
 
     @iterate
     def exists(self, path):
         return self.exists(path)
+
+    @iterate
+    def isdir(self, path):
+        return self.isdir(path)
+
+    @iterate
+    def type(self, path):
+        return self.type(path)
+
+    @iterate(normalize=sorted)
+    def ls(self, path):
+        return self.ls(path)
+
+    @iterate(normalize=sorted)
+    def ls_files(self, path):
+        return self.ls_files(path)
+
+    @iterate(normalize=sorted)
+    def ls_dirs(self, path):
+        return self.ls_dirs(path)
+
+    @iterate(normalize=normalize_ll)
+    def ll(self, path):
+        return self.ll(path)
+
+    @iterate
+    def read_bytes(self, path):
+        return self.read_bytes(path)
+
+    @iterate(compare=False)
+    def put(self, path, data: bytes):
+        return self.put(path, io.BytesIO(data))
+
+    @iterate(compare=False)
+    def mkdir(self, path):
+        return self.mkdir(path)
+
+    @iterate(compare=False)
+    def delete(self, path):
+        return self.delete(path)
+
+    @iterate(compare=False)
+    def move(self, src, dest):
+        return self.move(src, dest)
+
+    @iterate(compare=False)
+    def copy(self, src, dest):
+        return self.copy(src, dest)
+
+    @iterate(compare=False)
+    def rename(self, src, name):
+        return self.rename(src, name)
+
+
+TRACE_OPS = {
+    "exists",
+    "isdir",
+    "type",
+    "ls",
+    "ls_files",
+    "ls_dirs",
+    "ll",
+    "read_bytes",
+    "put",
+    "mkdir",
+    "delete",
+    "move",
+    "copy",
+    "rename",
+}
+
+
+def load_trace(path) -> List[dict]:
+    with open(path) as f:
+        return [json.loads(x) for x in f if x.strip()]
+
+
+class TraceRecorder(ProviderWrapper):
+    """Appends the operations SpecDiffTool can replay to a JSON lines file."""
+
+    def __init__(self, provider: Provider, path=None):
+        super().__init__(provider)
+        self.path = path
+        self.trace = []
+
+    def _record(self, op, *args):
+        entry = {"op": op, "args": list(args)}
+        self.trace.append(entry)
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def put(self, path, buf):
+        data = buf.read()
+        self._record("put", path, base64.b64encode(data).decode())
+        return self.provider.put(path, io.BytesIO(data))
+
+
+def _recording(name):
+    def method(self, *args):
+        self._record(name, *args)
+        return getattr(self.provider, name)(*args)
+
+    method.__name__ = name
+    return method
+
+
+for _name in TRACE_OPS - {"put"}:
+    setattr(TraceRecorder, _name, _recording(_name))
+
+del _name
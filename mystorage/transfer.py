@@ -0,0 +1,268 @@
+import json
+import os
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Tuple
+
+from mystorage.concurrency import submit
+from mystorage.exceptions import StorageException
+from mystorage.metrics import record_retry
+
+RANGE_CHUNK_SIZE = 1024 * 1024 * 8
+RANGE_MAX_WORKERS = 4
+RANGE_RETRIES = 3
+
+"""
+# Split a remote object into byte ranges and fetch them concurrently into local_path.
+# Finished ranges are recorded in `local_path + ".part"`, so running it again resumes.
+RangedDownload(fetch_range, size, etag, local_path).run()
+"""
+
+
+def split_ranges(size: int, chunk_size: int) -> List[Tuple[int, int]]:
+    return [(x, min(x + chunk_size, size) - 1) for x in range(0, size, chunk_size)]
+
+
+def write_json_atomic(path, obj):
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def read_json_or_none(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class RangedDownload:
+    def __init__(
+        self,
+        fetch_range: Callable[[int, int], Iterable[bytes]],
+        size: int,
+        etag: str,
+        local_path: str,
+        chunk_size: int = RANGE_CHUNK_SIZE,
+        max_workers: int = RANGE_MAX_WORKERS,
+        retries: int = RANGE_RETRIES,
+    ):
+        self.fetch_range = fetch_range
+        self.size = size
+        self.etag = etag
+        self.local_path = local_path
+        self.part_path = local_path + ".part"
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.ranges = split_ranges(size, chunk_size)
+        self.done = set()
+        self._lock = threading.Lock()
+
+    def _state(self):
+        return {
+            "size": self.size,
+            "etag": self.etag,
+            "chunk_size": self.chunk_size,
+            "done": sorted(self.done),
+        }
+
+    def _load(self):
+        state = read_json_or_none(self.part_path)
+        if state is None or not os.path.exists(self.local_path):
+            return False
+        if (state["size"], state["etag"], state["chunk_size"]) != (
+            self.size,
+            self.etag,
+            self.chunk_size,
+        ):
+            return False
+        self.done = set(state["done"])
+        return True
+
+    def _preallocate(self, fd):
+        os.ftruncate(fd, self.size)
+        if self.size and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(fd, 0, self.size)
+            except OSError:
+                ...
+
+    def missing(self):
+        return [i for i in range(len(self.ranges)) if i not in self.done]
+
+    def run(self):
+        dirname = os.path.dirname(os.path.abspath(self.local_path))
+        os.makedirs(dirname, exist_ok=True)
+
+        resumed = self._load()
+        fd = os.open(self.local_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if not resumed:
+                self.done = set()
+                self._preallocate(fd)
+                write_json_atomic(self.part_path, self._state())
+
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                futures = [submit(executor, self._fetch, fd, i) for i in self.missing()]
+                _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+                for future in pending:
+                    future.cancel()
+                for future in futures:
+                    if future.done() and not future.cancelled():
+                        future.result()
+        finally:
+            os.close(fd)
+
+        os.remove(self.part_path)
+
+    def _fetch(self, fd, index):
+        start, end = self.ranges[index]
+        for attempt in range(self.retries + 1):
+            try:
+                self._write_range(fd, start, end)
+                break
+            except StorageException:
+                raise
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                record_retry()
+
+        with self._lock:
+            self.done.add(index)
+            write_json_atomic(self.part_path, self._state())
+
+    def _write_range(self, fd, start, end):
+        offset = start
+        for chunk in self.fetch_range(start, end):
+            if offset + len(chunk) > end + 1:
+                raise StorageException("Server returned more bytes than requested.")
+            view = memoryview(chunk)
+            while view:
+                n = os.pwrite(fd, view, offset)
+                view = view[n:]
+                offset += n
+        if offset != end + 1:
+            raise ConnectionError(f"Range {start}-{end} was cut off at {offset}.")
+
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024 * 10
+UPLOAD_MAX_WORKERS = 4
+UPLOAD_MAX_CHUNKS = 10000  # Nextcloud chunking v2: 1..10000, 5MB 以上 (最後を除く)
+UPLOAD_MIN_CHUNK_SIZE = 1024 * 1024 * 5
+
+"""
+# Send a local file as numbered chunks into a server-side staging area and assemble it.
+# `session` implements start() -> id, exists(id), put_chunk(id, number, data), finish(id).
+# Sent chunks are recorded in `state_path`, so running it again only sends the rest.
+ChunkedUpload(session, read_range, size, state_path=local_path + ".upload").run()
+"""
+
+
+def chunk_size_for(size: int, chunk_size: int) -> int:
+    # 指定された大きさもサーバーの制限内に収める
+    return max(chunk_size, UPLOAD_MIN_CHUNK_SIZE, -(-size // UPLOAD_MAX_CHUNKS))
+
+
+class ChunkedUpload:
+    def __init__(
+        self,
+        session,
+        read_range: Callable[[int, int], bytes],
+        size: int,
+        state_path: str = None,
+        fingerprint: dict = None,
+        chunk_size: int = UPLOAD_CHUNK_SIZE,
+        max_workers: int = UPLOAD_MAX_WORKERS,
+        retries: int = RANGE_RETRIES,
+    ):
+        self.session = session
+        self.read_range = read_range
+        self.size = size
+        self.state_path = state_path
+        self.fingerprint = fingerprint or {}
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.retries = retries
+        self.ranges = split_ranges(size, chunk_size) or [(0, -1)]
+        self.upload_id = None
+        self.done = set()
+        self._lock = threading.Lock()
+
+    def _state(self):
+        return {
+            "id": self.upload_id,
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "fingerprint": self.fingerprint,
+            "done": sorted(self.done),
+        }
+
+    def _save(self):
+        if self.state_path:
+            write_json_atomic(self.state_path, self._state())
+
+    def _load(self):
+        if not self.state_path:
+            return False
+        state = read_json_or_none(self.state_path)
+        if state is None:
+            return False
+        if (state["size"], state["chunk_size"], state["fingerprint"]) != (
+            self.size,
+            self.chunk_size,
+            self.fingerprint,
+        ):
+            return False
+        # ステージング領域はサーバー側で期限切れになることがある
+        if not self.session.exists(state["id"]):
+            return False
+        self.upload_id = state["id"]
+        self.done = set(state["done"])
+        return True
+
+    def missing(self):
+        return [i for i in range(len(self.ranges)) if i not in self.done]
+
+    def run(self):
+        if not self._load():
+            self.upload_id = self.session.start()
+            self.done = set()
+            self._save()
+
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            futures = [submit(executor, self._put, i) for i in self.missing()]
+            _, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+            for future in futures:
+                if future.done() and not future.cancelled():
+                    future.result()
+
+        result = self.session.finish(self.upload_id)
+        if self.state_path and os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return result
+
+    def _put(self, index):
+        start, end = self.ranges[index]
+        data = self.read_range(start, end)
+        if len(data) != end - start + 1:
+            raise StorageException("Local file changed during upload.")
+        for attempt in range(self.retries + 1):
+            try:
+                self.session.put_chunk(self.upload_id, index + 1, data)
+                break
+            except StorageException:
+                raise
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                record_retry()
+
+        with self._lock:
+            self.done.add(index)
+            self._save()
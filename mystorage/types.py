@@ -1,9 +1,10 @@
-import os
 from datetime import datetime
-from typing import List, Tuple
+from typing import List
 
 from pydantic import BaseModel
 
+from mystorage.exceptions import StorageException
+
 
 class ProviderFactory:
     def get_native_provider(self, path=""):
@@ -54,6 +55,21 @@ class ProviderBase:
     def ll_dirs(self, path):
         raise NotImplementedError()
 
+    def iter_ll(self, path, props=None):
+        """Yields ll() entries. `props` limits the fields fetched where supported."""
+        yield from self.ll(path)
+
+    def walk(self, path="", max_workers=None, max_depth=None, detail=False):
+        from mystorage.walk import walk_concurrent
+
+        path = str(path).strip("/")
+        return walk_concurrent(self.ll, path, max_workers, max_depth, detail)
+
+    def ll_recursive(self, path="", max_workers=None, max_depth=None):
+        from mystorage.walk import ll_recursive
+
+        return ll_recursive(self.walk(path, max_workers, max_depth, detail=True))
+
     # def delete(self, path):
     #     raise NotImplementedError()
 
@@ -74,30 +90,70 @@ class Reader(ProviderBase):
     def read(self, path, buf):
         raise NotImplementedError()
 
+    def open(self, path, mode="rb", encoding=None):
+        from mystorage.streams import wrap_mode
+
+        if mode not in {"r", "rb"}:
+            raise ValueError(f"Unsupported mode: {mode}")
+        return wrap_mode(self._open_reader(path), mode, encoding)
+
+    def _open_reader(self, path):
+        from mystorage.streams import open_pipe_reader
+
+        return open_pipe_reader(lambda buf: self.read(path, buf))
+
+    def open_if_modified(self, path, etag: str = None):
+        """Returns (None, etag) if `path` still has `etag`, else (binary file, new etag)."""
+        info = self.info(path)
+        if etag and info.get("etag") == etag:
+            return None, etag
+        return self.open(path, "rb"), info.get("etag")
+
+    def iter_chunks(self, path, chunk_size=None):
+        from mystorage.streams import DEFAULT_CHUNK_SIZE, iter_stream
+
+        with self.open(path, "rb") as f:
+            yield from iter_stream(f, chunk_size or DEFAULT_CHUNK_SIZE)
+
     def read_bytes(self, path):
         import io
 
         buf = io.BytesIO()
         buf = self.read(path, buf)
-        buf.seek(0)
-        return buf.read()
+        return buf.getvalue()
+
+    def iter_decoded(self, path, chunk_size=None):
+        """iter_chunks, decompressed when the name carries a codec suffix (.gz, .zst)."""
+        from mystorage.codecs import iter_decoded
+
+        return iter_decoded(self, path, chunk_size)
 
     def read_text(self, path, encoding=None):
-        import io
+        from mystorage.codecs import codec_for_path
 
-        buf = io.BytesIO()
-        buf = self.read(path, buf)
-        buf.seek(0)
-        return io.TextIOWrapper(buf, encoding).read()
+        if codec_for_path(path) is not None:
+            return b"".join(self.iter_decoded(path)).decode(encoding or "utf-8")
+        with self.open(path, "r", encoding) as f:
+            return f.read()
 
     def read_json(self, path):
-        import io
         import json
 
-        buf = io.BytesIO()
-        buf = self.read(path, buf)
-        buf.seek(0)
-        return json.load(buf)
+        from mystorage.codecs import codec_for_path
+        from mystorage.streams import open_iter_reader
+
+        if codec_for_path(path) is not None:
+            with open_iter_reader(self.iter_decoded(path)) as f:
+                return json.load(f)
+        with self.open(path, "rb") as f:
+            return json.load(f)
+
+    def iter_jsonl(self, path, json_codec=None, chunk_size=None):
+        """Yields the records of a JSON Lines file while it downloads."""
+        from mystorage.jsonl import decode_jsonl, get_json_codec
+
+        loads = get_json_codec(json_codec).loads
+        return decode_jsonl(self.iter_decoded(path, chunk_size), loads)
 
 
 class Writer(Reader):
@@ -125,14 +181,62 @@ class Writer(Reader):
     def write(self, path, buf):
         raise NotImplementedError()
 
-    def write_bytes(self, path, data: bytes):
-        raise NotImplementedError()
+    def open(self, path, mode="rb", encoding=None):
+        from mystorage.streams import wrap_mode
 
-    def write_text(self, path, data: str, encoding=None):
-        raise NotImplementedError()
+        if mode in {"w", "wb"}:
+            return wrap_mode(self._open_writer(path), mode, encoding)
+        return super().open(path, mode, encoding)
 
-    def write_json(self, path, json):
-        raise NotImplementedError()
+    def _open_writer(self, path):
+        from mystorage.streams import open_pipe_writer
+
+        return open_pipe_writer(lambda chunks: self.write_stream(path, chunks))
+
+    def write_stream(self, path, iterable):
+        from mystorage.streams import open_iter_reader
+
+        with open_iter_reader(iterable) as buf:
+            return self.put(path, buf)
+
+    def write_encoded(self, path, chunks, compression: str = None):
+        """write_stream through a codec ("gzip", "zstd").
+
+        Without `compression` the codec follows the suffix of `path`; with it, the
+        suffix is appended when missing.
+        """
+        from mystorage.codecs import resolve
+
+        path, codec = resolve(path, compression)
+        if codec is not None:
+            chunks = codec.compress(chunks)
+        return self.write_stream(path, chunks)
+
+    def write_bytes(self, path, data: bytes, compression: str = None):
+        """Writes `data` as is (like read_bytes) unless `compression` is given."""
+        if compression is None:
+            return self.write_stream(path, [data])
+        return self.write_encoded(path, [data], compression)
+
+    def write_text(self, path, data: str, encoding=None, compression: str = None):
+        data = data.encode(encoding or "utf-8")
+        return self.write_encoded(path, [data], compression)
+
+    def write_json(self, path, json, compression: str = None):
+        from json import dumps
+
+        data = dumps(json, ensure_ascii=False).encode("utf-8")
+        return self.write_encoded(path, [data], compression)
+
+    def write_jsonl(
+        self, path, records, json_codec=None, compression: str = None, batch_bytes=None
+    ):
+        """Streams `records` as JSON Lines, encoded in batches of about `batch_bytes`."""
+        from mystorage.jsonl import JSONL_BATCH_BYTES, encode_jsonl, get_json_codec
+
+        dumps_line = get_json_codec(json_codec).dumps_line
+        chunks = encode_jsonl(records, dumps_line, batch_bytes or JSONL_BATCH_BYTES)
+        return self.write_encoded(path, chunks, compression)
 
     def touch(self, path):
         import io
@@ -140,33 +244,117 @@ class Writer(Reader):
         buf = io.BytesIO(b"")
         return self.create(path, buf)
 
+    def batch(self, max_concurrency: int = None):
+        from mystorage.batch import BATCH_MAX_CONCURRENCY, Batch
+
+        return Batch(self, max_concurrency or BATCH_MAX_CONCURRENCY)
+
 
 class Provider(Writer):
     ...
 
 
-class LocalStorageBase(Provider):
-    ...
+class ProviderWrapper(Provider):
+    """Delegates every call to `provider`. Subclasses override what they change."""
 
+    def __init__(self, provider: Provider):
+        self.provider = provider
 
-class StorageArray(Provider):
-    def __init__(self, **storages: Provider):
-        self.storages = storages
+    def __getattr__(self, name):
+        # login, free, download, upload などプロバイダ固有のメソッド
+        if name == "provider":
+            raise AttributeError(name)
+        return getattr(self.provider, name)
 
-    def get_storage_by_id(self, id: int):
-        ...
+    def abspath(self, path):
+        return self.provider.abspath(path)
+
+    def exists(self, path) -> bool:
+        return self.provider.exists(path)
+
+    def info(self, path):
+        return self.provider.info(path)
+
+    def type(self, path) -> ResourceTypes:
+        return self.provider.type(path)
 
+    def isdir(self, path) -> bool:
+        return self.provider.isdir(path)
 
-class StorageSyncReplica(Provider):
-    def __init__(self, storage, **replicas: Provider):
-        self.storage = storage
-        self.storages = replicas
+    def ls(self, path) -> List[str]:
+        return self.provider.ls(path)
 
+    def ls_files(self, path) -> List[str]:
+        return self.provider.ls_files(path)
 
-class StorageAsyncReplica(Provider):
-    def __init__(self, storage, **replicas: Provider):
-        self.storage = storage
-        self.storages = replicas
+    def ls_dirs(self, path):
+        return self.provider.ls_dirs(path)
+
+    def ll(self, path):
+        return self.provider.ll(path)
+
+    def ll_files(self, path) -> List[str]:
+        return self.provider.ll_files(path)
+
+    def ll_dirs(self, path):
+        return self.provider.ll_dirs(path)
+
+    def iter_ll(self, path, props=None):
+        return self.provider.iter_ll(path, props)
+
+    def walk(self, path="", max_workers=None, max_depth=None, detail=False):
+        return self.provider.walk(path, max_workers, max_depth, detail)
+
+    def read(self, path, buf):
+        return self.provider.read(path, buf)
+
+    def open(self, path, mode="rb", encoding=None):
+        if mode in {"w", "wb"}:
+            return super().open(path, mode, encoding)
+        return self.provider.open(path, mode, encoding)
+
+    def open_if_modified(self, path, etag: str = None):
+        return self.provider.open_if_modified(path, etag)
+
+    def iter_chunks(self, path, chunk_size=None):
+        return self.provider.iter_chunks(path, chunk_size)
+
+    def read_bytes(self, path):
+        return self.provider.read_bytes(path)
+
+    def read_text(self, path, encoding=None):
+        return self.provider.read_text(path, encoding)
+
+    def read_json(self, path):
+        return self.provider.read_json(path)
+
+    def delete(self, path):
+        return self.provider.delete(path)
+
+    def mkdir(self, path):
+        return self.provider.mkdir(path)
+
+    def create(self, path, buf):
+        return self.provider.create(path, buf)
+
+    def put(self, path, buf):
+        return self.provider.put(path, buf)
+
+    def move(self, src, dest):
+        return self.provider.move(src, dest)
+
+    def copy(self, src, dest):
+        return self.provider.copy(src, dest)
+
+    def rename(self, src, name):
+        return self.provider.rename(src, name)
+
+    def write_stream(self, path, iterable):
+        return self.provider.write_stream(path, iterable)
+
+
+class LocalStorageBase(Provider):
+    ...
 
 
 class Resource:
@@ -176,55 +364,131 @@ class Resource:
 
     def abspath(self):
         if isinstance(self.provider, LocalStorageBase):
-            return os.path.abspath(self.path)
+            return self.provider.abspath(self.path)
         else:
             raise Exception()
 
     def abspath_or_none(self):
         if isinstance(self.provider, LocalStorageBase):
-            return os.path.abspath(self.path)
+            return self.provider.abspath(self.path)
         else:
             return None
 
-    def pull_from(self, remote: "Resource"):
-        ...
+    def pull_from(self, remote: "Resource", manifest: str = None, **kwargs):
+        from mystorage.sync import sync
 
-    def push_to(self, remote: "Resource"):
-        if self.abspath_or_none() is None:
-            raise NotImplementedError()
-            self.download()
-        else:
-            self.provider.dowload_local(remote.path)
-            self.provider.put()
+        manifest = manifest or self.manifest_path(remote)
+        return sync(
+            remote.provider, remote.path, self.provider, self.path, manifest, **kwargs
+        )
+
+    def push_to(self, remote: "Resource", manifest: str = None, **kwargs):
+        from mystorage.sync import sync
+
+        manifest = manifest or self.manifest_path(remote)
+        return sync(
+            self.provider, self.path, remote.provider, remote.path, manifest, **kwargs
+        )
+
+    def manifest_path(self, remote: "Resource"):
+        # 同期対象の外に置く。 dir1 -> .dir1.<remote>.sync.sqlite
+        import hashlib
+        import os
+
+        abspath = self.abspath_or_none()
+        if abspath is None:
+            raise StorageException("manifest is required for non-local resources.")
+        key = f"{type(remote.provider).__name__}:{remote.path}".encode()
+        digest = hashlib.sha1(key).hexdigest()[:12]
+        parent, name = os.path.split(abspath.rstrip(os.sep))
+        return os.path.join(parent, f".{name}.{digest}.sync.sqlite")
 
 
 class SafeClient:
     def __init__(self, provider: Provider, root: str = ""):
         self.provider = provider
-        self.root = root
+        self.root = str(root).strip("/")
 
     @staticmethod
     def validate(path):
-        return path
+        import posixpath
 
-    def mkdir(self, path):
+        path = str(path).replace("\\", "/")
+        if ".." in path.split("/"):
+            raise StorageException(f"Path escapes the client root: {path}")
+        return posixpath.normpath("/" + path).strip("/")
+
+    def path(self, path="") -> str:
         path = self.validate(path)
-        return self.provider.mkdir(path)
+        return "/".join(x for x in (self.root, path) if x)
+
+    def mkdir(self, path):
+        return self.provider.mkdir(self.path(path))
 
 
 class ArtifactDir:
+    """Content-addressed artifact store. See mystorage.artifacts."""
+
     def __init__(
         self,
         local_client: SafeClient,
         pull_client: SafeClient = None,
         push_client: SafeClient = None,
+        max_workers: int = None,
     ):
-        ...
+        self.local_client = local_client
+        self.pull_client = pull_client or push_client
+        self.push_client = push_client
+        self.max_workers = max_workers
+
+    def artifact(self, name: str) -> "Artifact":
+        return Artifact(self, name)
+
+    def push(self, name: str, version: str, path: str = "") -> dict:
+        from mystorage import artifacts
+
+        if self.push_client is None:
+            raise StorageException("push_client is not configured.")
+        return artifacts.push(
+            self.local_client, self.push_client, name, version, path, self.max_workers
+        )
+
+    def pull(
+        self, name: str, version: str = None, path: str = "", delete: bool = False
+    ) -> dict:
+        from mystorage import artifacts
+
+        if self.pull_client is None:
+            raise StorageException("pull_client is not configured.")
+        return artifacts.pull(
+            self.local_client,
+            self.pull_client,
+            name,
+            version,
+            path,
+            self.max_workers,
+            delete,
+        )
+
+    def versions(self, name: str) -> List[str]:
+        from mystorage import artifacts
+
+        return artifacts.versions(self.pull_client or self.push_client, name)
 
 
 class Artifact:
-    def __init__(self, dir: ArtifactDir):
-        ...
+    def __init__(self, dir: ArtifactDir, name: str = "default"):
+        self.dir = dir
+        self.name = name
+
+    def push(self, version: str, path: str = "") -> dict:
+        return self.dir.push(self.name, version, path)
+
+    def pull(self, version: str = None, path: str = "", delete: bool = False) -> dict:
+        return self.dir.pull(self.name, version, path, delete)
+
+    def versions(self) -> List[str]:
+        return self.dir.versions(self.name)
 
 
 class FileInfo(BaseModel):
@@ -236,3 +500,16 @@ class FileInfo(BaseModel):
     content_type: str = ""
     is_dir: bool
     path: str
+
+
+def __getattr__(name):
+    # StorageArray などは別モジュールに移した。循環 import を避けて遅延で読み込む
+    if name == "StorageArray":
+        from mystorage.array import StorageArray
+
+        return StorageArray
+    if name in {"StorageSyncReplica", "StorageAsyncReplica"}:
+        from mystorage import replica
+
+        return getattr(replica, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
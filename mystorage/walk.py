@@ -0,0 +1,89 @@
+import posixpath
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from mystorage.concurrency import submit
+from mystorage.types import ResourceTypes
+
+WALK_MAX_WORKERS = 8
+
+"""
+# Like os.walk, but each directory is listed by a bounded worker pool and
+# results are yielded as soon as a listing arrives. Removing names from `dirs`
+# prunes those subtrees.
+for dirpath, dirs, files in provider.walk("dir1", max_workers=16):
+    ...
+"""
+
+
+def entry_name(info) -> str:
+    return info.get("name") or info["path"].rstrip("/").rsplit("/", 1)[-1]
+
+
+def split_entries(infos, detail=False) -> Tuple[List, List]:
+    dirs, files = [], []
+    for info in infos:
+        target = dirs if info["isdir"] == ResourceTypes.DIR else files
+        target.append(info if detail else entry_name(info))
+    return dirs, files
+
+
+def join(dirpath, name) -> str:
+    if not dirpath or not name:
+        return dirpath or name
+    return posixpath.join(dirpath, name)
+
+
+def walk_concurrent(
+    ll: Callable[[str], List[dict]],
+    path: str = "",
+    max_workers: int = None,
+    max_depth: int = None,
+    detail: bool = False,
+) -> Iterator[Tuple[str, list, list]]:
+    executor = ThreadPoolExecutor(max_workers or WALK_MAX_WORKERS)
+    pending = {submit(executor, ll, path): (path, 0)}
+    try:
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dirpath, depth = pending.pop(future)
+                dirs, files = split_entries(future.result(), detail)
+                yield dirpath, dirs, files
+
+                if max_depth is not None and depth >= max_depth:
+                    continue
+                for x in dirs:
+                    child = join(dirpath, entry_name(x) if detail else x)
+                    pending[submit(executor, ll, child)] = (child, depth + 1)
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def walk_tree(
+    tree: Dict[str, List[dict]],
+    path: str = "",
+    max_depth: int = None,
+    detail: bool = False,
+) -> Iterator[Tuple[str, list, list]]:
+    """Walk a listing that is already grouped by parent directory."""
+    queue = deque([(path, 0)])
+    while queue:
+        dirpath, depth = queue.popleft()
+        dirs, files = split_entries(tree.get(dirpath, []), detail)
+        yield dirpath, dirs, files
+        if max_depth is not None and depth >= max_depth:
+            continue
+        for x in dirs:
+            queue.append((join(dirpath, entry_name(x) if detail else x), depth + 1))
+
+
+def ll_recursive(walk: Iterator[Tuple[str, list, list]]) -> Dict[str, dict]:
+    result = {}
+    for dirpath, dirs, files in walk:
+        for info in dirs + files:
+            result[join(dirpath, entry_name(info))] = info
+    return result
@@ -0,0 +1,80 @@
+import asyncio
+import io
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.aio import ThreadedAsyncProvider
+from mystorage.exceptions import StorageException
+from mystorage.testserver import WebdavTestServer
+from mystorage.types import ResourceTypes
+
+
+async def check_async_provider(provider):
+    assert await provider.exists("dir") == False
+    assert await provider.type("dir") == ResourceTypes.NO_EXISTS
+    assert (await provider.mkdir("dir"))["isdir"] == ResourceTypes.DIR
+
+    infos = await asyncio.gather(
+        *[provider.put(f"dir/{i}.txt", io.BytesIO(b"x" * i)) for i in range(50)]
+    )
+    assert [x["size"] for x in infos] == list(range(50))
+    assert all(
+        await asyncio.gather(*[provider.exists(f"dir/{i}.txt") for i in range(50)])
+    )
+    assert sorted(await provider.ls("dir")) == sorted(f"{i}.txt" for i in range(50))
+    assert len(await provider.ll("dir")) == 50
+
+    async def chunks():
+        yield b"hello "
+        yield b"world"
+
+    await provider.write_stream("dir/stream.txt", chunks())
+    assert await provider.read_bytes("dir/stream.txt") == b"hello world"
+    assert [x async for x in provider.iter_chunks("dir/stream.txt", 5)][0] == b"hello"
+
+    with pytest.raises(StorageException):
+        await provider.create("dir/stream.txt", io.BytesIO(b""))
+    with pytest.raises(StorageException):
+        await provider.put("dir", io.BytesIO(b""))
+
+    await provider.copy("dir/stream.txt", "dir/copied.txt")
+    await provider.move("dir/copied.txt", "dir/moved.txt")
+    await provider.rename("dir/moved.txt", "renamed.txt")
+    assert await provider.read_text("dir/renamed.txt", "utf8") == "hello world"
+    with pytest.raises(StorageException):
+        await provider.move("dir/not_exists.txt", "dir/moved2.txt")
+
+    await provider.delete("dir")
+    assert await provider.exists("dir") == False
+
+
+def test_threaded_async_provider(tmp_path: Path):
+    provider = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    asyncio.run(check_async_provider(ThreadedAsyncProvider(provider)))
+
+
+def test_async_webdav_provider(tmp_path: Path):
+    pytest.importorskip("httpx")
+
+    async def main(config):
+        async with config.get_async_provider() as provider:
+            await check_async_provider(provider)
+
+    with WebdavTestServer(str(tmp_path)) as server:
+        asyncio.run(main(server.config()))
+
+
+def test_async_webdav_provider_maps_http_errors(tmp_path: Path):
+    pytest.importorskip("httpx")
+
+    async def main(config):
+        async with config.get_async_provider() as provider:
+            with pytest.raises(StorageException, match="503"):
+                await provider.exists("a.txt")
+            with pytest.raises(StorageException):
+                await provider.read_bytes("a.txt")
+
+    with WebdavTestServer(str(tmp_path), error_rate=1.0) as server:
+        asyncio.run(main(server.config()))
@@ -0,0 +1,86 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.array import StorageArray
+from mystorage.exceptions import StorageException
+from mystorage.hashring import HashRing
+
+FILES = [f"d{i % 3}/f{i}.txt" for i in range(60)]
+
+
+def local(tmp_path: Path, name):
+    (tmp_path / name).mkdir()
+    return providers.LocalConfig(root=str(tmp_path / name)).get_provider()
+
+
+def count_files(root: Path):
+    return sum(1 for x in root.rglob("*") if x.is_file())
+
+
+def test_hashring_moves_only_keys_of_changed_node():
+    keys = [f"k{i}" for i in range(2000)]
+    ring = HashRing({"a": 1, "b": 1, "c": 1})
+    before = {k: ring.get(k) for k in keys}
+    ring.add("d")
+    after = {k: ring.get(k) for k in keys}
+    moved = [k for k in keys if before[k] != after[k]]
+    assert all(after[k] == "d" for k in moved)
+    assert 300 < len(moved) < 700
+    assert ring.get_n("k1", 2)[0] == ring.get("k1") and len(ring.get_n("k1", 9)) == 4
+
+
+def test_storage_array(tmp_path: Path):
+    array = StorageArray(a=local(tmp_path, "a"), b=local(tmp_path, "b"))
+    for d in ["d0", "d1", "d2"]:
+        array.mkdir(d)
+    for name in FILES:
+        array.put(name, io.BytesIO(name.encode()))
+
+    assert 10 < count_files(tmp_path / "a") < 50
+    assert count_files(tmp_path / "a") + count_files(tmp_path / "b") == 60
+    assert sorted(array.ls("")) == ["d0", "d1", "d2"]
+    assert len(array.ls_files("d0")) == 20
+    assert array.read_bytes("d1/f1.txt") == b"d1/f1.txt"
+    assert array.isdir("d2") and not array.exists("d2/missing")
+
+    # メンバー追加: 新しい owner に割り当てられた分だけ移動する
+    array.add_storage("c", local(tmp_path, "c"))
+    assert array.read_bytes(FILES[5]) == FILES[5].encode()
+    moved = array.rebalance()
+    assert moved == count_files(tmp_path / "c") and 0 < moved < 40
+    assert count_files(tmp_path / "a") + count_files(tmp_path / "b") == 60 - moved
+
+    # メンバー削除: 削除したメンバーの分だけ移動する
+    held = count_files(tmp_path / "a")
+    array.remove_storage("a")
+    assert len(array.ls_files("d0")) == 20
+    assert array.rebalance() == held
+    assert count_files(tmp_path / "a") == 0
+    for name in FILES:
+        assert array.read_bytes(name) == name.encode()
+
+    array.move("d0", "moved")
+    array.rebalance("moved")
+    assert len(array.ls_files("moved")) == 20
+    array.rename("d1/f1.txt", "renamed.txt")
+    assert array.read_bytes("d1/renamed.txt") == b"d1/f1.txt"
+    array.delete("moved")
+    assert not array.exists("moved")
+
+
+def test_storage_array_requires_storages(tmp_path: Path):
+    with pytest.raises(StorageException):
+        StorageArray(weight_by_free=True)
+    array = StorageArray(a=local(tmp_path, "a"))
+    with pytest.raises(StorageException):
+        array.remove_storage("a")
+    assert array.owner("x") is array.storages["a"]
+
+
+def test_storage_array_is_reexported_from_types():
+    from mystorage import types
+
+    assert types.StorageArray is StorageArray
@@ -0,0 +1,109 @@
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.artifacts import blob_path
+from mystorage.exceptions import StorageException
+from mystorage.testserver import WebdavTestServer
+from mystorage.types import ArtifactDir, SafeClient
+
+
+def make_build(root: Path, changed: bytes = b"v1"):
+    (root / "lib").mkdir(parents=True, exist_ok=True)
+    for i in range(20):
+        (root / "lib" / f"{i}.so").write_bytes(bytes([i]) * 1000)
+    (root / "app.bin").write_bytes(changed)
+    (root / "README").write_bytes(bytes([3]) * 1000)  # lib/3.so と同じ内容
+
+
+def test_safe_client_rejects_escape(tmp_path: Path):
+    client = SafeClient(providers.LocalConfig(root=str(tmp_path)).get_provider(), "a")
+    assert client.path("b//c/") == "a/b/c"
+    assert client.path() == "a"
+    with pytest.raises(StorageException):
+        client.path("../b")
+
+
+def test_push_and_pull_transfer_only_diff(tmp_path: Path):
+    (tmp_path / "build").mkdir()
+    (tmp_path / "remote").mkdir()
+    make_build(tmp_path / "build")
+    local = providers.LocalConfig(root=str(tmp_path)).get_provider()
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        remote = SafeClient(server.config().get_provider(), "store")
+        remote.provider.mkdir("store")
+        store = ArtifactDir(SafeClient(local, "build"), push_client=remote)
+
+        stats = store.push("app", "1")
+        assert stats == {"files": 22, "blobs": 21, "uploaded": 21, "bytes": 20002}
+
+        (tmp_path / "build" / "app.bin").write_bytes(b"v2")
+        server.requests.clear()
+        stats = store.push("app", "2")
+        assert stats["uploaded"] == 1 and stats["bytes"] == 2
+        assert server.requests["PUT"] == 3  # blob, manifest, LATEST
+        assert store.versions("app") == ["1", "2"]
+
+        # 別のディレクトリに前のビルドがある状態から最新版を取得する
+        target = ArtifactDir(SafeClient(local, "target"), pull_client=remote)
+        make_build(tmp_path / "target")
+        (tmp_path / "target" / "stale").write_bytes(b"x")
+        stats = target.artifact("app").pull(delete=True)
+        assert stats["downloaded"] == 1 and stats["skipped"] == 21
+        assert (tmp_path / "target" / "app.bin").read_bytes() == b"v2"
+        assert not (tmp_path / "target" / "stale").exists()
+
+        stats = target.pull("app", "1", path="old")
+        assert stats["downloaded"] == 21 and stats["copied"] == 1
+        assert (tmp_path / "target" / "old" / "app.bin").read_bytes() == b"v1"
+        assert (
+            tmp_path / "target" / "old" / "lib" / "7.so"
+        ).read_bytes() == b"\7" * 1000
+
+
+def test_pull_detects_corrupted_blob(tmp_path: Path):
+    (tmp_path / "build").mkdir()
+    make_build(tmp_path / "build")
+    local = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    store = ArtifactDir(SafeClient(local, "build"), push_client=SafeClient(local, "r"))
+    local.mkdir("r")
+    store.push("app", "1")
+
+    import hashlib
+
+    digest = hashlib.sha256(b"v1").hexdigest()
+    (tmp_path / "r" / blob_path(digest)).write_bytes(b"xx")
+    store = ArtifactDir(SafeClient(local, "out"), pull_client=SafeClient(local, "r"))
+    with pytest.raises(StorageException):
+        store.pull("app")
+    assert not (tmp_path / "out" / "app.bin").exists()
+    assert not list((tmp_path / "out").glob(".*.part"))
+    with pytest.raises(StorageException):
+        store.pull("app", "missing")
+
+
+@pytest.mark.parametrize(
+    "rel, digest",
+    [("../escaped.txt", None), ("a/../../escaped.txt", None), ("ok.txt", "../x")],
+)
+def test_pull_rejects_tampered_manifest(tmp_path: Path, rel, digest):
+    (tmp_path / "build").mkdir()
+    (tmp_path / "build" / "a.txt").write_bytes(b"a")
+    local = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    local.mkdir("r")
+    store = ArtifactDir(SafeClient(local, "build"), push_client=SafeClient(local, "r"))
+    store.push("app", "1")
+
+    manifest = local.read_json("r/artifacts/app/1.json")
+    entry = manifest["files"].pop("a.txt")
+    entry["sha256"] = digest or entry["sha256"]
+    manifest["files"][rel] = entry
+    local.write_json("r/artifacts/app/1.json", manifest)
+
+    store = ArtifactDir(SafeClient(local, "out"), pull_client=SafeClient(local, "r"))
+    with pytest.raises(StorageException):
+        store.pull("app")
+    assert not (tmp_path / "escaped.txt").exists()
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,90 @@
+import io
+import threading
+import time
+
+from mystorage import providers
+from mystorage.batch import Batch
+from mystorage.testserver import WebdavTestServer
+
+
+def test_batch_dependencies():
+    log = []
+    lock = threading.Lock()
+
+    class Recorder:
+        def __getattr__(self, name):
+            def op(*args):
+                time.sleep(0.01)
+                with lock:
+                    log.append((name, args[0]))
+                if args[0] == "bad":
+                    raise FileNotFoundError(args[0])
+                return name
+
+            return op
+
+    b = Batch(Recorder(), max_concurrency=8)
+    b.mkdir("dir")
+    for i in range(10):
+        b.put(f"dir/{i}", None)
+    b.delete("other")
+    b.mkdir("bad")
+    skipped = b.put("bad/x", None)
+    b.delete("dir")
+    report = b.run()
+
+    assert log.index(("mkdir", "dir")) < min(
+        log.index(("put", f"dir/{i}")) for i in range(10)
+    )
+    assert log.index(("delete", "dir")) > max(
+        log.index(("put", f"dir/{i}")) for i in range(10)
+    )
+    assert ("put", "bad/x") not in log
+    assert [x.index for x in report.errors] == [12, 13]
+    assert not skipped.ok and "Skipped" in str(skipped.error)
+    assert report[0].result == "mkdir"
+
+
+def test_batch_long_chain_of_failures():
+    class Failing:
+        def mkdir(self, path):
+            raise FileNotFoundError(path)
+
+        def put(self, path, buf):
+            return "put"
+
+    b = Batch(Failing())
+    b.mkdir("dir")
+    for i in range(3000):
+        b.put("dir/x", None)
+    b.put("other", None)
+    report = b.run()
+    assert len(report.errors) == 3001
+    assert all("Skipped" in str(x.error) for x in report.errors[1:])
+    assert report[-1].ok
+
+
+def test_batch_providers(tmp_path):
+    local = providers.LocalConfig(root=str(tmp_path / "local")).get_provider()
+    (tmp_path / "local").mkdir()
+    (tmp_path / "remote").mkdir()
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        remote = server.config().get_provider()
+        for provider in [local, remote]:
+            with provider.batch(max_concurrency=16) as b:
+                b.mkdir("dir")
+                for i in range(20):
+                    b.put(f"dir/{i}.txt", io.BytesIO(str(i).encode()))
+                b.move("dir/0.txt", "dir/moved.txt")
+                b.delete("missing")
+            assert [x.op for x in b.report.errors] == ["delete"]
+            assert len(provider.ls("dir")) == 20
+            assert provider.read_bytes("dir/moved.txt") == b"0"
+
+            with provider.batch() as b:
+                for name in provider.ls("dir"):
+                    b.delete(f"dir/{name}")
+                b.delete("dir")
+            assert b.report.ok
+            assert not provider.exists("dir")
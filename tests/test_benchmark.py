@@ -0,0 +1,51 @@
+import time
+from pathlib import Path
+
+from webdav3.exceptions import ResponseErrorCode
+
+from mystorage import benchmark
+from mystorage.testserver import WebdavTestServer
+
+
+def test_testserver_injects_latency_and_errors(tmp_path: Path):
+    (tmp_path / "file.bin").write_bytes(b"x" * 20000)
+    with WebdavTestServer(str(tmp_path), latency=0.05, bandwidth=100000) as server:
+        provider = server.config().get_provider()
+        start = time.monotonic()
+        assert provider.read_bytes("file.bin") == b"x" * 20000
+        assert time.monotonic() - start >= 0.25
+
+    with WebdavTestServer(str(tmp_path), error_rate=1.0) as server:
+        provider = server.config().get_provider()
+        try:
+            provider.read_bytes("file.bin")
+        except ResponseErrorCode as e:
+            assert e.code == 503
+        else:
+            raise AssertionError()
+        assert server.injected_errors >= 1
+
+
+def test_benchmark_reports_and_compares(tmp_path: Path, monkeypatch):
+    monkeypatch.setitem(
+        benchmark.WORKLOADS, "small", benchmark.Workload("small", files=5, size=10)
+    )
+    result = benchmark.bench_webdav(workloads=["small"])
+    rows = {x["op"]: x for x in result["results"]}
+    assert sorted(rows) == sorted(benchmark.OPS)
+    assert rows["put"]["n"] == 5 and rows["put"]["errors"] == 0
+    assert rows["read_bytes"]["bytes"] == 50
+    assert rows["ll"]["p99_ms"] >= rows["ll"]["p50_ms"] > 0
+    assert result["requests"]["PUT"] >= 10
+
+    slower = {"results": [dict(x, p50_ms=x["p50_ms"] * 3) for x in result["results"]]}
+    regressions = benchmark.compare(result, slower)
+    assert {x["op"] for x in regressions} == set(benchmark.OPS)
+    assert benchmark.compare(result, result) == []
+
+    out = tmp_path / "bench.json"
+    code = benchmark.main(
+        ["--workload", "small", "--op", "exists", "--output", str(out)]
+    )
+    assert code == 0 and out.exists()
+    assert benchmark.main(["--workload", "small", "--compare", str(out)]) in (0, 1)
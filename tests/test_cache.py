@@ -0,0 +1,67 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from mystorage.exceptions import StorageException
+from mystorage.providers.cache import MetadataCachedProvider
+from mystorage.testserver import WebdavTestServer
+from mystorage.types import ResourceTypes
+
+
+def test_metadata_cache(tmp_path: Path):
+    with WebdavTestServer(str(tmp_path)) as server:
+        provider = MetadataCachedProvider(server.config().get_provider(), ttl=60)
+
+        def count():
+            return sum(server.requests.values())
+
+        assert provider.exists("dir") == False
+        n = count()
+        assert provider.exists("dir") == False
+        assert provider.type("dir") == ResourceTypes.NO_EXISTS
+        assert count() == n
+
+        # write-through: mkdir / put store the returned info
+        provider.mkdir("dir")
+        n = count()
+        assert provider.type("dir") == ResourceTypes.DIR
+        provider.put("dir/a.txt", io.BytesIO(b"abc"))
+        n = count()
+        assert provider.exists("dir/a.txt") == True
+        assert provider.info("dir/a.txt")["size"] == 3
+        assert count() == n
+
+        # invalidation
+        provider.move("dir/a.txt", "dir/b.txt")
+        assert provider.exists("dir/a.txt") == False
+        assert provider.info("dir/b.txt")["size"] == 3
+        with pytest.raises(StorageException):
+            provider.put("dir", io.BytesIO(b""))
+        provider.delete("dir")
+        n = count()
+        assert provider.exists("dir/b.txt") == False
+        assert provider.exists("dir") == False
+        assert count() == n
+
+        assert provider.cache_stats()["hits"] > 0
+        assert provider.login() == True
+
+
+def test_metadata_cache_upload_and_not_found_type(tmp_path: Path):
+    from webdav3.exceptions import RemoteResourceNotFound
+
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "local.txt").write_bytes(b"abcd")
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = MetadataCachedProvider(server.config().get_provider(), ttl=60)
+        for _ in range(2):
+            with pytest.raises(RemoteResourceNotFound):
+                provider.info("up.txt")
+        assert server.requests["PROPFIND"] == 1
+        assert provider.exists("up.txt") == False
+
+        info = provider.upload(str(tmp_path / "local.txt"), "up.txt")
+        assert info["size"] == 4
+        assert provider.exists("up.txt") == True
+        assert provider.info("up.txt")["size"] == 4
@@ -0,0 +1,83 @@
+import gzip
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.codecs import GzipCodec, ZstdCodec
+from mystorage.exceptions import StorageException
+from mystorage.testserver import WebdavTestServer
+
+
+def test_gzip_codec_streams():
+    codec = GzipCodec()
+    data = b"line\n" * 10000
+    compressed = b"".join(codec.compress(iter([data[:100], data[100:]])))
+    assert len(compressed) < len(data) // 10
+    assert gzip.decompress(compressed) == data
+    # 連結されたメンバーも 1 バイトずつ読める
+    joined = compressed + gzip.compress(b"tail")
+    chunks = [joined[i : i + 1] for i in range(len(joined))]
+    assert b"".join(codec.decompress(chunks)) == data + b"tail"
+
+
+def test_write_and_read_compressed(tmp_path: Path):
+    provider = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    records = [{"id": i, "name": "あ" * 10} for i in range(1000)]
+    provider.write_json("events.json", records, compression="gzip")
+    assert not (tmp_path / "events.json").exists()
+    raw = (tmp_path / "events.json.gz").read_bytes()
+    assert raw[:2] == b"\x1f\x8b"
+    assert provider.read_json("events.json.gz") == records
+
+    provider.write_text("app.log.gz", "hello\n" * 100)
+    assert gzip.decompress((tmp_path / "app.log.gz").read_bytes()) == b"hello\n" * 100
+    assert provider.read_text("app.log.gz") == "hello\n" * 100
+
+    provider.write_bytes("plain.bin", b"raw")
+    assert (tmp_path / "plain.bin").read_bytes() == b"raw"
+
+    # write_bytes は read_bytes と同じく中身をそのまま扱う
+    provider.write_bytes("a.gz", gzip.compress(b"hello"))
+    assert provider.read_bytes("a.gz") == gzip.compress(b"hello")
+    assert provider.read_text("a.gz") == "hello"
+    provider.write_bytes("b", b"hello", compression="gzip")
+    assert gzip.decompress(provider.read_bytes("b.gz")) == b"hello"
+
+    with pytest.raises(StorageException):
+        provider.write_text("x.txt", "x", compression="lz4")
+
+
+def test_zstd_over_webdav(tmp_path: Path):
+    try:
+        ZstdCodec().compressor()
+    except StorageException:
+        pytest.skip("zstd is not available")
+
+    with WebdavTestServer(str(tmp_path)) as server:
+        provider = server.config().get_provider()
+        provider.write_text("app.log", "x" * 100000, compression="zstd")
+        assert (tmp_path / "app.log.zst").stat().st_size < 1000
+        assert provider.read_text("app.log.zst") == "x" * 100000
+        provider.write_json("a.json.zst", [1])
+        assert provider.read_json("a.json.zst") == [1]
+
+
+def test_truncated_stream_raises():
+    codec = GzipCodec()
+    data = bytes(range(256)) * 400
+    compressed = gzip.compress(data)
+    with pytest.raises(StorageException):
+        b"".join(codec.decompress([compressed[: len(compressed) // 2]]))
+    with pytest.raises(StorageException):
+        b"".join(codec.decompress([compressed + compressed[:10]]))
+    assert b"".join(codec.decompress([])) == b""
+
+    try:
+        zstd = ZstdCodec()
+        compressed = b"".join(zstd.compress([data]))
+    except StorageException:
+        return
+    with pytest.raises(StorageException):
+        b"".join(zstd.decompress([compressed[: len(compressed) // 2]]))
+    assert b"".join(zstd.decompress([compressed])) == data
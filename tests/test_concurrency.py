@@ -0,0 +1,108 @@
+import io
+import threading
+from pathlib import Path
+
+import pytest
+from webdav3.exceptions import ResponseErrorCode
+
+from mystorage.concurrency import AdaptiveLimiter, RetryPolicy, retry_after
+from mystorage.testserver import WebdavTestServer
+
+
+def test_adaptive_limiter_aimd():
+    limiter = AdaptiveLimiter(initial=8, max_limit=16)
+    for _ in range(8):
+        assert limiter.acquire(timeout=0)
+    assert not limiter.acquire(timeout=0.01)
+
+    limiter.release(0.01, throttled=True)
+    assert limiter.limit == 4
+    for _ in range(7):
+        limiter.release(0.01)
+    assert 4 < limiter.limit < 6
+
+    # baseline より極端に遅い応答でも少し絞る
+    limit = limiter.limit
+    limiter.acquire()
+    limiter.release(1.0)
+    assert limiter.limit < limit
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_adaptive_limiter_backs_off_on_errors():
+    limiter = AdaptiveLimiter(initial=4, max_limit=64)
+    peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal peak
+        for _ in range(20):
+            try:
+                with limiter.slot():
+                    with lock:
+                        peak = max(peak, limiter.inflight)
+                    raise ConnectionError()
+            except ConnectionError:
+                ...
+
+    threads = [threading.Thread(target=work) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak <= 4
+    assert limiter.limit == limiter.min_limit
+    assert limiter.stats()["inflight"] == 0
+
+
+def test_retry_policy():
+    policy = RetryPolicy(retries=2, base=0.1)
+    assert policy.should_retry("GET", 503, 0)
+    assert not policy.should_retry("MOVE", 503, 0)
+    assert not policy.should_retry("GET", 500, 0)
+    assert not policy.should_retry("GET", 429, 2)
+    assert 0 <= policy.delay(3) <= 0.8
+    assert 2 <= policy.delay(0, "2") <= 2.1
+    assert retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=1445412470) == 10
+    assert retry_after("soon") is None
+
+
+class Throttling(WebdavTestServer):
+    def __init__(self, *args, fail_methods=("GET",), failures=3, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_methods = fail_methods
+        self.failures = failures
+
+    def should_fail(self, handler=None):
+        with self._lock:
+            if handler.command in self.fail_methods and self.failures > 0:
+                self.failures -= 1
+                self.injected_errors += 1
+                return True
+        return False
+
+
+def test_webdav_retries_throttled_requests(tmp_path: Path):
+    (tmp_path / "a.txt").write_bytes(b"data")
+    with Throttling(str(tmp_path)) as server:
+        provider = server.config(initial_concurrency=4).get_provider()
+        assert provider.read_bytes("a.txt") == b"data"
+        stats = provider.pool_stats()["limiter"]
+        assert stats["throttled"] == 3 and stats["limit"] < 4
+
+        # 並列に流しても limit を超えない
+        def put(i):
+            provider.put(f"{i}.txt", io.BytesIO(b"x"))
+
+        threads = [threading.Thread(target=put, args=(i,)) for i in range(8)]
+        for x in threads:
+            x.start()
+        for x in threads:
+            x.join()
+        assert provider.pool_stats()["limiter"]["inflight"] == 0
+
+    with Throttling(str(tmp_path), fail_methods=("MOVE",), failures=1) as server:
+        provider = server.config().get_provider()
+        with pytest.raises(ResponseErrorCode):
+            provider.move("a.txt", "b.txt")
+        assert server.injected_errors == 1
@@ -0,0 +1,119 @@
+import io
+import os
+from pathlib import Path
+
+from mystorage.providers.diskcache import DiskCachedProvider
+from mystorage.testserver import WebdavTestServer
+
+
+def test_disk_cache_revalidates_with_etag(tmp_path: Path):
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "model.bin").write_bytes(b"v1" * 1000)
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        remote = server.config().get_provider()
+        provider = DiskCachedProvider(remote, str(tmp_path / "cache"))
+
+        assert provider.read_bytes("model.bin") == b"v1" * 1000
+        assert provider.read_bytes("model.bin") == b"v1" * 1000
+        assert provider.read_text("model.bin") == "v1" * 1000
+        assert server.requests["GET"] == 3
+        assert provider.cache_stats()["misses"] == 1
+        assert provider.cache_stats()["revalidated"] == 2
+
+        # 他のプロセスと同じキャッシュを共有できる
+        other = DiskCachedProvider(
+            server.config().get_provider(), str(tmp_path / "cache")
+        )
+        other.download("model.bin", str(tmp_path / "local" / "model.bin"))
+        assert (tmp_path / "local" / "model.bin").read_bytes() == b"v1" * 1000
+        assert other.cache_stats()["revalidated"] == 1
+
+        (tmp_path / "remote" / "model.bin").write_bytes(b"v2")
+        os.utime(tmp_path / "remote" / "model.bin", ns=(1, 1))
+        assert provider.read_bytes("model.bin") == b"v2"
+
+        provider.put("model.bin", io.BytesIO(b"v3"))
+        assert provider.cache_stats()["entries"] == 0
+        assert provider.read_bytes("model.bin") == b"v3"
+
+        fresh = DiskCachedProvider(remote, str(tmp_path / "cache"), max_age=60)
+        before = server.requests["GET"]
+        assert fresh.read_bytes("model.bin") == b"v3"
+        assert server.requests["GET"] == before
+
+
+def test_disk_cache_evicts_lru(tmp_path: Path):
+    (tmp_path / "remote").mkdir()
+    for name in "abc":
+        (tmp_path / "remote" / name).write_bytes(name.encode() * 400)
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = DiskCachedProvider(
+            server.config().get_provider(), str(tmp_path / "cache"), max_bytes=1000
+        )
+        provider.read_bytes("a")
+        provider.read_bytes("b")
+        provider.read_bytes("a")
+        provider.read_bytes("c")
+        assert provider.cache_stats()["entries"] == 2
+        assert provider.index.get("b") is None
+        assert provider.index.get("a") is not None
+        files = [x for x in (tmp_path / "cache" / "data").rglob("*") if x.is_file()]
+        assert len(files) == 2
+
+
+def test_disk_cache_streams_objects_larger_than_cache(tmp_path: Path):
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "big").write_bytes(b"x" * 5000)
+    (tmp_path / "remote" / "small").write_bytes(b"y" * 500)
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = DiskCachedProvider(
+            server.config().get_provider(), str(tmp_path / "cache"), max_bytes=1000
+        )
+        provider.read_bytes("small")
+        assert provider.read_bytes("big") == b"x" * 5000
+        assert b"".join(provider.iter_chunks("big")) == b"x" * 5000
+        assert provider.index.get("big") is None
+        assert provider.index.get("small") is not None
+        files = [x for x in (tmp_path / "cache" / "data").rglob("*") if x.is_file()]
+        assert len(files) == 1
+
+
+def test_disk_cache_stops_spooling_at_max_bytes(tmp_path: Path):
+    from mystorage import providers
+    from mystorage.streams import IterReader
+    from mystorage.types import ProviderWrapper
+
+    (tmp_path / "remote").mkdir()
+    cache = tmp_path / "cache"
+    consumed, spooled = [], []
+
+    class Chunked(ProviderWrapper):
+        def open_if_modified(self, path, etag=None):
+            def chunks():
+                for i in range(50):
+                    consumed.append(i)
+                    spooled.extend(x.stat().st_size for x in cache.rglob("*.tmp"))
+                    yield bytes([i]) * 100
+
+            return IterReader(chunks()), '"e"'
+
+    remote = providers.LocalConfig(root=str(tmp_path / "remote")).get_provider()
+    provider = DiskCachedProvider(Chunked(remote), str(cache), max_bytes=1000)
+    with provider.open("big") as f:
+        assert len(consumed) == 11
+        data = f.read()
+    assert data == b"".join(bytes([i]) * 100 for i in range(50))
+    assert max(spooled) <= 1000
+    assert not list(cache.rglob("*.tmp")) and provider.index.get("big") is None
+
+    # 追い出しと競合して消えたキャッシュファイルは取り直す
+    (tmp_path / "remote" / "small").write_bytes(b"s")
+    provider = DiskCachedProvider(remote, str(cache / "2"), max_bytes=1000)
+    assert provider.read_bytes("small") == b"s"
+    os.remove(cache / "2" / provider.index.get("small")["file"])
+    assert provider.read_bytes("small") == b"s"
+    provider.download("small", str(tmp_path / "out"))
+    assert (tmp_path / "out").read_bytes() == b"s"
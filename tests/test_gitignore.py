@@ -0,0 +1,121 @@
+from pathlib import Path
+
+from mystorage import providers
+from mystorage.gitignore import IgnoreMatcher, IgnoreRules
+from mystorage.providers.git import GitIgnoreStorage
+from mystorage.sync import sync
+
+
+def test_ignore_rules():
+    rules = IgnoreRules(
+        [
+            "# comment",
+            "*.pyc",
+            "!keep.pyc",
+            "build/",
+            "/top.txt",
+            "docs/**/*.tmp",
+            "a?c",
+            "log[0-9]",
+            "out/**",
+            "\\#hash",
+        ]
+    )
+    assert len(rules) == 9
+    assert rules.match("x/y.pyc") is True
+    assert rules.match("x/keep.pyc") is False
+    assert rules.match("build", isdir=True) is True
+    assert rules.match("build") is None
+    assert rules.match("top.txt") is True
+    assert rules.match("x/top.txt") is None
+    assert rules.match("docs/a/b/c.tmp") is True
+    assert rules.match("docs/c.tmp") is True
+    assert rules.match("x/docs/c.tmp") is None
+    assert rules.match("abc") is True and rules.match("a/c") is None
+    assert rules.match("log1") is True and rules.match("logx") is None
+    assert rules.match("out/a/b") is True and rules.match("out") is None
+    assert rules.match("#hash") is True
+
+
+def test_leading_double_star_with_path():
+    rules = IgnoreRules(["**/foo/bar", "**/logs/*.log", "**/name"])
+    assert rules.match("x/foo/bar") is True
+    assert rules.match("foo/bar") is True
+    assert rules.match("a/b/foo/bar") is True
+    assert rules.match("foo/x/bar") is None
+    assert rules.match("svc/logs/a.log") is True
+    assert rules.match("logs/a.log") is True
+    assert rules.match("svc/logs/sub/a.log") is None
+    assert rules.match("deep/x/name") is True
+
+
+def test_many_patterns_last_match_wins():
+    lines = [f"name{i}" for i in range(5000)] + [f"glob{i}*" for i in range(500)]
+    lines += ["!name42", "!glob7x"]
+    rules = IgnoreRules(lines)
+    assert rules.match("a/name4999") is True
+    assert rules.match("name42") is False
+    assert rules.match("glob499-x") is True
+    assert rules.match("glob7x") is False
+    assert rules.match("other") is None
+
+
+def test_nested_gitignore_overrides_parent():
+    matcher = IgnoreMatcher()
+    matcher.add("", "*.log\n")
+    matcher.add("sub", "!important.log\n")
+    assert matcher.match("a.log")
+    assert matcher.match("sub/x.log")
+    assert not matcher.match("sub/important.log")
+    assert matcher.match(".git", isdir=True)
+
+
+def test_gitignore_storage_prunes_walk_and_sync(tmp_path: Path):
+    src = tmp_path / "src"
+    for path in [
+        "main.py",
+        "main.pyc",
+        "node_modules/pkg/index.js",
+        ".git/HEAD",
+        "sub/app.log",
+        "sub/important.log",
+        "sub/deep/x.py",
+    ]:
+        (src / path).parent.mkdir(parents=True, exist_ok=True)
+        (src / path).write_text(path)
+    (src / ".gitignore").write_text("*.pyc\nnode_modules/\n*.log\n")
+    (src / "sub" / ".gitignore").write_text("!important.log\n")
+    (tmp_path / "dest").mkdir()
+
+    local = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    listed = []
+    ll = local.ll
+    local.ll = lambda path: listed.append(path) or ll(path)
+    storage = GitIgnoreStorage(local, "src")
+
+    files = {
+        f"{dirpath}/{name}"
+        for dirpath, _, names in storage.walk("src")
+        for name in names
+    }
+    assert files == {
+        "src/.gitignore",
+        "src/main.py",
+        "src/sub/.gitignore",
+        "src/sub/important.log",
+        "src/sub/deep/x.py",
+    }
+    assert sorted(listed) == ["src", "src/sub", "src/sub/deep"]
+
+    assert storage.exists("src/main.py")
+    assert not storage.exists("src/node_modules")
+    assert not storage.exists("src/node_modules/pkg/index.js")
+    assert storage.is_ignored("src/sub/app.log")
+    assert not storage.is_ignored("outside.pyc")
+    assert sorted(storage.ls("src")) == [".gitignore", "main.py", "sub"]
+
+    sync(storage, "src", local, "dest")
+    assert not (tmp_path / "dest" / "node_modules").exists()
+    assert not (tmp_path / "dest" / "main.pyc").exists()
+    assert (tmp_path / "dest" / "sub" / "important.log").exists()
+    assert not (tmp_path / "dest" / "sub" / "app.log").exists()
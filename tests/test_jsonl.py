@@ -0,0 +1,57 @@
+import gzip
+import json
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.exceptions import StorageException
+from mystorage.jsonl import get_json_codec, iter_lines
+from mystorage.testserver import WebdavTestServer
+
+
+def test_iter_lines_across_chunks():
+    data = b'{"a": 1}\n{"a": 2}\n\n{"a": 3}'
+    chunks = [data[i : i + 3] for i in range(0, len(data), 3)]
+    assert list(iter_lines(chunks)) == [b'{"a": 1}', b'{"a": 2}', b"", b'{"a": 3}']
+
+    # 長い行を細かいチャンクで読んでもコピーが積み上がらない
+    line = b"x" * 4 * 1024 * 1024
+    data = line + b"\n" + line
+    chunks = (data[i : i + 1000] for i in range(0, len(data), 1000))
+    assert list(iter_lines(chunks)) == [line, line]
+
+
+def test_default_codec_is_json_and_errors_are_wrapped(tmp_path: Path):
+    assert get_json_codec().name == "json"
+    provider = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    provider.write_jsonl("a.jsonl", [{1: "a"}])
+    assert (tmp_path / "a.jsonl").read_bytes() == b'{"1":"a"}\n'
+    with pytest.raises(StorageException, match="record 2"):
+        provider.write_jsonl("b.jsonl", [{}, {"x": object()}])
+
+
+@pytest.mark.parametrize("json_codec", ["json", "orjson"])
+def test_write_and_iter_jsonl(tmp_path: Path, json_codec):
+    pytest.importorskip(json_codec)
+    provider = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    records = ({"id": i, "name": "あ"} for i in range(5000))
+    provider.write_jsonl("events.jsonl", records, json_codec, batch_bytes=1000)
+    lines = (tmp_path / "events.jsonl").read_text("utf8").splitlines()
+    assert len(lines) == 5000 and json.loads(lines[-1]) == {"id": 4999, "name": "あ"}
+
+    it = provider.iter_jsonl("events.jsonl", json_codec, chunk_size=100)
+    assert next(it) == {"id": 0, "name": "あ"}
+    assert sum(1 for _ in it) == 4999
+
+
+def test_jsonl_compressed_over_webdav(tmp_path: Path):
+    with WebdavTestServer(str(tmp_path)) as server:
+        provider = server.config().get_provider()
+        provider.write_jsonl("a.jsonl", [{"x": 1}, [2], "3"], compression="gzip")
+        assert gzip.decompress((tmp_path / "a.jsonl.gz").read_bytes()).count(b"\n") == 3
+        assert list(provider.iter_jsonl("a.jsonl.gz")) == [{"x": 1}, [2], "3"]
+
+        (tmp_path / "bad.jsonl").write_bytes(b"{}\n{oops\n")
+        with pytest.raises(StorageException, match="line 2"):
+            list(provider.iter_jsonl("bad.jsonl"))
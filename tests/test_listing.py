@@ -0,0 +1,164 @@
+from datetime import datetime, timezone
+from pathlib import Path
+
+from mystorage.listing import Listing, format_http_date, parse_http_date
+from mystorage.providers.webdav import WebdavProvider
+from mystorage.testserver import WebdavTestServer
+from mystorage.types import ResourceTypes
+
+
+def test_parse_http_date():
+    expected = datetime(2022, 12, 17, 13, 58, 13, tzinfo=timezone.utc)
+    assert parse_http_date("Sat, 17 Dec 2022 13:58:13 GMT") == expected
+    assert parse_http_date("Sat, 17 Dec 2022 22:58:13 +0900") == expected
+    assert parse_http_date("2022-12-17T13:58:13Z") == expected
+    assert parse_http_date("2022-12-17T22:58:13+09:00") == expected
+
+
+def test_iso_creationdate():
+    raw = {
+        "created": "2022-12-17T13:58:13Z",
+        "name": None,
+        "size": "3",
+        "modified": "Sat, 17 Dec 2022 13:58:13 GMT",
+        "etag": None,
+        "content_type": None,
+        "isdir": False,
+        "path": "/dav/file.txt",
+    }
+    info = WebdavProvider.convert_info(dict(raw))
+    assert info["created"] == "2022-12-17 13:58:13+00:00"
+    listing = Listing.from_infos([raw])
+    assert listing[0]["created"] == info["created"]
+    assert listing[0].to_model().created == listing[0].modified_at
+    # 読めない日付は例外にせず受け取ったまま返す
+    assert format_http_date("yesterday") == "yesterday"
+
+
+def test_listing_matches_convert_info():
+    raw = {
+        "created": None,
+        "name": None,
+        "size": "3",
+        "modified": "Sat, 17 Dec 2022 13:58:13 GMT",
+        "etag": '"abc"',
+        "content_type": "text/plain",
+        "isdir": False,
+        "path": "/dav/dir/file.txt",
+    }
+    listing = Listing.from_infos(
+        [dict(raw), dict(raw, path="/dav/dir/sub/", isdir=True)]
+    )
+    assert len(listing) == 2
+    assert listing[0] == WebdavProvider.convert_info(dict(raw))
+    assert listing[0]["modified"] == "2022-12-17 13:58:13+00:00"
+    assert listing[-1]["isdir"] == ResourceTypes.DIR
+    assert listing.names() == ["file.txt", "sub"]
+    assert [x["path"] for x in listing.files()] == ["/dav/dir/file.txt"]
+    assert listing.dirs()[0].to_model().is_dir
+    assert listing[0].to_model().size == 3
+
+
+def test_webdav_ll_and_ll_listing(tmp_path: Path):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "a.txt").write_bytes(b"a")
+    (tmp_path / "dir" / "sub").mkdir()
+
+    with WebdavTestServer(str(tmp_path)) as server:
+        provider = server.config().get_provider()
+        infos = provider.ll("dir")
+        assert isinstance(infos, list) and all(type(x) is dict for x in infos)
+        listing = provider.ll_listing("dir")
+        assert isinstance(listing, Listing) and listing == infos
+        assert type(provider.ll_dirs("dir")[0]) is dict
+        assert sorted(provider.ls("dir")) == ["a.txt", "sub"]
+        assert provider.ls_files("dir") == ["a.txt"]
+        assert provider.ls_dirs("dir") == ["sub"]
+        assert [x["size"] for x in provider.ll_files("dir")] == [1]
+        assert provider.ll_recursive("dir")["dir/sub"]["isdir"] == ResourceTypes.DIR
+
+    with WebdavTestServer(str(tmp_path), allow_depth_infinity=True) as server:
+        provider = server.config().get_provider()
+        tree = provider.ll_recursive("dir")
+        assert provider.depth_infinity is True
+        assert type(tree["dir/a.txt"]) is dict and tree["dir/a.txt"]["size"] == 1
+
+
+def test_iter_multistatus_yields_before_body_ends():
+    from mystorage.providers.webdav import iter_multistatus
+
+    body = (
+        b'<?xml version="1.0"?><d:multistatus xmlns:d="DAV:">'
+        b"<d:response><d:href>/dav/a%20b.txt</d:href><d:propstat><d:prop>"
+        b"<d:getcontentlength>3</d:getcontentlength><d:resourcetype/>"
+        b"</d:prop></d:propstat></d:response>"
+        b"<d:response><d:href>/dav/sub/</d:href><d:propstat><d:prop>"
+        b"<d:resourcetype><d:collection/></d:resourcetype>"
+        b"</d:prop></d:propstat></d:response></d:multistatus>"
+    )
+    fed = []
+
+    def chunks():
+        for i in range(0, len(body), 16):
+            fed.append(i)
+            yield body[i : i + 16]
+
+    infos = iter_multistatus(chunks())
+    first = next(infos)
+    assert first["path"] == "/dav/a b.txt" and first["size"] == "3"
+    assert not first["isdir"]
+    assert len(fed) * 16 < len(body)
+    assert [x["isdir"] for x in infos] == [True]
+
+
+def test_webdav_iter_ll_projects_props(tmp_path: Path):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "a.txt").write_bytes(b"abc")
+    (tmp_path / "dir" / "sub").mkdir()
+
+    with WebdavTestServer(str(tmp_path)) as server:
+        provider = server.config().get_provider()
+        infos = list(provider.iter_ll("dir", props=["size"]))
+        assert sorted(x["path"].rstrip("/").rsplit("/", 1)[-1] for x in infos) == [
+            "a.txt",
+            "sub",
+        ]
+        assert {x["size"] for x in infos} == {0, 3}
+        assert all(set(x) == {"size", "isdir", "path"} for x in infos)
+
+        # サーバーは要求したプロパティだけを返す
+        _, raw = provider._propfind("dir", 1, directory=True, props=["size"])
+        assert all(x["etag"] is None for x in raw)
+        assert all(x["etag"] and x["modified"] for x in provider.iter_ll("dir"))
+
+
+def test_iter_multistatus_reads_only_ok_propstats():
+    from mystorage.providers.webdav import iter_multistatus
+
+    body = (
+        b'<d:multistatus xmlns:d="DAV:"><d:response><d:href>/dav/a%20b.txt</d:href>'
+        b"<d:propstat><d:prop><d:displayname>Pretty Name</d:displayname>"
+        b"<d:getcontentlength>3</d:getcontentlength><d:resourcetype/></d:prop>"
+        b"<d:status>HTTP/1.1 200 OK</d:status></d:propstat>"
+        b"<d:propstat><d:prop><d:creationdate/><d:getetag>x</d:getetag></d:prop>"
+        b"<d:status>HTTP/1.1 404 Not Found</d:status></d:propstat>"
+        b"</d:response></d:multistatus>"
+    )
+    [info] = iter_multistatus([body[:50], body[50:]])
+    assert info["path"] == "/dav/a b.txt"
+    assert info["size"] == "3"
+    assert info["created"] is None and info["etag"] is None
+    assert info["isdir"] is False
+
+
+def test_webdav_iter_ll_missing_props_and_ls_names(tmp_path: Path):
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "dir" / "a.txt").write_bytes(b"abc")
+
+    with WebdavTestServer(str(tmp_path)) as server:
+        provider = server.config().get_provider()
+        # テストサーバーは creationdate を持たないので 404 の propstat で返す
+        [info] = provider.iter_ll("dir", props=["created", "modified"])
+        assert info["created"] == info["modified"] is not None
+        assert provider.ls("dir") == ["a.txt"]
+        assert provider.ls_files("dir") == ["a.txt"]
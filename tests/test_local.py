@@ -0,0 +1,141 @@
+import io
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.exceptions import StorageException
+from mystorage.types import ResourceTypes
+
+
+@pytest.fixture
+def provider(tmp_path: Path):
+    return providers.LocalConfig(root=str(tmp_path / "root")).get_provider()
+
+
+@pytest.fixture(autouse=True)
+def root(tmp_path: Path):
+    (tmp_path / "root").mkdir()
+
+
+def test_local_provider(tmp_path: Path, provider):
+    ROOT = "test1"
+
+    assert provider.login() == True
+    assert provider.free() > 0
+
+    # mkdir
+    assert provider.exists(ROOT) == False
+    assert provider.mkdir(ROOT)
+    assert provider.exists(ROOT) == True
+    assert provider.type(ROOT) == ResourceTypes.DIR
+
+    # put
+    assert provider.put(ROOT + "/file2.txt", io.BytesIO("あ".encode("utf8")))
+    assert provider.read_bytes(ROOT + "/file2.txt").decode("utf8") == "あ"
+    assert provider.put(ROOT + "/file2.txt", io.BytesIO("い".encode("utf8")))
+    assert provider.read_text(ROOT + "/file2.txt", "utf8") == "い"
+    with pytest.raises(StorageException):
+        provider.put(ROOT, io.BytesIO(b""))
+
+    # create
+    assert provider.create(ROOT + "/file3.txt", io.BytesIO(b"abc"))
+    with pytest.raises(StorageException):
+        provider.create(ROOT + "/file3.txt", io.BytesIO(b""))
+    with pytest.raises(StorageException):
+        provider.create(ROOT, io.BytesIO(b""))
+
+    # touch
+    assert provider.touch(ROOT + "/file1.txt")
+    assert provider.read_bytes(ROOT + "/file1.txt") == b""
+    with pytest.raises(StorageException):
+        provider.touch(ROOT + "/file1.txt")
+
+    # put from a real file descriptor
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"x" * 100000)
+    with open(src, "rb") as f:
+        f.read(10)
+        info = provider.put(ROOT + "/big.bin", f)
+        assert f.tell() == 100000
+    assert info["size"] == 100000 - 10
+
+    # read into a real file descriptor
+    dest = tmp_path / "dest.bin"
+    with open(dest, "wb") as f:
+        f.write(b"head")
+        provider.read(ROOT + "/big.bin", f)
+    assert dest.read_bytes() == b"head" + b"x" * (100000 - 10)
+
+    # streaming
+    with provider.open(ROOT + "/stream.txt", "w", encoding="utf8") as f:
+        f.write("あいう")
+    assert b"".join(provider.iter_chunks(ROOT + "/stream.txt", 1)) == "あいう".encode()
+    assert provider.write_stream(ROOT + "/stream.txt", [b"a", b"b"])["size"] == 2
+    provider.delete(ROOT + "/stream.txt")
+
+    # move / copy / rename
+    assert provider.move(ROOT + "/file1.txt", ROOT + "/moved.txt") is None
+    assert provider.exists(ROOT + "/file1.txt") == False
+    with pytest.raises(StorageException):
+        provider.move(ROOT + "/not_exists.txt", ROOT + "/moved2.txt")
+    assert provider.copy(ROOT + "/file3.txt", ROOT + "/copied.txt")
+    assert provider.read_bytes(ROOT + "/copied.txt") == b"abc"
+    with pytest.raises(StorageException):
+        provider.copy(ROOT + "/not_exists.txt", ROOT + "/copied2.txt")
+    assert provider.rename(ROOT + "/copied.txt", ROOT + "/renamed.txt") is None
+    assert provider.read_bytes(ROOT + "/renamed.txt") == b"abc"
+
+    # listing
+    assert sorted(provider.ls(ROOT)) == sorted(
+        ["file2.txt", "file3.txt", "big.bin", "moved.txt", "renamed.txt"]
+    )
+    assert provider.ls_dirs("") == [ROOT]
+    assert {x["name"]: x["size"] for x in provider.ll_files(ROOT)}["file3.txt"] == 3
+
+    # download / upload
+    provider.download(ROOT, str(tmp_path / "download"))
+    assert (tmp_path / "download" / "file3.txt").read_bytes() == b"abc"
+    assert (
+        provider.upload(str(tmp_path / "download"), "uploaded")["isdir"]
+        == ResourceTypes.DIR
+    )
+    assert provider.read_bytes("uploaded/file3.txt") == b"abc"
+
+    # delete
+    provider.delete(ROOT)
+    assert provider.exists(ROOT) == False
+
+    with pytest.raises(StorageException):
+        provider.abspath("../outside")
+
+
+def test_local_copies_non_regular_files_through_read(tmp_path: Path):
+    import gzip
+    import os
+
+    provider = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    with gzip.open(tmp_path / "a.gz", "wb") as f:
+        f.write(b"plain text")
+    with gzip.open(tmp_path / "a.gz", "rb") as f:
+        provider.put("a.txt", f)
+    assert provider.read_bytes("a.txt") == b"plain text"
+
+    r, w = os.pipe()
+    os.write(w, b"from pipe")
+    os.close(w)
+    with open(r, "rb") as f:
+        provider.put("b.txt", f)
+    assert provider.read_bytes("b.txt") == b"from pipe"
+
+    r, w = os.pipe()
+    with open(w, "wb") as f:
+        provider.read("b.txt", f)
+    with open(r, "rb") as f:
+        assert f.read() == b"from pipe"
+
+
+def test_local_root_slash():
+    provider = providers.LocalConfig(root="/").get_provider()
+    assert provider.abspath("tmp/x") == "/tmp/x"
+    assert provider.abspath("../etc") == "/etc"
@@ -0,0 +1,303 @@
+import io
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.journal import ReplicationJournal
+from mystorage.replica import StorageAsyncReplica, StorageSyncReplica
+from mystorage.types import ProviderWrapper
+
+
+class Gated(ProviderWrapper):
+    """Calls wait until `gate` is open. `entered` is set when a call arrives."""
+
+    def __init__(self, provider, fail=False):
+        super().__init__(provider)
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+        self.entered = threading.Event()
+        self.calls = []
+
+    def _wait(self, name, path):
+        self.entered.set()
+        assert self.gate.wait(10)
+        self.calls.append((name, path))
+        if self.fail:
+            raise ConnectionError("down")
+
+    def put(self, path, buf):
+        self._wait("put", path)
+        return super().put(path, buf)
+
+    def read_bytes(self, path):
+        self._wait("read_bytes", path)
+        return super().read_bytes(path)
+
+    def write_stream(self, path, iterable):
+        self._wait("write_stream", path)
+        return super().write_stream(path, iterable)
+
+    def mkdir(self, path):
+        self._wait("mkdir", path)
+        return super().mkdir(path)
+
+
+def local(tmp_path: Path, name):
+    (tmp_path / name).mkdir()
+    return providers.LocalConfig(root=str(tmp_path / name)).get_provider()
+
+
+def test_sync_replica_write_quorum(tmp_path: Path):
+    slow = Gated(local(tmp_path, "c"))
+    slow.gate.clear()
+    replica = StorageSyncReplica(local(tmp_path, "a"), b=local(tmp_path, "b"), c=slow)
+    replica.mkdir("dir")
+    for i in range(5):
+        replica.put(f"dir/{i}.txt", io.BytesIO(str(i).encode()))
+    assert (tmp_path / "b" / "dir" / "4.txt").read_bytes() == b"4"
+    assert not (tmp_path / "c" / "dir").exists()
+
+    # 遅いメンバーにも親ディレクトリを先に作ってから書き込む
+    slow.gate.set()
+    replica.close()
+    assert slow.calls[0] == ("mkdir", "dir")
+    assert sorted(slow.calls[1:]) == [("put", f"dir/{i}.txt") for i in range(5)]
+    assert (tmp_path / "c" / "dir" / "4.txt").read_bytes() == b"4"
+    assert replica.replica_stats()["background_errors"] == 0
+
+    with StorageSyncReplica(
+        local(tmp_path, "d"),
+        write_quorum=2,
+        e=Gated(local(tmp_path, "e"), fail=True),
+        f=Gated(local(tmp_path, "f"), fail=True),
+    ) as broken:
+        with pytest.raises(ConnectionError):
+            broken.put("file.txt", io.BytesIO(b"data"))
+
+
+class PathGated(Gated):
+    """Only calls for `path` wait for `gate`."""
+
+    def __init__(self, provider, path):
+        super().__init__(provider)
+        self.path = path
+
+    def _wait(self, name, path):
+        if path == self.path:
+            return super()._wait(name, path)
+        self.calls.append((name, path))
+
+
+def test_sync_replica_orders_writes_per_path(tmp_path: Path):
+    slow = PathGated(local(tmp_path, "c"), "a.txt")
+    slow.gate.clear()
+    replica = StorageSyncReplica(local(tmp_path, "a"), b=local(tmp_path, "b"), c=slow)
+    replica.put("a.txt", io.BytesIO(b"1"))
+    assert slow.entered.wait(10)
+    replica.put("a.txt", io.BytesIO(b"2"))
+    replica.put("b.txt", io.BytesIO(b"b"))
+
+    # 別のパスへの書き込みは止まっている書き込みを待たない
+    replica.close(wait=False)
+    for _ in range(100):
+        if ("put", "b.txt") in slow.calls:
+            break
+        time.sleep(0.05)
+    assert (tmp_path / "c" / "b.txt").read_bytes() == b"b"
+    assert not (tmp_path / "c" / "a.txt").exists()
+
+    # 追いついていないメンバーからは読まない
+    assert replica._stale(2, "a.txt") and not replica._stale(2, "b.txt")
+    slow.gate.set()
+    for future in list(replica._inflight[2]):
+        future.result(10)
+    assert slow.calls.count(("put", "a.txt")) == 2
+    assert (tmp_path / "c" / "a.txt").read_bytes() == b"2"
+
+
+def test_sync_replica_reads_skip_stale_members(tmp_path: Path):
+    broken = Gated(local(tmp_path, "a"), fail=True)
+    replica = StorageSyncReplica(broken, b=local(tmp_path, "b"), write_quorum=1)
+    replica.put("file.txt", io.BytesIO(b"new"))
+    (tmp_path / "a" / "file.txt").write_bytes(b"old")
+    broken.fail = False
+    # primary への書き込みは失敗したので、書き込めたメンバーから読む
+    for _ in range(5):
+        assert replica.read_bytes("file.txt") == b"new"
+    replica.put("file.txt", io.BytesIO(b"newer"))
+    assert not replica._stale(0, "file.txt")
+    assert replica.read_bytes("file.txt") == b"newer"
+    replica.close()
+
+
+def test_sync_replica_hedged_read(tmp_path: Path):
+    primary = Gated(local(tmp_path, "a"))
+    replica = StorageSyncReplica(primary, b=local(tmp_path, "b"), write_quorum=2)
+    replica.put("file.txt", io.BytesIO(b"data"))
+    for _ in range(30):
+        assert replica.read_bytes("file.txt") == b"data"
+    assert replica.replica_stats()["hedged"] == 0
+
+    # primary が答えない間に次のメンバーへ送る
+    primary.gate.clear()
+    assert replica.read_bytes("file.txt") == b"data"
+    assert replica.replica_stats()["hedged"] == 1
+    primary.gate.set()
+
+    primary.fail = True
+    assert replica.read_bytes("file.txt") == b"data"
+    assert not replica.exists("missing")
+    replica.close()
+
+
+def test_journal_coalesces_puts():
+    journal = ReplicationJournal()
+    for _ in range(3):
+        journal.append(["b"], "put", "a/x")
+    assert len(journal) == 1
+    journal.append(["b"], "delete", "a")
+    assert [x.op for x in journal.claim("b", 10)] == ["delete"]
+
+    journal = ReplicationJournal()
+    journal.append(["b"], "put", "x")
+    journal.append(["b"], "move", "x", "y")
+    journal.append(["b"], "put", "x")
+    assert [x.op for x in journal.claim("b", 10)] == ["put", "move", "put"]
+
+
+def test_async_replica(tmp_path: Path):
+    journal = str(tmp_path / "journal.sqlite")
+    down = Gated(local(tmp_path, "b"), fail=True)
+    replica = StorageAsyncReplica(local(tmp_path, "a"), journal=journal, b=down)
+    replica.mkdir("dir")
+    for i in range(5):
+        replica.put(f"dir/{i}.txt", io.BytesIO(str(i).encode()))
+    replica.move("dir/0.txt", "dir/moved.txt")
+    assert (tmp_path / "a" / "dir" / "moved.txt").read_bytes() == b"0"
+    assert not replica.flush(timeout=0.2)
+    stats = replica.replication_stats()
+    assert stats["pending"] >= 5 and stats["lag_seconds"] > 0
+    replica.close(flush=False)
+
+    # 再起動後に journal から再生する
+    down.fail = False
+    primary = providers.LocalConfig(root=str(tmp_path / "a")).get_provider()
+    replica = StorageAsyncReplica(primary, journal=journal, b=down, max_pending=1)
+    assert replica.flush(timeout=10)
+    assert sorted(x.name for x in (tmp_path / "b" / "dir").iterdir()) == [
+        "1.txt",
+        "2.txt",
+        "3.txt",
+        "4.txt",
+        "moved.txt",
+    ]
+    assert replica.replication_stats()["pending"] == 0
+
+    # backpressure: max_pending を超えたら書き込みが待たされる
+    down.gate.clear()
+    down.entered.clear()
+    replica.put("dir/x.txt", io.BytesIO(b"x"))
+    assert down.entered.wait(10)
+    writer = threading.Thread(
+        target=replica.put, args=("dir/y.txt", io.BytesIO(b"y")), daemon=True
+    )
+    writer.start()
+    writer.join(0.2)
+    assert writer.is_alive()
+    assert not (tmp_path / "a" / "dir" / "y.txt").exists()
+    down.gate.set()
+    writer.join(10)
+    assert not writer.is_alive()
+    replica.close()
+    assert (tmp_path / "b" / "dir" / "y.txt").read_bytes() == b"y"
+
+
+def test_journal_holds_rows_until_commit(tmp_path: Path):
+    path = str(tmp_path / "journal.sqlite")
+    journal = ReplicationJournal(path)
+    held = journal.append(["b"], "put", "x", held=True)
+    journal.append(["b"], "delete", "x")
+    journal.append(["b"], "mkdir", "later")
+    journal.append(["b"], "move", "later", "x/y")
+    journal.append(["b"], "put", "xy")
+    # 書き込み中の行と重なるパスの行と、それに続く行だけ追い越さない
+    assert [(x.op, x.path) for x in journal.claim("b", 10)] == [
+        ("mkdir", "later"),
+        ("put", "xy"),
+    ]
+    journal.done([x.seq for x in journal.claim("b", 10)])
+    journal.commit(held)
+    assert [x.op for x in journal.claim("b", 10)] == ["put", "delete", "move"]
+
+    # commit した put に待っている古い put を畳み込む
+    old = journal.append(["b"], "put", "z")
+    held = journal.append(["b"], "put", "z", held=True)
+    journal.commit(held)
+    assert [x.seq for x in journal.claim("b", 10)] == held
+    assert old != held and journal.coalesced == 1
+
+    # 書き込み中に落ちた行は再起動後に sync として再生する
+    journal.append(["b"], "delete", "y", held=True)
+    journal.close()
+    journal = ReplicationJournal(path)
+    assert [x.op for x in journal.claim("b", 10)][-1] == "sync"
+
+
+def test_async_replica_upload_and_close_timeout(tmp_path: Path):
+    src = tmp_path / "src.txt"
+    src.write_bytes(b"uploaded")
+    down = Gated(local(tmp_path, "b"))
+    replica = StorageAsyncReplica(
+        local(tmp_path, "a"), journal=str(tmp_path / "journal.sqlite"), b=down
+    )
+    replica.upload(str(src), "up.txt")
+    assert replica.flush(timeout=10)
+    assert (tmp_path / "b" / "up.txt").read_bytes() == b"uploaded"
+
+    # 追いつかないレプリカがあっても close は timeout で戻る
+    down.gate.clear()
+    down.entered.clear()
+    replica.put("x.txt", io.BytesIO(b"x"))
+    assert down.entered.wait(10)
+    assert not replica.close(timeout=0.2)
+    down.gate.set()
+
+
+def test_async_replica_requires_journal(tmp_path: Path):
+    with pytest.raises(TypeError):
+        StorageAsyncReplica(local(tmp_path, "a"), b=local(tmp_path, "b"))
+
+
+def test_async_replica_failed_primary_write_syncs(tmp_path: Path):
+    journal = ReplicationJournal(str(tmp_path / "journal.sqlite"))
+    journal.append(["gone"], "put", "x")  # 設定にないレプリカの行は flush を止めない
+    primary = Gated(local(tmp_path, "a"), fail=True)
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "x.txt").write_bytes(b"stale")
+    b = providers.LocalConfig(root=str(tmp_path / "b")).get_provider()
+    replica = StorageAsyncReplica(primary, journal=journal, b=b)
+
+    # 再生スレッドで例外が出てもスレッドは止まらない
+    apply, calls = replica._apply, []
+
+    def broken_once(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return apply(*args)
+
+    replica._apply = broken_once
+    with pytest.raises(ConnectionError):
+        replica.put("x.txt", io.BytesIO(b"new"))
+    assert replica.flush(timeout=10)
+    assert not (tmp_path / "b" / "x.txt").exists()
+    assert len(calls) >= 2
+
+    primary.fail = False
+    replica.put("y.txt", io.BytesIO(b"y"))
+    replica.close()
+    assert (tmp_path / "b" / "y.txt").read_bytes() == b"y"
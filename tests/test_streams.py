@@ -0,0 +1,97 @@
+import pytest
+
+from mystorage.exceptions import FileNotFound
+from mystorage.types import Provider
+
+
+class MemoryProvider(Provider):
+    def __init__(self):
+        self.files = {}
+
+    def exists(self, path):
+        return path in self.files
+
+    def read(self, path, buf):
+        if path not in self.files:
+            raise FileNotFound(path)
+        data = self.files[path]
+        for i in range(0, len(data), 3):
+            buf.write(data[i : i + 3])
+        return buf
+
+    def put(self, path, buf):
+        self.files[path] = buf.read()
+        return {"path": path, "size": len(self.files[path])}
+
+
+def test_open_read_and_write():
+    provider = MemoryProvider()
+
+    with provider.open("a.txt", "wb") as f:
+        f.write(b"hello ")
+        f.write(b"world")
+    assert provider.files["a.txt"] == b"hello world"
+
+    with provider.open("a.txt", "rb") as f:
+        assert f.read(5) == b"hello"
+        assert f.read() == b" world"
+
+    with provider.open("b.txt", "w", encoding="utf8") as f:
+        f.write("あいう")
+    assert provider.read_text("b.txt", "utf8") == "あいう"
+    assert provider.read_bytes("b.txt") == "あいう".encode("utf8")
+
+
+def test_open_writer_aborts_on_error():
+    provider = MemoryProvider()
+
+    with pytest.raises(RuntimeError):
+        with provider.open("a.txt", "wb") as f:
+            f.write(b"partial")
+            raise RuntimeError()
+    assert "a.txt" not in provider.files
+
+    with pytest.raises(RuntimeError):
+        with provider.open("b.txt", "w", encoding="utf8") as f:
+            f.write("partial")
+            raise RuntimeError()
+    assert "b.txt" not in provider.files
+
+
+def test_local_write_stream_keeps_old_file_on_error(tmp_path):
+    from mystorage import providers
+
+    provider = providers.LocalConfig(root=str(tmp_path)).get_provider()
+    provider.write_stream("a.bin", iter([b"old"]))
+
+    def chunks():
+        yield b"new"
+        raise RuntimeError()
+
+    with pytest.raises(RuntimeError):
+        provider.write_stream("a.bin", chunks())
+    assert provider.read_bytes("a.bin") == b"old"
+    assert provider.ls("") == ["a.bin"]
+    with pytest.raises(FileNotFound):
+        provider.write_stream("missing/a.bin", iter([b"x"]))
+
+
+def test_open_reader_propagates_error_and_closes_early():
+    provider = MemoryProvider()
+
+    with pytest.raises(FileNotFound):
+        with provider.open("missing", "rb") as f:
+            f.read()
+
+    provider.files["big"] = b"x" * 100000
+    with provider.open("big", "rb") as f:
+        assert f.read(10) == b"x" * 10
+
+
+def test_iter_chunks_and_write_stream():
+    provider = MemoryProvider()
+
+    assert provider.write_stream("a.json", iter([b'{"a"', b"", b": 1}"]))
+    assert provider.read_json("a.json") == {"a": 1}
+    assert b"".join(provider.iter_chunks("a.json", chunk_size=2)) == b'{"a": 1}'
+    assert all(len(x) <= 2 for x in provider.iter_chunks("a.json", chunk_size=2))
@@ -0,0 +1,81 @@
+import os
+from pathlib import Path
+
+from mystorage import providers
+from mystorage.sync import Manifest, Sync
+from mystorage.testserver import WebdavTestServer
+from mystorage.types import Resource
+
+
+def make_tree(root: Path):
+    for d in ["a/b", "c"]:
+        (root / d).mkdir(parents=True)
+    for f in ["x.txt", "a/y.txt", "a/b/z.txt", "c/w.txt"]:
+        (root / f).write_text(f)
+
+
+def read_tree(root: Path):
+    return {
+        str(p.relative_to(root)): p.read_text() if p.is_file() else None
+        for p in sorted(root.rglob("*"))
+    }
+
+
+def test_sync_push_and_pull(tmp_path):
+    make_tree(tmp_path / "local" / "src")
+    (tmp_path / "remote").mkdir()
+    local = providers.LocalConfig(root=str(tmp_path / "local")).get_provider()
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        remote = server.config().get_provider()
+        src = Resource(local, "src")
+        dest = Resource(remote, "dest")
+
+        report = src.push_to(dest)
+        assert (report["mkdir"], report["put"], report["errors"]) == (3, 4, [])
+        assert read_tree(tmp_path / "remote" / "dest") == read_tree(
+            tmp_path / "local" / "src"
+        )
+        assert any(
+            x.name.endswith(".sync.sqlite") for x in (tmp_path / "local").iterdir()
+        )
+
+        # 変更・追加・削除だけが転送される
+        before = sum(server.requests.values())
+        os.utime(tmp_path / "local" / "src" / "a" / "y.txt", (0, 0))
+        (tmp_path / "local" / "src" / "new.txt").write_text("new")
+        (tmp_path / "local" / "src" / "c" / "w.txt").unlink()
+        report = src.push_to(dest)
+        assert (report["delete"], report["mkdir"], report["put"]) == (1, 0, 2)
+        assert sum(server.requests.values()) - before < 20
+        assert read_tree(tmp_path / "remote" / "dest") == read_tree(
+            tmp_path / "local" / "src"
+        )
+
+        report = src.push_to(dest)
+        assert (report["delete"], report["mkdir"], report["put"]) == (0, 0, 0)
+
+        pulled = Resource(local, "pulled")
+        pulled.pull_from(dest)
+        assert read_tree(tmp_path / "local" / "pulled") == read_tree(
+            tmp_path / "local" / "src"
+        )
+
+
+def test_sync_prune_by_dir_etag(tmp_path):
+    make_tree(tmp_path / "src")
+    (tmp_path / "dest").mkdir()
+    src = providers.LocalConfig(root=str(tmp_path / "src")).get_provider()
+    dest = providers.LocalConfig(root=str(tmp_path / "dest")).get_provider()
+
+    listed = []
+    ll = src.ll
+    src.ll = lambda path: listed.append(path) or ll(path)
+
+    with Manifest(str(tmp_path / "manifest.sqlite")) as manifest:
+        Sync(src, "", dest, "", manifest, prune_by_dir_etag=True).run()
+        assert len(manifest) == 7
+        listed.clear()
+        report = Sync(src, "", dest, "", manifest, prune_by_dir_etag=True).run()
+    assert report["put"] == 0
+    assert listed == [""]
@@ -0,0 +1,69 @@
+import io
+import time
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.testserver import WebdavTestServer
+from mystorage.testtool import SpecDiffError, SpecDiffTool, TraceRecorder, load_trace
+from mystorage.types import ProviderWrapper
+
+
+class Delayed(ProviderWrapper):
+    def read_bytes(self, path):
+        time.sleep(0.05)
+        return super().read_bytes(path)
+
+
+def local(tmp_path: Path, name):
+    (tmp_path / name).mkdir()
+    return providers.LocalConfig(root=str(tmp_path / name)).get_provider()
+
+
+def test_spec_diff_tool_against_webdav(tmp_path: Path):
+    (tmp_path / "remote").mkdir()
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        webdav = server.config().get_provider()
+        with SpecDiffTool("spec", webdav, local(tmp_path, "a")) as tool:
+            tool.mkdir("spec")
+            tool.put("spec/a.txt", b"data")
+            tool.mkdir("spec/sub")
+            assert tool.exists("spec/a.txt")
+            tool.ls("spec")
+            tool.ll("spec")
+            tool.read_bytes("spec/a.txt")
+            with pytest.raises(Exception):
+                tool.read_bytes("spec/missing.txt")
+            assert tool.latency_stats()["ls"][0]["n"] == 1
+
+
+def test_spec_diff_tool_detects_differences(tmp_path: Path):
+    a, b = local(tmp_path, "a"), local(tmp_path, "b")
+    with SpecDiffTool("spec", a, Delayed(b), ignore_functions={"ls"}) as tool:
+        tool.mkdir("spec")
+        tool.put("spec/a.txt", b"data")
+        for _ in range(3):
+            tool.read_bytes("spec/a.txt")
+        with pytest.raises(SpecDiffError):
+            tool.assert_not_slower()
+        assert tool.latency_diff()[0]["function"] == "read_bytes"
+
+        b.put("spec/extra.txt", io.BytesIO(b"x"))
+        tool.ls("spec")  # ignored
+        with pytest.raises(SpecDiffError):
+            tool.ls_files("spec")
+
+
+def test_trace_replay(tmp_path: Path):
+    trace = str(tmp_path / "trace.jsonl")
+    recorder = TraceRecorder(local(tmp_path, "src"), trace)
+    recorder.mkdir("spec")
+    recorder.put("spec/a.txt", io.BytesIO(b"data"))
+    recorder.move("spec/a.txt", "spec/b.txt")
+    assert recorder.read_bytes("spec/b.txt") == b"data"
+
+    a, b = local(tmp_path, "a"), local(tmp_path, "b")
+    with SpecDiffTool("spec", a, b) as tool:
+        assert tool.replay(load_trace(trace)) == 4
+        assert (tmp_path / "b" / "spec" / "b.txt").read_bytes() == b"data"
@@ -0,0 +1,172 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from mystorage.exceptions import StorageException
+from mystorage.providers.webdav import NextcloudChunking
+from mystorage.testserver import WebdavTestServer
+from mystorage.transfer import RangedDownload
+
+DATA = os.urandom(1000)
+
+
+def fetch_from(data, calls, fail_at=None):
+    def fetch_range(start, end):
+        calls.append(start)
+        if start == fail_at:
+            raise RuntimeError("connection dropped")
+        yield data[start : end + 1]
+
+    return fetch_range
+
+
+def test_ranged_download_resumes_missing_ranges(tmp_path: Path):
+    local = str(tmp_path / "sub" / "file.bin")
+
+    calls = []
+    with pytest.raises(RuntimeError):
+        RangedDownload(
+            fetch_from(DATA, calls, fail_at=500),
+            len(DATA),
+            '"v1"',
+            local,
+            chunk_size=100,
+            max_workers=1,
+            retries=0,
+        ).run()
+    assert os.path.exists(local + ".part")
+    assert os.path.getsize(local) == len(DATA)
+
+    calls = []
+    RangedDownload(
+        fetch_from(DATA, calls), len(DATA), '"v1"', local, chunk_size=100
+    ).run()
+    assert 500 in calls and min(calls) == 500
+    assert Path(local).read_bytes() == DATA
+    assert not os.path.exists(local + ".part")
+
+
+def test_ranged_download_restarts_when_etag_changed(tmp_path: Path):
+    local = str(tmp_path / "file.bin")
+    with pytest.raises(RuntimeError):
+        RangedDownload(
+            fetch_from(DATA, [], fail_at=0), len(DATA), '"v1"', local, 100, 1, 0
+        ).run()
+
+    calls = []
+    RangedDownload(fetch_from(DATA, calls), len(DATA), '"v2"', local, 100).run()
+    assert len(calls) == 10
+    assert Path(local).read_bytes() == DATA
+
+
+def test_webdav_download_ranged(tmp_path: Path):
+    data = os.urandom(300000)
+    (tmp_path / "remote").mkdir()
+    (tmp_path / "remote" / "big.bin").write_bytes(data)
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = server.config().get_provider()
+        local = str(tmp_path / "local" / "big.bin")
+        provider.download("big.bin", local, max_workers=4, chunk_size=65536)
+        assert server.requests["GET"] == 5
+        assert Path(local).read_bytes() == data
+
+
+def test_webdav_upload_chunked_resumes(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr("mystorage.transfer.UPLOAD_MIN_CHUNK_SIZE", 1)
+    data = os.urandom(1000)
+    local = tmp_path / "big.bin"
+    local.write_bytes(data)
+    (tmp_path / "remote").mkdir()
+
+    put_chunk = NextcloudChunking.put_chunk
+    sent, failed = [], []
+
+    def failing_put_chunk(self, upload_id, number, chunk):
+        if number == 6 and not failed:
+            failed.append(number)
+            raise StorageException("connection dropped")
+        sent.append(number)
+        return put_chunk(self, upload_id, number, chunk)
+
+    monkeypatch.setattr(NextcloudChunking, "put_chunk", failing_put_chunk)
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = server.config().get_provider()
+        with pytest.raises(StorageException):
+            provider.upload(str(local), "big.bin", max_workers=1, chunk_size=100)
+        assert os.path.exists(str(local) + ".upload")
+        assert not (tmp_path / "remote" / "big.bin").exists()
+
+        sent.clear()
+        info = provider.upload(str(local), "big.bin", max_workers=4, chunk_size=100)
+        assert 6 in sent and min(sent) == 6
+        assert info["size"] == len(data)
+        assert (tmp_path / "remote" / "big.bin").read_bytes() == data
+        assert not os.path.exists(str(local) + ".upload")
+        assert os.listdir(server.uploads_root) == []
+
+
+def test_webdav_put_large_file_uses_chunks(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr("mystorage.transfer.UPLOAD_CHUNK_SIZE", 100)
+    monkeypatch.setattr("mystorage.transfer.UPLOAD_MIN_CHUNK_SIZE", 1)
+    data = os.urandom(1000)
+    (tmp_path / "big.bin").write_bytes(data)
+    (tmp_path / "remote").mkdir()
+
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = server.config().get_provider()
+        with open(tmp_path / "big.bin", "rb") as f:
+            provider.put("big.bin", f)
+        assert server.requests["PUT"] == 10
+        assert server.requests["MOVE"] == 1
+        assert provider.chunked_upload is True
+        assert (tmp_path / "remote" / "big.bin").read_bytes() == data
+
+
+def test_upload_chunk_size_respects_nextcloud_limits(tmp_path: Path):
+    from mystorage.transfer import UPLOAD_MIN_CHUNK_SIZE, chunk_size_for
+
+    assert chunk_size_for(10**9, 100) == UPLOAD_MIN_CHUNK_SIZE
+    assert chunk_size_for(10**12, 100) == 10**8
+
+    data = os.urandom(1000)
+    (tmp_path / "small.bin").write_bytes(data)
+    (tmp_path / "remote").mkdir()
+    with WebdavTestServer(str(tmp_path / "remote")) as server:
+        provider = server.config().get_provider()
+        # 最小の大きさに収まるので単一の PUT で送る
+        info = provider.upload(str(tmp_path / "small.bin"), "a.bin", 4, chunk_size=100)
+        assert info["size"] == len(data)
+        assert server.requests["MKCOL"] == 0
+        assert provider.upload(str(tmp_path / "small.bin"), "b.bin")["size"] == 1000
+
+
+class FailFirstMkcol(WebdavTestServer):
+    def should_fail(self, handler=None):
+        if handler is None or handler.command != "MKCOL" or self.injected_errors:
+            return False
+        self.injected_errors += 1
+        return True
+
+
+def test_webdav_put_keeps_chunking_after_transient_error(tmp_path: Path, monkeypatch):
+    from webdav3.exceptions import ResponseErrorCode
+
+    monkeypatch.setattr("mystorage.transfer.UPLOAD_CHUNK_SIZE", 100)
+    monkeypatch.setattr("mystorage.transfer.UPLOAD_MIN_CHUNK_SIZE", 1)
+    data = os.urandom(1000)
+    (tmp_path / "big.bin").write_bytes(data)
+    (tmp_path / "remote").mkdir()
+
+    with FailFirstMkcol(str(tmp_path / "remote")) as server:
+        provider = server.config().get_provider()
+        with open(tmp_path / "big.bin", "rb") as f:
+            with pytest.raises(ResponseErrorCode):
+                provider.put("big.bin", f)
+        assert provider.chunked_upload is None
+        with open(tmp_path / "big.bin", "rb") as f:
+            provider.put("big.bin", f)
+        assert provider.chunked_upload is True
+        assert (tmp_path / "remote" / "big.bin").read_bytes() == data
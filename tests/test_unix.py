@@ -0,0 +1,59 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from mystorage.providers.unix import InfinityTempNames, RealDir
+
+
+def test_infinity_temp_names():
+    with InfinityTempNames(shards=16) as tmpnames:
+        dirname = tmpnames.dirname
+        names = [tmpnames.next() for _ in range(100)]
+        names.append(tmpnames.next(".h5"))
+        assert len(set(names)) == 101
+        assert len({os.path.dirname(x) for x in names}) == 16
+        assert list(tmpnames.names) == names
+
+        for name in names[:10]:
+            with open(name, "w"):
+                ...
+        tmpnames.touch(".h5")
+        assert len(list(tmpnames.ls())) == 11
+        assert len(list(tmpnames.ls("*.h5"))) == 1
+    assert not os.path.exists(dirname)
+
+
+def test_alternating_suffixes_and_user_dirs():
+    with InfinityTempNames(shards=4096) as tmpnames:
+        names = [tmpnames.next(".a" if i % 2 else ".b") for i in range(1000)]
+        assert list(tmpnames.names) == names
+        assert tmpnames._suffixes == ["", ".b", ".a"]
+        assert len({os.path.basename(os.path.dirname(x)) for x in names}) > 256
+
+        for name in names[:3]:
+            with open(name, "w"):
+                ...
+        # シャード以外のディレクトリは中を見ずにそのまま返す
+        os.mkdir(os.path.join(tmpnames.dirname, "user"))
+        with open(os.path.join(tmpnames.dirname, "user", "x"), "w"):
+            ...
+        with open(os.path.join(tmpnames.dirname, ".hidden"), "w"):
+            ...
+        found = tmpnames.ls()
+        assert len(found) == 4
+        assert sorted(tmpnames.iter_ls()) == sorted(found)
+        assert os.path.join(tmpnames.dirname, "user") in found
+
+
+def test_real_dir(tmp_path: Path):
+    with pytest.raises(RuntimeError):
+        RealDir(str(tmp_path))
+
+    with RealDir(str(tmp_path), ignore_exists=True) as a:
+        first = a.touch()
+    with RealDir(str(tmp_path), ignore_exists=True) as b:
+        second = b.touch()
+        assert first != second
+        assert sorted(b.ls()) == sorted([first, second])
+    assert os.path.exists(first)
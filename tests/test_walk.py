@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+
+from mystorage import providers
+from mystorage.testserver import WebdavTestServer
+
+
+@pytest.fixture
+def tree(tmp_path: Path):
+    root = tmp_path / "root"
+    for d in ["a/b/c", "a/d", "e"]:
+        (root / "top" / d).mkdir(parents=True)
+    for f in ["f.txt", "a/g.txt", "a/b/h.txt", "a/b/c/i.txt", "e/j.txt"]:
+        (root / "top" / f).write_text(f)
+    return root
+
+
+EXPECTED = {
+    "top": (["a", "e"], ["f.txt"]),
+    "top/a": (["b", "d"], ["g.txt"]),
+    "top/a/b": (["c"], ["h.txt"]),
+    "top/a/b/c": ([], ["i.txt"]),
+    "top/a/d": ([], []),
+    "top/e": ([], ["j.txt"]),
+}
+
+
+def check_walk(provider):
+    result = {d: (sorted(x), sorted(y)) for d, x, y in provider.walk("top")}
+    assert result == EXPECTED
+
+    result = {d for d, x, y in provider.walk("top", max_depth=1)}
+    assert result == {"top", "top/a", "top/e"}
+
+    visited = []
+    for dirpath, dirs, files in provider.walk("top", max_workers=2):
+        visited.append(dirpath)
+        if "b" in dirs:
+            dirs.remove("b")
+    assert sorted(visited) == ["top", "top/a", "top/a/d", "top/e"]
+
+    infos = provider.ll_recursive("top")
+    assert sorted(infos) == sorted(
+        ["top/a", "top/a/b", "top/a/b/c", "top/a/d", "top/e"]
+        + ["top/f.txt", "top/a/g.txt", "top/a/b/h.txt", "top/a/b/c/i.txt"]
+        + ["top/e/j.txt"]
+    )
+    assert infos["top/a/b/c/i.txt"]["size"] == len("a/b/c/i.txt")
+
+
+def test_local_walk(tree: Path):
+    check_walk(providers.LocalConfig(root=str(tree)).get_provider())
+
+
+@pytest.mark.parametrize("allow_depth_infinity", [False, True])
+def test_webdav_walk(tree: Path, allow_depth_infinity):
+    with WebdavTestServer(str(tree), allow_depth_infinity=allow_depth_infinity) as s:
+        provider = s.config().get_provider()
+        check_walk(provider)
+        assert provider.depth_infinity == allow_depth_infinity
+        if allow_depth_infinity:
+            # 3 回の walk は Depth: infinity 1 回ずつ、max_depth=1 は階層ごとに 3 回
+            assert s.requests["PROPFIND"] == 6
+
+
+def test_webdav_walk_keeps_depth_infinity_on_other_errors(tree: Path):
+    from webdav3.exceptions import ResponseErrorCode
+
+    from mystorage.providers.webdav import rejects_depth_infinity
+
+    body = b'<d:error xmlns:d="DAV:"><d:propfind-finite-depth/></d:error>'
+    assert rejects_depth_infinity(ResponseErrorCode("/", 403, b""))
+    assert rejects_depth_infinity(ResponseErrorCode("/", 400, body))
+    assert not rejects_depth_infinity(ResponseErrorCode("/", 500, b"boom"))
+
+    with WebdavTestServer(str(tree), error_rate=1.0) as s:
+        provider = s.config().get_provider()
+        with pytest.raises(ResponseErrorCode):
+            list(provider.walk("top"))
+        assert provider.depth_infinity is None
+
+
+def test_webdav_shallow_walk_lists_per_level(tree: Path):
+    with WebdavTestServer(str(tree), allow_depth_infinity=True) as s:
+        provider = s.config().get_provider()
+        result = {d for d, _, _ in provider.walk("top", max_depth=1)}
+        assert result == {"top", "top/a", "top/e"}
+        assert s.requests["PROPFIND"] == 3
+        assert provider.depth_infinity is None
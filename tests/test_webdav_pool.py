@@ -0,0 +1,30 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from mystorage.testserver import WebdavTestServer
+
+
+def test_pooled_provider_is_shared_between_threads(tmp_path: Path):
+    with WebdavTestServer(str(tmp_path)) as server:
+        config = server.config(pool_maxsize=4, pool_block=True)
+        provider = config.get_provider()
+        assert config.get_provider().pool is provider.pool
+
+        provider.mkdir("dir")
+
+        def work(i):
+            path = f"dir/file{i}.txt"
+            provider.put(path, io.BytesIO(str(i).encode()))
+            assert provider.exists(path)
+            return provider.read_bytes(path)
+
+        with ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(work, range(64)))
+            stats = provider.pool_stats()
+        assert results == [str(i).encode() for i in range(64)]
+
+        assert stats["clients"] >= 2
+        assert stats["connections"] <= 4
+        assert stats["requests"] >= 64 * 3
+        assert stats["idle"] <= stats["connections"]